@@ -0,0 +1,116 @@
+import math
+from array import array
+import numpy as np
+
+# Grid cells per 256 px web-map tile edge; at zoom z a cell spans 360 / (2**z * CELLS_PER_TILE) degrees of longitude
+CELLS_PER_TILE = 16
+AGGREGATES = ('mean', 'min', 'max', 'sum', 'count')
+
+
+def collect_columns(records, fields, boat_id=None):
+    """Stream rows into float64 arrays for the given fields, skipping rows missing any of them.
+
+    Returns ({field: ndarray}, [timestamps]); only the requested columns are kept.
+    """
+    columns = {field: array('d') for field in fields}
+    timestamps = []
+    for record in records:
+        if boat_id is not None and record.get('boat_id') != boat_id:
+            continue
+        try:
+            values = [float(record[field]) for field in fields]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if any(math.isnan(value) for value in values):
+            continue
+        for field, value in zip(fields, values):
+            columns[field].append(value)
+        timestamps.append(record.get('timestamp'))
+    return {field: np.frombuffer(values, dtype=np.float64) for field, values in columns.items()}, timestamps
+
+
+def in_bbox(lat, lng, bbox):
+    """Boolean mask of samples inside bbox = (min_lng, min_lat, max_lng, max_lat)."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return (lng >= min_lng) & (lng <= max_lng) & (lat >= min_lat) & (lat <= max_lat)
+
+
+def _mercator_cells(lat, lng, zoom):
+    scale = 2 ** zoom * CELLS_PER_TILE
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    x = (lng + 180.0) / 360.0 * scale
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64), scale
+
+
+def _cell_center(ix, iy, scale):
+    lng = (ix + 0.5) / scale * 360.0 - 180.0
+    n = np.pi - 2.0 * np.pi * (iy + 0.5) / scale
+    lat = np.degrees(np.arctan(np.sinh(n)))
+    return lat, lng
+
+
+def grid_aggregate(lat, lng, values, zoom, bbox=None, agg="mean"):
+    """Bin samples into web-mercator grid cells at a zoom level and aggregate each cell.
+
+    bbox is (min_lng, min_lat, max_lng, max_lat). Returns a list of
+    [cell_lat, cell_lng, value, count] rows for non-empty cells.
+    """
+    if bbox is not None:
+        inside = in_bbox(lat, lng, bbox)
+        lat, lng, values = lat[inside], lng[inside], values[inside]
+    if len(values) == 0:
+        return []
+    ix, iy, scale = _mercator_cells(lat, lng, zoom)
+    keys, inverse = np.unique(ix * (scale + 1) + iy, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    if agg == "mean":
+        result = np.bincount(inverse, weights=values, minlength=len(keys)) / counts
+    elif agg == "sum":
+        result = np.bincount(inverse, weights=values, minlength=len(keys))
+    elif agg == "count":
+        result = counts.astype(np.float64)
+    elif agg == "min":
+        result = np.full(len(keys), np.inf)
+        np.minimum.at(result, inverse, values)
+    elif agg == "max":
+        result = np.full(len(keys), -np.inf)
+        np.maximum.at(result, inverse, values)
+    else:
+        raise ValueError(f"Unknown aggregate: {agg}")
+    cell_lat, cell_lng = _cell_center(keys // (scale + 1), keys % (scale + 1), scale)
+    return [list(row) for row in zip(np.round(cell_lat, 6).tolist(), np.round(cell_lng, 6).tolist(),
+                                     np.round(result, 4).tolist(), counts.tolist())]
+
+
+def stride_indices(count, threshold):
+    """Every n-th sample, always keeping the first and last."""
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    indices = np.linspace(0, count - 1, threshold).round().astype(np.int64)
+    return np.unique(indices)
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points."""
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = count - 1
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = edges[bucket + 1], edges[bucket + 2] if bucket + 2 < len(edges) else count
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        ax, ay = x[selected], y[selected]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
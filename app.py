@@ -1,12 +1,30 @@
+import time
+STARTED = time.monotonic()
+import async_mode
+# Green-thread modes patch the stdlib; this has to happen before anything else is imported
+async_mode.monkey_patch()
+import json
+import threading
+import logging
+import config
+import xbee_handler
 from flask import Flask, request, jsonify
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_cors import CORS
-import config
-from config import SERVER_IP
+import aggregations
 import data_processor
-import threading
 import uploader
-import xbee_handler
+import segment_format
+from telemetry_broadcaster import TelemetryBroadcaster, FLEET_ROOM, boat_room
+from proxy_cache import ProxyCache, CacheEntry
+from werkzeug.http import parse_date
+from instrumentation import Gauge, render_metrics
+from logging_setup import setup_logging
+import fleet_bus
+from message_bus import BusBroker, BusClient, UnixSocketManager
+from sampling_profiler import SamplingProfiler, MIN_INTERVAL, MAX_INTERVAL
+
+logger = logging.getLogger(__name__)
 
 # Initialize Flask
 app = Flask(__name__)
@@ -14,44 +32,527 @@ app = Flask(__name__)
 # Enable CORS properly
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+socketio_options = {}
+if config.SERVER_ROLE != "standalone":
+    # Gateway and workers share emits, so a client sees the fleet whichever process it is on
+    if config.SOCKETIO_MESSAGE_QUEUE:
+        socketio_options['message_queue'] = config.SOCKETIO_MESSAGE_QUEUE
+    else:
+        socketio_options['client_manager'] = UnixSocketManager("unix://" + config.BUS_PATH)
+
 socketio = SocketIO(app,
                     cors_allowed_origins="*",
-                    async_mode='threading',
+                    async_mode=config.ASYNC_MODE,
                     ping_interval=60,
-                    ping_timeout=180)
+                    ping_timeout=180,
+                    **socketio_options)
 
 config.app = app
 config.socketio = socketio
+config.broadcaster = TelemetryBroadcaster(socketio,
+                                          interval=1.0 / config.BROADCAST_HZ,
+                                          legacy_emit=config.EMIT_LEGACY_BOAT_DATA,
+                                          local_rooms=config.SERVER_ROLE == "standalone")
+message_broker = None
+
+# Cache for the DB server proxy routes
+proxy_cache = ProxyCache(ttl=config.PROXY_CACHE_TTL,
+                         max_entries=config.PROXY_CACHE_MAX_ENTRIES,
+                         max_bytes=config.PROXY_CACHE_MAX_BYTES)
+# Off until toggled through /profiler/start
+profiler = SamplingProfiler(interval=config.PROFILER_INTERVAL, max_stacks=config.PROFILER_MAX_STACKS)
+
+# Cache for heatmap and track aggregates, keyed by table and query
+aggregate_cache = ProxyCache(ttl=config.AGGREGATE_CACHE_TTL,
+                             max_entries=config.AGGREGATE_CACHE_MAX_ENTRIES,
+                             max_bytes=config.AGGREGATE_CACHE_MAX_BYTES)
+
+def cached_upstream(key, path, transform):
+    """Return a cache entry for an upstream path, revalidating it once it is older than the TTL.
+
+    transform(response) turns a 200 upstream response into the JSON bytes we
+    serve, or None when there is nothing to serve.
+    """
+    entry, fresh = proxy_cache.get(key)
+    if entry is not None and fresh:
+        proxy_cache.count('hits')
+        return entry
+    if entry is not None:
+        response = data_processor.fetch_upstream(path, entry.upstream_etag, entry.upstream_last_modified)
+        if response is None or response.status_code >= 500:
+            # Upstream unreachable or failing: a stale answer beats none
+            proxy_cache.count('stale_served')
+            return entry
+        proxy_cache.count('revalidated')
+        if response.status_code == 304:
+            proxy_cache.refresh(key)
+            return entry
+    else:
+        proxy_cache.count('misses')
+        response = data_processor.fetch_upstream(path)
+        if response is None:
+            return None
+    body = transform(response) if response.status_code == 200 else None
+    if body is None:
+        proxy_cache.invalidate(key)
+        return None
+    upstream_last_modified = response.headers.get('Last-Modified')
+    entry = CacheEntry(body,
+                       upstream_etag=response.headers.get('ETag'),
+                       upstream_last_modified=upstream_last_modified,
+                       last_modified=parse_date(upstream_last_modified) if upstream_last_modified else None)
+    proxy_cache.put(key, entry)
+    return entry
+
+def respond_cached(entry, cache=proxy_cache):
+    """Serve a cache entry, answering 304 when the browser already has it."""
+    response = app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.last_modified = entry.last_modified
+    # Browsers must revalidate, which is cheap: a 304 from the cache
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+    if response.status_code == 304:
+        cache.count('not_modified_sent')
+    return response
+
+def tables_body(response):
+    tables = response.json()
+    names = tables.get("tables") if tables else None
+    return json.dumps(names).encode() if names else None
 
 @app.route("/get_available_tables", methods=["GET"])
 def get_available_tables():
     """API route to list all tables"""
-    tables = data_processor.get_all_tables()
-    if not tables:
+    entry = cached_upstream(('tables',), '/tables', tables_body)
+    if entry is None:
         return jsonify({"error": "No tables available"}), 404
-    return jsonify(tables)
+    return respond_cached(entry)
 
-# Run Flask server
-if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=5001, debug=True)
+@app.route("/proxy_cache_stats", methods=["GET"])
+def get_proxy_cache_stats():
+    """API route exposing proxy cache hit/miss counters and memory use"""
+    return jsonify(proxy_cache.stats())
 
-from flask import Flask, jsonify, request
-import data_processor
-import urllib.parse
+@app.route("/aggregate_cache_stats", methods=["GET"])
+def get_aggregate_cache_stats():
+    """API route exposing heatmap/track cache counters and memory use"""
+    return jsonify(aggregate_cache.stats())
+
+@app.route("/incoming_pipeline_stats", methods=["GET"])
+def get_incoming_pipeline_stats():
+    """API route exposing incoming message worker depth, drops and per-stage latency"""
+    return jsonify(config.incoming_pipeline.stats())
+
+@app.route("/calibration_request_stats", methods=["GET"])
+def get_calibration_request_stats():
+    """API route exposing pending, completed and timed-out calibration requests"""
+    return jsonify(config.calibration_requests.stats())
+
+@app.route("/outgoing_queue_stats", methods=["GET"])
+def get_outgoing_queue_stats():
+    """API route exposing outgoing command queue depth and latency per priority class"""
+    if isinstance(config.outgoing_queue, fleet_bus.BusCommandQueue):
+        return jsonify({"error": "Commands are queued on the gateway; see /message_bus_stats",
+                        "role": config.SERVER_ROLE}), 404
+    return jsonify(config.outgoing_queue.stats())
+
+def command_queue_stats():
+    """Per-priority stats of the local XBee command queue; none in a worker, which forwards commands."""
+    if isinstance(config.outgoing_queue, fleet_bus.BusCommandQueue):
+        return {}
+    return config.outgoing_queue.stats()
+
+@app.route("/message_bus_stats", methods=["GET"])
+def get_message_bus_stats():
+    """API route exposing this process's role and its traffic on the gateway's message bus"""
+    stats = {'role': config.SERVER_ROLE}
+    if message_broker is not None:
+        stats['broker'] = message_broker.stats()
+    if config.fleet_relay is not None:
+        stats['fleet_updates_published'] = config.fleet_relay.published
+    if isinstance(config.outgoing_queue, fleet_bus.BusCommandQueue):
+        stats['commands'] = config.outgoing_queue.stats()
+    return jsonify(stats)
+
+@app.route("/upload_stats", methods=["GET"])
+def get_upload_stats():
+    """API route exposing uploader throughput, compression and retry counters"""
+    return jsonify(uploader.upload_stats())
+
+# Queue depths and totals kept by the components themselves, read at scrape time
+Gauge("taflab_incoming_queue_depth", "Incoming frames waiting for a processor worker",
+      callback=lambda: {(): config.incoming_pipeline.depth()})
+Gauge("taflab_incoming_dropped_total", "Incoming frames dropped at the pipeline's max depth", kind="counter",
+      callback=lambda: {(): config.incoming_pipeline.dropped()})
+Gauge("taflab_outgoing_queue_depth", "Outgoing commands waiting to be sent", ("priority",),
+      callback=lambda: {priority: stats['depth'] for priority, stats in command_queue_stats().items()})
+Gauge("taflab_outgoing_coalesced_total", "Outgoing commands merged into a queued one", ("priority",), kind="counter",
+      callback=lambda: {priority: stats['coalesced'] for priority, stats in command_queue_stats().items()})
+Gauge("taflab_active_boats", "Boats heard from recently",
+      callback=lambda: {(): len(config.active_boats)})
+Gauge("taflab_boats_lost_total", "Boats evicted after BOAT_TIMEOUT seconds of silence", kind="counter",
+      callback=lambda: {(): config.liveness.evicted})
+Gauge("taflab_timers_pending", "Timers scheduled on the shared timer wheel",
+      callback=lambda: {(): config.timer_wheel.pending()})
+Gauge("taflab_telemetry_log_dropped_rows_total", "Log rows dropped because the writer fell behind", kind="counter",
+      callback=lambda: {(): config.telemetry_log.dropped})
+Gauge("taflab_telemetry_log_invalid_values_total", "Columnar log values that were not numbers and were stored as missing",
+      kind="counter", callback=lambda: {(): segment_format.invalid_values})
+Gauge("taflab_upload_backlog_files", "Log segments waiting to be uploaded", ("state",),
+      callback=lambda: uploader.upload_queue.counts() if uploader.upload_queue is not None else {})
+Gauge("taflab_upload_bytes_total", "Bytes uploaded, before (raw) and after (sent) compression", ("kind",), kind="counter",
+      callback=lambda: {'raw': uploader.upload_stats()['raw_bytes'], 'sent': uploader.upload_stats()['sent_bytes']})
+Gauge("taflab_upload_files_total", "Uploaded log segments by outcome", ("result",), kind="counter",
+      callback=lambda: {'uploaded': uploader.upload_stats()['files_uploaded'],
+                        'failed': uploader.upload_stats()['files_failed']})
+Gauge("taflab_proxy_cache_bytes", "Bytes held by the proxy and aggregate caches", ("cache",),
+      callback=lambda: {'proxy': proxy_cache.stats()['bytes'], 'aggregate': aggregate_cache.stats()['bytes']})
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route("/profiler", methods=["GET"])
+def get_profiler():
+    """Collapsed stacks from the sampling profiler (flamegraph.pl / speedscope input), or its status"""
+    if not config.PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled in config"}), 403
+    if request.args.get('format') == 'status':
+        return jsonify(profiler.status())
+    limit = request.args.get('limit', type=int)
+    return app.response_class(profiler.collapsed(limit), mimetype='text/plain')
+
+@app.route("/profiler/<action>", methods=["POST"])
+def toggle_profiler(action):
+    """Start or stop the sampling profiler in the running server (POST /profiler/start?interval=0.005)"""
+    if not config.PROFILER_ENABLED:
+        return jsonify({"error": "Profiler disabled in config"}), 403
+    if action == 'start':
+        interval = request.args.get('interval', type=float)
+        if 'interval' in request.args and (interval is None or not MIN_INTERVAL <= interval <= MAX_INTERVAL):
+            return jsonify({"error": f"interval must be between {MIN_INTERVAL} and {MAX_INTERVAL} seconds"}), 400
+        profiler.start(interval)
+    elif action == 'stop':
+        profiler.stop()
+    else:
+        return jsonify({"error": "action must be start or stop"}), 404
+    return jsonify(profiler.status())
+
+# Query parameters that select the streaming, paginated path of /table/<name>
+TABLE_QUERY_PARAMS = ('limit', 'offset', 'cursor', 'columns', 'start', 'end', 'format')
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def stream_json_records(records, ndjson=False):
+    """Serialize records as a JSON array (or NDJSON) in ~64 KB chunks."""
+    if not ndjson:
+        yield b'['
+    parts = []
+    size = 0
+    first = True
+    for record in records:
+        encoded = json.dumps(record).encode()
+        if ndjson:
+            encoded += b'\n'
+        elif not first:
+            encoded = b',' + encoded
+        first = False
+        parts.append(encoded)
+        size += len(encoded)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b''.join(parts)
+            parts, size = [], 0
+    if parts:
+        yield b''.join(parts)
+    if not ndjson:
+        yield b']'
+
+def stream_table_query(table_name):
+    """Paginated, column-projected, time-filtered rows streamed straight from upstream."""
+    args = request.args
+    try:
+        limit = int(args['limit']) if 'limit' in args else None
+        offset = int(args.get('cursor') or args.get('offset') or 0)
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "limit, offset and cursor must be non-negative integers"}), 400
+    columns = [name for name in args.get('columns', '').split(',') if name] or None
+    ndjson = args.get('format') == 'ndjson'
+
+    try:
+        records = data_processor.open_table_records(table_name)
+    except ValueError as e:
+        logger.warning("Invalid upstream body for table %s: %s", table_name, e)
+        return jsonify({"error": "Upstream returned an invalid table"}), 502
+    if records is None:
+        return jsonify({"error": "No data available"}), 404
+    # One row past the page tells whether there is a next page
+    selected = data_processor.select_records(records, columns=columns,
+                                             start=args.get('start'), end=args.get('end'),
+                                             time_field=args.get('time_field', 'timestamp'),
+                                             offset=offset, limit=None if limit is None else limit + 1)
+    if limit is None:
+        # Streamed as it arrives; an upstream error past this point cuts the response short
+        return app.response_class(stream_json_records(selected, ndjson),
+                                  mimetype='application/x-ndjson' if ndjson else 'application/json')
+    # A page holds at most limit rows, so it is read before the status goes out
+    try:
+        page = list(selected)
+    except ValueError as e:
+        logger.warning("Invalid upstream body for table %s: %s", table_name, e)
+        return jsonify({"error": "Upstream returned an invalid table"}), 502
+    finally:
+        records.close()
+    response = app.response_class(stream_json_records(page[:limit], ndjson),
+                                  mimetype='application/x-ndjson' if ndjson else 'application/json')
+    if limit and len(page) > limit:
+        response.headers['X-Next-Cursor'] = str(offset + limit)
+    return response
+
+def stream_table_passthrough(table_name, key):
+    """Stream an uncached table to the client unchanged, caching it afterwards if it fits."""
+    response = data_processor.stream_upstream(data_processor.table_path(table_name))
+    if response is None:
+        return None
+    if response.status_code != 200:
+        response.close()
+        return None
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_BYTES)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head.strip()) >= 2:
+            break
+    stripped = head.lstrip()
+    if stripped[:1] != b'[':
+        # Not a list of records; fall back to the buffered conversion
+        body = table_body_from_bytes(head + b''.join(chunks))
+        response.close()
+        if body is None:
+            return None
+        entry = CacheEntry(body)
+        proxy_cache.put(key, entry)
+        return respond_cached(entry)
+    if stripped[1:].lstrip()[:1] == b']':
+        response.close()
+        return None
+    upstream_etag = response.headers.get('ETag')
+    upstream_last_modified = response.headers.get('Last-Modified')
+
+    def generate():
+        kept = [head]
+        kept_bytes = len(head)
+        try:
+            yield head
+            for chunk in chunks:
+                if kept is not None:
+                    kept_bytes += len(chunk)
+                    if kept_bytes <= proxy_cache.max_bytes:
+                        kept.append(chunk)
+                    else:
+                        # Too big for the cache; stop keeping a copy
+                        kept = None
+                yield chunk
+        finally:
+            response.close()
+        if kept is not None:
+            proxy_cache.put(key, CacheEntry(
+                b''.join(kept),
+                upstream_etag=upstream_etag,
+                upstream_last_modified=upstream_last_modified,
+                last_modified=parse_date(upstream_last_modified) if upstream_last_modified else None))
+
+    return app.response_class(generate(), mimetype='application/json')
+
+def table_body_from_bytes(body):
+    if body.lstrip()[:1] != b'[':
+        # Not a list of records; normalize it the way the DataFrame path did
+        records = data_processor.records_from_json(body)
+        return json.dumps(records).encode() if records else None
+    if body.strip() == b'[]':
+        return None
+    # Already a JSON list of records: serve the upstream bytes as-is
+    return body
+
+def table_body(response):
+    return table_body_from_bytes(response.content)
 
 @app.route("/table/<path:table_name>", methods=["GET"])
 def get_boat_data(table_name):
-    """API route to serve boat data from a specific table."""
-    print(f"🔍 Received request for table: {table_name}")  # DEBUG PRINT
+    """API route to serve boat data from a specific table.
+
+    Optional query parameters: limit, offset or cursor (pagination),
+    columns=a,b (projection), start/end (ISO timestamps, inclusive),
+    format=ndjson. With any of them the rows are streamed from upstream
+    without buffering the table; without them the whole table is served,
+    from the proxy cache when possible.
+    """
+    logger.debug("Received request for table: %s", table_name)
+
+    if any(name in request.args for name in TABLE_QUERY_PARAMS):
+        return stream_table_query(table_name)
 
-    df = data_processor.fetch_boat_data(table_name)
+    key = ('table', table_name)
+    cached, _ = proxy_cache.get(key)
+    if cached is None:
+        streamed = stream_table_passthrough(table_name, key)
+        if streamed is None:
+            logger.info("No data found for table: %s", table_name)
+            return jsonify({"error": "No data available"}), 404
+        return streamed
 
-    if df.empty:
-        print(f"❌ No data found for table: {table_name}")  # DEBUG PRINT
+    entry = cached_upstream(key, data_processor.table_path(table_name), table_body)
+
+    if entry is None:
+        logger.info("No data found for table: %s", table_name)
         return jsonify({"error": "No data available"}), 404
 
-    print(f"✅ Successfully fetched data for {table_name}")  # DEBUG PRINT
-    return jsonify(df.to_dict(orient="records"))
+    logger.debug("Served table %s", table_name)
+    return respond_cached(entry)
+
+def parse_bbox(value):
+    """bbox=min_lng,min_lat,max_lng,max_lat, rounded so nearby viewports share a cache entry."""
+    if not value:
+        return None
+    parts = [round(float(part), 5) for part in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    return tuple(parts)
+
+def cached_aggregate(key, table_name, compute):
+    """Serve an aggregate from the cache, or stream the table once through compute(records)."""
+    entry, fresh = aggregate_cache.get(key)
+    if entry is not None and fresh:
+        aggregate_cache.count('hits')
+        return respond_cached(entry, aggregate_cache)
+    if entry is None:
+        aggregate_cache.count('misses')
+    try:
+        records = data_processor.open_table_records(table_name)
+        if records is None:
+            if entry is not None:
+                # Upstream unreachable: a stale answer beats none
+                aggregate_cache.count('stale_served')
+                return respond_cached(entry, aggregate_cache)
+            return jsonify({"error": "No data available"}), 404
+        if entry is not None:
+            aggregate_cache.count('revalidated')
+        try:
+            result = compute(records)
+        finally:
+            records.close()
+    except ValueError as e:
+        logger.warning("Invalid upstream body for table %s: %s", table_name, e)
+        return jsonify({"error": "Upstream returned an invalid table"}), 502
+    entry = CacheEntry(json.dumps(result, separators=(',', ':')).encode())
+    aggregate_cache.put(key, entry)
+    return respond_cached(entry, aggregate_cache)
+
+@app.route("/heatmap/<path:table_name>", methods=["GET"])
+def get_heatmap(table_name):
+    """API route returning a table binned into a map grid instead of raw rows.
+
+    Query parameters: zoom (web map zoom level, default 14), field (value to
+    aggregate, default temperature), agg (mean, min, max, sum or count) and
+    bbox=min_lng,min_lat,max_lng,max_lat. Each cell is
+    [lat, lng, value, count] at the cell centre.
+    """
+    try:
+        zoom = int(request.args.get('zoom', config.HEATMAP_DEFAULT_ZOOM))
+        if not 0 <= zoom <= config.HEATMAP_MAX_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {config.HEATMAP_MAX_ZOOM}")
+        bbox = parse_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    field = request.args.get('field', 'temperature')
+    agg = request.args.get('agg', 'mean')
+    if agg not in aggregations.AGGREGATES:
+        return jsonify({"error": f"agg must be one of {', '.join(aggregations.AGGREGATES)}"}), 400
+    boat_id = request.args.get('boat_id')
+
+    def compute(records):
+        columns, _ = aggregations.collect_columns(records, ('latitude', 'longitude', field), boat_id=boat_id)
+        cells = aggregations.grid_aggregate(columns['latitude'], columns['longitude'], columns[field],
+                                            zoom, bbox=bbox, agg=agg)
+        return {"zoom": zoom, "field": field, "agg": agg, "cells": cells}
+
+    return cached_aggregate(('heatmap', table_name, zoom, bbox, field, agg, boat_id), table_name, compute)
+
+@app.route("/track/<path:table_name>", methods=["GET"])
+def get_track(table_name):
+    """API route returning a downsampled boat track.
+
+    Query parameters: boat_id, points (target number of points, default
+    500), method (lttb keeps the shape of the path, stride keeps every n-th
+    fix) and bbox. Rows are [timestamp, lat, lng] in table order.
+    """
+    try:
+        points = int(request.args.get('points', config.TRACK_DEFAULT_POINTS))
+        if not 3 <= points <= config.TRACK_MAX_POINTS:
+            raise ValueError(f"points must be between 3 and {config.TRACK_MAX_POINTS}")
+        bbox = parse_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    method = request.args.get('method', 'lttb')
+    if method not in ('lttb', 'stride'):
+        return jsonify({"error": "method must be lttb or stride"}), 400
+    boat_id = request.args.get('boat_id')
+
+    def compute(records):
+        columns, timestamps = aggregations.collect_columns(records, ('latitude', 'longitude'), boat_id=boat_id)
+        lat, lng = columns['latitude'], columns['longitude']
+        if bbox is not None:
+            inside = aggregations.in_bbox(lat, lng, bbox)
+            lat, lng = lat[inside], lng[inside]
+            timestamps = [timestamps[i] for i in inside.nonzero()[0]]
+        if method == 'lttb':
+            indices = aggregations.lttb_indices(lng, lat, points)
+        else:
+            indices = aggregations.stride_indices(len(lat), points)
+        track = [[timestamps[i], round(float(lat[i]), 7), round(float(lng[i]), 7)] for i in indices]
+        return {"boat_id": boat_id, "method": method, "total": len(lat), "points": track}
+
+    return cached_aggregate(('track', table_name, boat_id, points, method, bbox), table_name, compute)
+
+def recent_history(boat_id, seconds=None, points=None):
+    """Track and rolling stats for a boat from the in-memory history, or None if unknown."""
+    track = config.telemetry_history.track(boat_id, seconds)
+    if track is None:
+        return None
+    if points is not None:
+        track = track[aggregations.lttb_indices(track[:, 2], track[:, 1], points)]
+    return {"boat_id": boat_id,
+            "track": track.tolist(),
+            "stats": config.telemetry_history.stats(boat_id, seconds)}
+
+def history_args(args):
+    seconds = args.get('seconds')
+    points = args.get('points')
+    seconds = float(seconds) if seconds is not None else None
+    points = int(points) if points is not None else None
+    if seconds is not None and seconds <= 0:
+        raise ValueError("seconds must be positive")
+    if points is not None and not 3 <= points <= config.TRACK_MAX_POINTS:
+        raise ValueError(f"points must be between 3 and {config.TRACK_MAX_POINTS}")
+    return seconds, points
+
+@app.route("/history/<boat_id>", methods=["GET"])
+def get_history(boat_id):
+    """API route serving a boat's recent track and rolling stats straight from memory.
+
+    Query parameters: seconds (window, capped at HISTORY_SECONDS) and
+    points (LTTB downsample the track). Track rows are [epoch, lat, lng].
+    """
+    try:
+        seconds, points = history_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    history = recent_history(boat_id, seconds, points)
+    if history is None:
+        return jsonify({"error": "No history for boat"}), 404
+    return jsonify(history)
 
 
 # SocketIO Event Handlers
@@ -63,26 +564,57 @@ def handle_connect():
     connect_time = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
     with config.clients_lock:
         config.clients[sid] = {'ip': client_ip, 'connect_time': connect_time}
-    print(f"Client connected: {sid} from IP {client_ip} at {connect_time}")
+    # Every client gets the whole fleet until it subscribes to specific boats
+    join_room(FLEET_ROOM)
+    logger.info("Client connected: %s from IP %s at %s", sid, client_ip, connect_time)
+
+@socketio.on('subscribe_boats')
+def handle_subscribe_boats(data):
+    """Limit telemetry batches to the given boat ids; an empty list means the whole fleet."""
+    try:
+        sid = request.sid
+        boat_ids = (data or {}).get('boat_ids') or []
+        joined, left = config.broadcaster.subscribe(sid, boat_ids)
+        for boat_id in left:
+            leave_room(boat_room(boat_id))
+        for boat_id in joined:
+            join_room(boat_room(boat_id))
+        if boat_ids:
+            leave_room(FLEET_ROOM)
+        else:
+            join_room(FLEET_ROOM)
+        logger.info("Client %s subscribed to boats: %s", sid, boat_ids or 'all')
+    except Exception as e:
+        logger.exception("Error in handle_subscribe_boats: %s", e)
 
 @socketio.on('request_boat_list')
 def handle_request_boat_list():
     try:
-        with config.active_boats_lock:
-            boat_list = [{'boat_id': boat_id, 'data': info['data']} for boat_id, info in config.active_boats.items()]
+        boat_list = config.active_boats.snapshot()
         emit('boat_locations', boat_list)
-        print("Sent boat list to frontend.")
-        print(f"Boats connected: {len(boat_list)}")
+        logger.debug("Sent boat list to frontend, %d boats connected.", len(boat_list))
+    except Exception as e:
+        logger.exception("Error in handle_request_boat_list: %s", e)
+
+@socketio.on('request_history')
+def handle_request_history(data):
+    try:
+        boat_id = data.get('boat_id')
+        seconds, points = history_args(data)
+        history = recent_history(boat_id, seconds, points)
+        if history is None:
+            emit('boat_history', {'boat_id': boat_id, 'error': 'No history for boat'})
+            return
+        emit('boat_history', history)
     except Exception as e:
-        print(f"Error in handle_request_boat_list: {e}")
-        traceback.print_exc()
+        logger.exception("Error in handle_request_history: %s", e)
 
 @socketio.on('gui_data')
 def handle_gui_data(data):
     try:
         boat_id = data.get('id')
         if not boat_id:
-            print("No boat_id specified in the data.")
+            logger.warning("No boat_id specified in the data.")
             return
 
         mode = data.get('md')
@@ -97,58 +629,54 @@ def handle_gui_data(data):
         elif mode == 'auto':
             payload.update({"tlat": data.get('tlat', 0), "tlng": data.get('tlng', 0)})
         else:
-            print("Invalid mode specified.")
+            logger.warning("Invalid mode specified: %s", mode)
             return
 
         config.outgoing_queue.put(payload)
     except Exception as e:
-        print(f"Error in handle_gui_data: {e}")
-        traceback.print_exc()
+        logger.exception("Error in handle_gui_data: %s", e)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     sid = request.sid
     with config.clients_lock:
         client_info = config.clients.pop(sid, None)
+    config.broadcaster.unsubscribe(sid)
     if client_info:
-        print(f"Client disconnected: {sid} from IP {client_info['ip']}")
+        logger.info("Client disconnected: %s from IP %s", sid, client_info['ip'])
 
 @socketio.on('request_calibration_data')
 def handle_request_calibration_data(data):
     boat_id = data.get('id')
-    request_payload = {"t": "req_cal_data", "id": boat_id}
-    config.outgoing_queue.put(request_payload)
-    print(f"Sent calibration data request to boat {boat_id}")
-
-    calibration_response_event = threading.Event()
-
-    def calibration_response_listener(response_data):
-        if response_data.get('id') == boat_id and response_data.get('t') == "cal_data":
-            socketio.emit('calibration_data_response', {'id': boat_id, 'data': response_data})
-            calibration_response_event.set()
+    sid = request.sid
 
-    socketio.on_event('calibration_data_response', calibration_response_listener)
+    def on_response(boat_id, request_id, response_data):
+        # Runs on an incoming pipeline worker when the boat's cal_data arrives
+        socketio.emit('calibration_data_response', {'id': boat_id, 'data': response_data}, to=sid)
+        logger.info("Calibration data for %s successfully received and sent to frontend", boat_id)
 
-    if not calibration_response_event.wait(timeout=5):
+    def on_timeout(boat_id, request_id):
         socketio.emit('calibration_data_response', {
             'id': boat_id,
             'error': 'Calibration data not received from boat'
-        })
-    else:
-        print(f"Calibration data for {boat_id} successfully received and sent to frontend")
+        }, to=sid)
+
+    # Returns straight away; the reply or the timeout completes the request
+    request_id = config.calibration_requests.add(boat_id, on_response, on_timeout)
+    config.outgoing_queue.put({"t": "req_cal_data", "id": boat_id, "rq": request_id})
+    logger.info("Sent calibration data request %d to boat %s", request_id, boat_id)
 
 @socketio.on('calibration_data')
 def handle_calibration_data(data):
     try:
-        print(f"Received calibration data: {data}")
-        print(f"Data type: {type(data)}")
+        logger.debug("Received calibration data: %s", data)
 
         if isinstance(data, dict):
             if 'id' in data:
                 boat_id = data.get('id')
                 with config.calibration_lock:
                     config.calibration_settings[boat_id] = data
-                print(f"Calibration data for {boat_id} saved: {data}")
+                logger.info("Calibration data for %s saved: %s", boat_id, data)
                 
                 payload = {
                     "t": "cal",
@@ -161,14 +689,13 @@ def handle_calibration_data(data):
                     "ex": round(data.get("throttleMax"), 1)
                 }
                 if isinstance(payload, dict):
-                    xbee_handler.send_via_xbee(payload)
+                    config.outgoing_queue.put(payload)
             else:
-                print("Data does not contain 'id' key.")
+                logger.warning("Calibration data does not contain 'id' key.")
         else:
-            print("Data is not a dictionary.")
+            logger.warning("Calibration data is not a dictionary: %r", data)
     except Exception as e:
-        print(f"Error in handle_calibration_data: {e}")
-        traceback.print_exc()
+        logger.exception("Error in handle_calibration_data: %s", e)
 
 @socketio.on('test_calibration')
 def handle_test_calibration(data):
@@ -178,25 +705,64 @@ def handle_test_calibration(data):
         value = data.get('value')
         payload = {"t": "cal_test", "id": boat_id, value_type: value}
         config.outgoing_queue.put(payload)
-        print(f"Testing calibration for {boat_id} - {value_type}: {value}")
+        logger.info("Testing calibration for %s - %s: %s", boat_id, value_type, value)
     except Exception as e:
-        print(f"Error in handle_test_calibration: {e}")
-        traceback.print_exc()
+        logger.exception("Error in handle_test_calibration: %s", e)
 
-if __name__ == '__main__':
+def start_gateway_bus():
+    """Gateway: serve the message bus, mirror fleet state to the workers and take their commands."""
+    global message_broker
+    message_broker = BusBroker(config.BUS_PATH)
+    message_broker.start()
+    config.fleet_relay = fleet_bus.FleetRelay(BusClient(config.BUS_PATH), interval=1.0 / config.BROADCAST_HZ)
+    threading.Thread(target=config.fleet_relay.run, daemon=True).start()
+    threading.Thread(target=fleet_bus.forward_commands, args=(BusClient(config.BUS_PATH),), daemon=True).start()
+    threading.Thread(target=fleet_bus.serve_snapshots, args=(BusClient(config.BUS_PATH), config.fleet_relay),
+                     daemon=True).start()
+
+def run_worker():
+    """Socket.IO-only process: fleet state arrives over the gateway's bus and commands go back over it."""
+    config.outgoing_queue = fleet_bus.BusCommandQueue(BusClient(config.BUS_PATH))
+    threading.Thread(target=fleet_bus.apply_fleet_updates, args=(BusClient(config.BUS_PATH),), daemon=True).start()
+    # Calibration request timeouts
+    threading.Thread(target=config.timer_wheel.run, daemon=True).start()
+    # Mirrored history ages out here just as it does on the gateway
+    threading.Thread(target=xbee_handler.prune_history, daemon=True).start()
+    logger.info("Socket.IO worker on port %d, fed by the message bus at %s", config.SERVER_PORT, config.BUS_PATH)
+    socketio.run(app, host=config.SERVER_HOST, port=config.SERVER_PORT, debug=config.DEBUG,
+                 use_reloader=False, allow_unsafe_werkzeug=True)
+
+def main():
+    setup_logging(level=config.LOGGING_LEVEL,
+                  module_levels=config.LOGGING_MODULE_LEVELS,
+                  json_output=config.LOGGING_JSON,
+                  rate_limit=config.LOGGING_RATE_LIMIT)
+    if config.SERVER_ROLE == "worker":
+        run_worker()
+        return
+    if config.SERVER_ROLE == "gateway":
+        start_gateway_bus()
     try:
-        # Open the XBee device
+        # Service the radio first; everything below can catch up while boats are already heard
         xbee_handler.open_xbee_device()
-        # Start XBee-related threads and periodic tasks
         xbee_handler.start_threads()
         xbee_handler.start_periodic_tasks()
-        # Start the CSV writer thread
-        threading.Thread(target=data_processor.periodic_csv_writer, daemon=True).start()
+        logger.info("XBee dispatcher up %.2f s after launch", time.monotonic() - STARTED)
+        # Start the batched GUI telemetry broadcaster
+        threading.Thread(target=config.broadcaster.run, daemon=True).start()
+        # Start the streaming telemetry log writer; finished segments go straight to the uploader
+        config.telemetry_log.on_rotate = uploader.notify_new_segment
+        threading.Thread(target=config.telemetry_log.run, daemon=True).start()
         # Start the uploader thread
         threading.Thread(target=uploader.upload_csv_files, daemon=True).start()
         # Run the Flask-SocketIO server
-        socketio.run(app, host='0.0.0.0', port=5001, debug=True)
+        socketio.run(app, host=config.SERVER_HOST, port=config.SERVER_PORT, debug=config.DEBUG,
+                     use_reloader=False, allow_unsafe_werkzeug=True)
     finally:
+        config.telemetry_log.close()
         if xbee_handler.device and xbee_handler.device.is_open():
             xbee_handler.device.close()
-            print("XBee device closed.")
+            logger.info("XBee device closed.")
+
+if __name__ == '__main__':
+    main()
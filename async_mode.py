@@ -0,0 +1,34 @@
+import os
+
+# Concurrency model of the Socket.IO server, chosen at startup with TAFLAB_ASYNC_MODE:
+#   "threading": an OS thread per connection and per worker (development default)
+#   "eventlet" / "gevent": green threads, so hundreds of dashboard connections and
+#   in-flight upstream requests share one process; requires that package installed
+ASYNC_MODE = os.environ.get("TAFLAB_ASYNC_MODE", "threading")
+ASYNC_MODES = ("threading", "eventlet", "gevent")
+
+_patched = False
+
+
+def monkey_patch():
+    """Make the standard library cooperative for the green-thread modes.
+
+    Must run before config and the other modules create their locks,
+    threads and sockets, so app.py calls it first. Afterwards threading,
+    time.sleep, queue and socket I/O (including requests' pooled session to
+    the DB server) yield to other green threads instead of blocking the
+    process. CPU-bound work (NumPy aggregation, CSV export) still runs
+    without yielding.
+    """
+    global _patched
+    if ASYNC_MODE not in ASYNC_MODES:
+        raise ValueError(f"Unknown TAFLAB_ASYNC_MODE {ASYNC_MODE!r}; expected one of {ASYNC_MODES}")
+    if _patched or ASYNC_MODE == "threading":
+        return
+    if ASYNC_MODE == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    else:
+        from gevent import monkey
+        monkey.patch_all()
+    _patched = True
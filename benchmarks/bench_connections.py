@@ -0,0 +1,172 @@
+"""Connection-scaling benchmark for the Socket.IO server.
+
+Starts app.main() in a subprocess (TAFLAB_ASYNC_MODE picks threading,
+eventlet or gevent) with a simulated fleet, connects an increasing number of
+dashboard clients and, at each step, measures connect time, telemetry
+delivery latency (batch timestamp to receipt) and batches received per
+client, plus the server's RSS, thread count and CPU.
+
+    python benchmarks/bench_connections.py --clients 50 200 500 --mode eventlet
+"""
+import argparse
+import concurrent.futures
+import datetime
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = """
+import sys
+sys.path.insert(0, {root!r})
+import async_mode
+async_mode.monkey_patch()
+import config
+config.SERVER_HOST = "127.0.0.1"
+config.SERVER_PORT = {port}
+config.XBEE_SIMULATOR = "fleet"
+config.SIM_BOATS = {boats}
+config.SIM_RATE = {rate}
+config.LOGGING_LEVEL = "WARNING"
+import app
+app.main()
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def process_stats(pid):
+    """(RSS MB, threads, CPU seconds) of a process from /proc."""
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.strip()
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return int(status["VmRSS"].split()[0]) / 1024, int(status["Threads"]), cpu
+
+
+class Dashboard:
+    """One GUI client counting boat_data_batch events and their delivery latency."""
+
+    def __init__(self, url, transports):
+        self.url = url
+        self.transports = transports
+        self.client = socketio.Client(reconnection=False)
+        self.batches = 0
+        self.latencies = []
+        self.measuring = False
+        self.client.on('boat_data_batch', self.on_batch)
+
+    def on_batch(self, data):
+        if not self.measuring:
+            return
+        self.batches += 1
+        # The server stamps batches with naive UTC
+        sent = datetime.datetime.fromisoformat(data['timestamp'])
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        self.latencies.append((now - sent).total_seconds() * 1000)
+
+    def connect(self):
+        started = time.perf_counter()
+        self.client.connect(self.url, transports=self.transports, wait_timeout=30)
+        return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100],
+                        help="total connected clients at each step")
+    parser.add_argument("--mode", default=os.environ.get("TAFLAB_ASYNC_MODE", "threading"),
+                        choices=("threading", "eventlet", "gevent"))
+    parser.add_argument("--boats", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=2.0, help="dt1/dt2 pairs per boat per second")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measurement time per step")
+    parser.add_argument("--transport", choices=("polling", "websocket"), default="websocket",
+                        help="websocket needs the websocket-client package")
+    parser.add_argument("--connect-workers", type=int, default=16)
+    args = parser.parse_args()
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="taflab-conn-")
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(root=ROOT, port=port, boats=args.boats, rate=args.rate)],
+        cwd=workdir, env=dict(os.environ, TAFLAB_ASYNC_MODE=args.mode),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise SystemExit("Server did not start")
+                time.sleep(0.2)
+        time.sleep(1)  # Let the simulated fleet register
+
+        transports = ["websocket"] if args.transport == "websocket" else ["polling"]
+        dashboards = []
+        print(f"mode={args.mode} transport={args.transport} boats={args.boats} rate={args.rate:g} Hz")
+        print(f"{'clients':>7} {'failed':>6} {'conn p50':>9} {'conn p99':>9} {'lat p50':>8} {'lat p99':>8} "
+              f"{'batch/s':>8} {'rss MB':>7} {'threads':>7} {'cpu %':>6}")
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=args.connect_workers)
+        for target in args.clients:
+            new = [Dashboard(url, transports) for _ in range(max(0, target - len(dashboards)))]
+            connect_times, failed = [], 0
+            for dashboard, future in zip(new, [pool.submit(d.connect) for d in new]):
+                try:
+                    connect_times.append(future.result())
+                    dashboards.append(dashboard)
+                except Exception:
+                    failed += 1
+            time.sleep(1)
+            for dashboard in dashboards:
+                dashboard.batches = 0
+                dashboard.latencies = []
+                dashboard.measuring = True
+            _, _, cpu_start = process_stats(server.pid)
+            time.sleep(args.seconds)
+            for dashboard in dashboards:
+                dashboard.measuring = False
+            rss, threads, cpu_end = process_stats(server.pid)
+            latencies = [value for dashboard in dashboards for value in dashboard.latencies]
+            batches = sum(dashboard.batches for dashboard in dashboards) / max(1, len(dashboards)) / args.seconds
+            print(f"{len(dashboards):>7} {failed:>6} {percentile(connect_times, 50):>9.1f} "
+                  f"{percentile(connect_times, 99):>9.1f} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 99):>8.1f} {batches:>8.1f} {rss:>7.1f} {threads:>7} "
+                  f"{(cpu_end - cpu_start) / args.seconds * 100:>6.0f}")
+        disconnects = [pool.submit(dashboard.client.disconnect) for dashboard in dashboards]
+        concurrent.futures.wait(disconnects, timeout=30)
+        pool.shutdown(wait=False)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""End-to-end load test: simulated fleet -> XBee pipeline -> Socket.IO -> log segments -> uploader.
+
+A SyntheticFleet (or a replayed capture) feeds a SimulatedXBeeDevice, and the
+real xbee_handler threads, TelemetryBroadcaster, TelemetryLogWriter and
+uploader run against a stub DB server on localhost. A Socket.IO test client
+stands in for the GUI. Reports throughput, frame-to-GUI latency (p50/p99,
+including the broadcast tick), log and upload volume, CPU and memory.
+
+Several --boats values each run in a fresh process and are summarised in a
+table, to see where the fleet stops scaling:
+
+    python benchmarks/bench_end_to_end.py --boats 10 50 200 --rate 2 --seconds 20
+    python benchmarks/bench_end_to_end.py --capture capture.jsonl --speed 0
+"""
+import argparse
+import collections
+import http.server
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, upload_seconds):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.upload_seconds = upload_seconds
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_received = 0
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts /upload, /upload_batch and /upload_chunk; everything else is a 404."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path == "/health" else 404)
+        self.end_headers()
+
+    def do_OPTIONS(self):
+        # Advertise compressed uploads (RFC 7694) so the uploader uses them
+        self.send_response(200)
+        self.send_header("Accept-Encoding", "gzip, zstd")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.server.upload_seconds:
+            time.sleep(self.server.upload_seconds)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.bytes_received += len(body)
+        if self.path not in ("/upload", "/upload_batch", "/upload_chunk"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        reply = b"{}"
+        if self.path == "/upload_chunk":
+            end = int(self.headers["Content-Range"].split()[1].split("/")[0].split("-")[1])
+            reply = json.dumps({"offset": end + 1}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6
+
+
+def latitude_key(boat_id, latitude):
+    # Latitudes travel at 1e-7 degree resolution in both wire formats
+    return boat_id, int(round(latitude * 1e7))
+
+
+def run_once(args):
+    """One fleet size in this process; returns the results dict."""
+    if args.tracemalloc:
+        tracemalloc.start()
+    workdir = tempfile.mkdtemp(prefix="taflab-bench-")
+    stub = StubServer(args.upload_ms / 1000.0)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    server = f"127.0.0.1:{stub.server_port}"
+
+    # Point everything at the scratch directory and the stub before the modules that read config load
+    import config
+    config.CSV_DIR = os.path.join(workdir, "csv_data")
+    config.CSV_SENT_DIR = os.path.join(workdir, "csv_data_sent")
+    config.UPLOAD_MANIFEST = os.path.join(config.CSV_DIR, "upload_manifest.json")
+    config.UPLOAD_QUEUE_DB = os.path.join(config.CSV_DIR, "upload_queue.sqlite3")
+    config.SERVER_IP = server
+    config.HEALTH_URL = f"http://{server}/health"
+    config.UPLOAD_URL = f"http://{server}/upload"
+    config.UPLOAD_CHUNK_URL = f"http://{server}/upload_chunk"
+    config.UPLOAD_BATCH_URL = f"http://{server}/upload_batch"
+    config.UPLOAD_COMPRESSION = "gzip"
+    if args.workers:
+        from message_pipeline import ShardedPipeline
+        config.incoming_pipeline = ShardedPipeline(workers=args.workers,
+                                                   high_water=config.INCOMING_HIGH_WATER,
+                                                   max_depth=config.INCOMING_MAX_DEPTH)
+    from telemetry_log import TelemetryLogWriter
+    config.telemetry_log = TelemetryLogWriter(config.CSV_DIR,
+                                              max_age=args.rotate_seconds,
+                                              fsync_rows=config.LOG_FSYNC_ROWS,
+                                              fsync_interval=config.LOG_FSYNC_INTERVAL,
+                                              max_pending=config.LOG_MAX_PENDING_ROWS,
+                                              log_format=args.log_format)
+
+    import app
+    import connectivity
+    import instrumentation
+    import uploader
+    import xbee_handler
+    import xbee_simulator
+    connectivity.monitor.health_url = config.HEALTH_URL
+
+    # boat_id -> deque of (latitude key, injection time); frames coalesced away by the broadcaster are skipped
+    injected = {}
+    injected_lock = threading.Lock()
+
+    def on_frame(boat_id, message, timestamp):
+        if message["t"] == "dt1":
+            with injected_lock:
+                injected.setdefault(boat_id, collections.deque()).append(
+                    (latitude_key(boat_id, message["lt"]), timestamp))
+
+    def injected_at(boat_id, latitude):
+        key = latitude_key(boat_id, latitude)
+        with injected_lock:
+            pending = injected.get(boat_id)
+            while pending:
+                sent_key, sent = pending.popleft()
+                if sent_key == key:
+                    return sent
+        return None
+
+    device = xbee_simulator.SimulatedXBeeDevice()
+    if args.capture:
+        source = device.attach(xbee_simulator.CaptureReplay(args.capture, speed=args.speed))
+    else:
+        source = device.attach(xbee_simulator.SyntheticFleet(boats=args.boats[0], rate=args.rate,
+                                                             binary=args.binary,
+                                                             reply_to_polls=not args.no_polls,
+                                                             on_frame=on_frame))
+
+    gui = app.socketio.test_client(app.app)
+    latencies = []
+    gui_stats = {"batches": 0, "updates": 0}
+    receiving = threading.Event()
+    receiving.set()
+
+    def receive():
+        while receiving.is_set():
+            for packet in gui.get_received():
+                if packet["name"] != "boat_data_batch":
+                    continue
+                received = time.perf_counter()
+                gui_stats["batches"] += 1
+                for boat in packet["args"][0]["boats"]:
+                    gui_stats["updates"] += 1
+                    latitude = boat["data"].get("latitude")
+                    if latitude is None:
+                        continue
+                    sent = injected_at(boat["boat_id"], latitude)
+                    if sent is not None:
+                        latencies.append((received - sent) * 1000)
+            time.sleep(0.002)
+
+    rss_start = rss_mb()
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    xbee_handler.device = device
+    xbee_handler.xbee_ready = True
+    device.open()
+    device.add_data_received_callback(xbee_handler.on_xbee_data_received)
+    xbee_handler.start_threads()
+    xbee_handler.start_periodic_tasks()
+    threading.Thread(target=config.broadcaster.run, daemon=True).start()
+    config.telemetry_log.on_rotate = uploader.notify_new_segment
+    threading.Thread(target=config.telemetry_log.run, daemon=True).start()
+    threading.Thread(target=uploader.upload_csv_files, daemon=True).start()
+    threading.Thread(target=receive, daemon=True).start()
+
+    started = time.perf_counter()
+    if args.capture and args.seconds <= 0:
+        source.finished.wait()
+    else:
+        time.sleep(args.seconds)
+    device.close()
+    elapsed = time.perf_counter() - started
+
+    # Drain: processors, one last broadcast tick, the open log segment and its upload
+    pipeline = config.incoming_pipeline
+    deadline = time.monotonic() + 30
+    while pipeline.depth() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(config.broadcaster.interval * 3)
+    receiving.clear()
+    config.telemetry_log.close()
+    while time.monotonic() < deadline:
+        queue = uploader.upload_queue.counts() if uploader.upload_queue is not None else None
+        if queue is not None and not any(queue.values()):
+            break
+        time.sleep(0.05)
+    drained = time.perf_counter() - started - elapsed
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    stats = pipeline.stats()
+    upload = uploader.upload_stats()
+    job_child = instrumentation.UPLOAD_JOB_SECONDS.labels()
+    frames = device.received_frames
+    results = {
+        "boats": len(source.boats) if hasattr(source, "boats") else None,
+        "rate": args.rate,
+        "binary": args.binary,
+        "seconds": elapsed,
+        "drain_seconds": drained,
+        "frames_injected": frames,
+        "frames_per_second": frames / elapsed if elapsed else 0.0,
+        "frames_processed": stats["processed"],
+        "frames_dropped": stats["dropped"],
+        "pipeline_max_depth": stats["max_depth_seen"],
+        "stages": stats["stages"],
+        "frames_sent": device.sent_frames,
+        "polls_answered": getattr(source, "polls_answered", 0),
+        "gui_batches": gui_stats["batches"],
+        "gui_updates": gui_stats["updates"],
+        "latency_samples": len(latencies),
+        "latency_p50_ms": percentile(latencies, 50),
+        "latency_p99_ms": percentile(latencies, 99),
+        "latency_max_ms": max(latencies or [0.0]),
+        "rows_written": config.telemetry_log.rows_written,
+        "rows_dropped": config.telemetry_log.dropped,
+        "files_uploaded": upload["files_uploaded"],
+        "files_failed": upload["files_failed"],
+        "upload_requests": stub.requests,
+        "upload_bytes": stub.bytes_received,
+        "upload_job_avg_ms": job_child.sum / job_child.count * 1000 if job_child.count else 0.0,
+        "cpu_seconds": (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime),
+        "rss_start_mb": rss_start,
+        "rss_end_mb": rss_mb(),
+        "rss_peak_mb": peak_rss_mb(),
+    }
+    if args.tracemalloc:
+        results["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+    stub.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def report(results):
+    fleet = f"{results['boats']} boats" if results["boats"] is not None else "capture replay"
+    print(f"Fleet: {fleet}, {results['rate']:g} Hz push, "
+          f"{'binary' if results['binary'] else 'JSON'}, {results['seconds']:.1f}s "
+          f"(+{results['drain_seconds']:.1f}s drain)")
+    print(f"RX: {results['frames_injected']} frames ({results['frames_per_second']:.0f}/s), "
+          f"{results['frames_processed']} processed, {results['frames_dropped']} dropped, "
+          f"max depth {results['pipeline_max_depth']}")
+    for name, stage in results["stages"].items():
+        print(f"RX stage {name:<7} avg={stage['latency_avg_ms']:.3f} ms max={stage['latency_max_ms']:.3f} ms")
+    print(f"TX: {results['frames_sent']} frames sent, {results['polls_answered']} polls answered")
+    print(f"GUI: {results['gui_batches']} batches, {results['gui_updates']} boat updates; "
+          f"frame->GUI latency ms p50={results['latency_p50_ms']:.1f} p99={results['latency_p99_ms']:.1f} "
+          f"max={results['latency_max_ms']:.1f} (n={results['latency_samples']})")
+    print(f"Log: {results['rows_written']} rows written, {results['rows_dropped']} dropped")
+    print(f"Upload: {results['files_uploaded']} files ({results['files_failed']} failed), "
+          f"{results['upload_bytes'] / 1e3:.1f} KB in {results['upload_requests']} requests, "
+          f"job avg {results['upload_job_avg_ms']:.1f} ms")
+    print(f"CPU: {results['cpu_seconds']:.2f}s ({results['cpu_seconds'] / results['seconds'] * 100:.0f}% of one core)")
+    memory = (f"Memory: RSS {results['rss_start_mb']:.1f} -> {results['rss_end_mb']:.1f} MB, "
+              f"peak {results['rss_peak_mb']:.1f} MB")
+    if "tracemalloc_peak_mb" in results:
+        memory += f", tracemalloc peak {results['tracemalloc_peak_mb']:.1f} MB"
+    print(memory)
+
+
+def sweep(args, argv):
+    """Run each fleet size in its own process and tabulate the results."""
+    rows = []
+    base = [arg for arg in argv if arg != "--json"]
+    boats_at = base.index("--boats")
+    end = boats_at + 1
+    while end < len(base) and not base[end].startswith("--"):
+        end += 1
+    for boats in args.boats:
+        command = [sys.executable, os.path.abspath(__file__)] + base[:boats_at] + \
+                  ["--boats", str(boats), "--json"] + base[end:]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+        print(f"{boats} boats done", file=sys.stderr)
+    print(f"{'boats':>6} {'frames/s':>9} {'dropped':>8} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'rows':>8} {'uploaded':>9} {'cpu %':>6} {'rss MB':>7}")
+    for row in rows:
+        print(f"{row['boats']:>6} {row['frames_per_second']:>9.0f} {row['frames_dropped']:>8} "
+              f"{row['latency_p50_ms']:>8.1f} {row['latency_p99_ms']:>8.1f} {row['rows_written']:>8} "
+              f"{row['files_uploaded']:>9} {row['cpu_seconds'] / row['seconds'] * 100:>6.0f} "
+              f"{row['rss_peak_mb']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boats", type=int, nargs="+", default=[20])
+    parser.add_argument("--rate", type=float, default=1.0, help="dt1/dt2 pairs each boat pushes per second")
+    parser.add_argument("--seconds", type=float, default=15.0,
+                        help="load duration (0 with --capture: until the capture ends)")
+    parser.add_argument("--binary", action="store_true", help="boats use the binary wire protocol")
+    parser.add_argument("--no-polls", action="store_true", help="boats ignore data_req polls")
+    parser.add_argument("--capture", help="replay this capture file instead of a synthetic fleet")
+    parser.add_argument("--speed", type=float, default=1.0, help="capture replay speed (0 = as fast as possible)")
+    parser.add_argument("--workers", type=int, default=0, help="incoming pipeline workers (default: config)")
+    parser.add_argument("--log-format", choices=("csv", "columnar"), default="csv")
+    parser.add_argument("--rotate-seconds", type=float, default=5.0, help="log segment rotation interval")
+    parser.add_argument("--upload-ms", type=float, default=0.0, help="stub server delay per upload request")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report Python heap peak (slower)")
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON line")
+    args = parser.parse_args()
+
+    if len(args.boats) > 1 and not args.capture:
+        sweep(args, sys.argv[1:])
+        return
+    results = run_once(args)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        report(results)
+
+
+if __name__ == "__main__":
+    main()
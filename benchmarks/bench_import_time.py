@@ -0,0 +1,86 @@
+"""Import-time benchmark for the shore station entry point.
+
+Imports each target module in a fresh interpreter with `-X importtime`,
+several times, and reports the median wall time and the slowest imports
+by cumulative time. Also checks that importing has no side effects: the
+scratch working directory must stay empty and pandas must not be loaded
+(only the table routes need it). Exits non-zero if a check fails or a
+--budget-ms is exceeded, so it can guard against regressions.
+
+    python benchmarks/bench_import_time.py --modules app xbee_handler --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import {module}
+print((time.perf_counter() - started) * 1000)
+print(int("pandas" in sys.modules))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self us, cumulative us)} from -X importtime output."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def measure(module, workdir):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(root=ROOT, module=module)],
+                            cwd=workdir, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    wall_ms, pandas_loaded = result.stdout.split()
+    return float(wall_ms), pandas_loaded == "1", parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["app", "xbee_handler", "config"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list per module")
+    parser.add_argument("--budget-ms", type=float, help="fail if a module's median import time exceeds this")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        workdir = tempfile.mkdtemp(prefix="taflab-import-")
+        runs = [measure(module, workdir) for _ in range(args.runs)]
+        wall = statistics.median(run[0] for run in runs)
+        timings = runs[-1][2]
+        print(f"\nimport {module}: median {wall:.0f} ms over {args.runs} runs "
+              f"(min {min(run[0] for run in runs):.0f}, max {max(run[0] for run in runs):.0f})")
+        print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+        slowest = sorted(timings.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+        for name, (self_us, cumulative_us) in slowest:
+            print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+
+        if any(run[1] for run in runs):
+            failures.append(f"import {module} loads pandas")
+        leftovers = os.listdir(workdir)
+        if leftovers:
+            failures.append(f"import {module} created {leftovers} in the working directory")
+        if args.budget_ms is not None and wall > args.budget_ms:
+            failures.append(f"import {module} took {wall:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
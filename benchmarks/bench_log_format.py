@@ -0,0 +1,111 @@
+"""Compare CSV and columnar telemetry log segments: bytes on disk and load time.
+
+    python benchmarks/bench_log_format.py --rows 100000 --boats 10
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import segment_format
+from telemetry_log import LOG_FIELDS, CsvSegmentWriter
+
+
+def synthetic_rows(count, boats, seed=1):
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 4, 1, 12, 0, 0)
+    positions = {f"boat{i}": [32.7 + rng.uniform(-0.05, 0.05), -117.2 + rng.uniform(-0.05, 0.05)]
+                 for i in range(boats)}
+    for i in range(count):
+        boat_id = f"boat{i % boats}"
+        position = positions[boat_id]
+        position[0] += rng.uniform(-1e-5, 1e-5)
+        position[1] += rng.uniform(-1e-5, 1e-5)
+        yield {
+            "timestamp": (start + datetime.timedelta(milliseconds=100 * i)).isoformat(),
+            "boat_id": boat_id,
+            "latitude": round(position[0], 7),
+            "longitude": round(position[1], 7),
+            "wind_dir": round(rng.uniform(0, 360), 1),
+            "temperature": round(rng.uniform(14, 22), 2),
+            "heading": round(rng.uniform(0, 360), 1),
+        }
+
+
+def write_segment(writer, rows, block_rows):
+    for i, row in enumerate(rows, 1):
+        writer.write(row)
+        if i % block_rows == 0:
+            writer.sync()
+    writer.close()
+
+
+def timed(label, func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<34} {best * 1000:9.1f} ms")
+    return result
+
+
+def load_csv_rows(path):
+    rows = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            for name in ("latitude", "longitude", "wind_dir", "temperature", "heading"):
+                row[name] = float(row[name])
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--boats", type=int, default=10)
+    parser.add_argument("--block-rows", type=int, default=500,
+                        help="rows per fsync batch (one columnar block each)")
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.rows, args.boats))
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "segment.csv")
+        tlm_path = os.path.join(directory, "segment" + segment_format.EXTENSION)
+        write_segment(CsvSegmentWriter(csv_path, LOG_FIELDS), rows, args.block_rows)
+        write_segment(segment_format.ColumnarSegmentWriter(tlm_path, LOG_FIELDS), rows, args.block_rows)
+
+        csv_bytes = os.path.getsize(csv_path)
+        with open(csv_path, "rb") as f:
+            csv_gzip_bytes = len(gzip.compress(f.read()))
+        tlm_bytes = os.path.getsize(tlm_path)
+        print(f"{args.rows} rows, {args.boats} boats, {args.block_rows} rows/block")
+        print("Bytes on disk:")
+        print(f"  {'csv':<34} {csv_bytes:>12,}")
+        print(f"  {'csv (gzip, for reference)':<34} {csv_gzip_bytes:>12,}")
+        print(f"  {'columnar':<34} {tlm_bytes:>12,}  ({csv_bytes / tlm_bytes:.1f}x smaller)")
+
+        print("Load time (best of 3):")
+        timed("csv.DictReader + float()", lambda: load_csv_rows(csv_path))
+        timed("segment_format.read_segment", lambda: segment_format.read_segment(tlm_path))
+        try:
+            import data_processor
+        except ImportError as e:
+            print(f"  pandas comparison skipped: {e}")
+        else:
+            timed("pandas read_csv", lambda: data_processor.load_log_segment(csv_path))
+            timed("load_log_segment (columnar)", lambda: data_processor.load_log_segment(tlm_path))
+        timed("export columnar -> csv", lambda: segment_format.export_csv(
+            tlm_path, os.path.join(directory, "export.csv")), repeat=1)
+
+
+if __name__ == "__main__":
+    main()
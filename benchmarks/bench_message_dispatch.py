@@ -0,0 +1,69 @@
+"""Measure incoming XBee messages processed per second through the handler registry.
+
+    python benchmarks/bench_message_dispatch.py --messages 50000 --boats 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import xbee_handler
+
+
+class NullBroadcaster:
+    def publish(self, boat_id, update):
+        pass
+
+    def forget(self, boat_id):
+        pass
+
+
+def frames(count, boats, binary):
+    codec = config.wire_codec
+    for i in range(boats):
+        ack = codec.negotiate(f"boat{i}", 1)
+        if ack is not None:
+            codec.encode(ack)
+    for i in range(count):
+        boat_id = f"boat{i % boats}"
+        if i % 2 == 0:
+            payload = {"t": "dt1", "id": boat_id, "lt": 32.7 + i * 1e-7, "lg": -117.2 - i * 1e-7}
+        else:
+            payload = {"t": "dt2", "id": boat_id, "w": i % 360, "tp": 18.5, "h": (i * 7) % 360}
+        if binary:
+            yield codec.encode_binary(payload, codec.index_of(boat_id))
+        else:
+            yield json.dumps(payload).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--boats", type=int, default=10)
+    args = parser.parse_args()
+
+    # Real registry, boat state, history and scheduler; no serial port, GUI or disk
+    xbee_handler.xbee_ready = True
+    config.broadcaster = NullBroadcaster()
+    config.telemetry_log.append = lambda row: None
+    remote = types.SimpleNamespace(get_64bit_addr=lambda: "0013A20000000000")
+
+    for binary in (False, True):
+        messages = [types.SimpleNamespace(data=frame, remote_device=remote)
+                    for frame in frames(args.messages, args.boats, binary)]
+        start = time.perf_counter()
+        for message in messages:
+            xbee_handler.process_incoming_message(message)
+        elapsed = time.perf_counter() - start
+        label = "binary" if binary else "json"
+        print(f"{label:<7} {len(messages)} messages in {elapsed:.3f}s: "
+              f"{len(messages) / elapsed:,.0f} msg/s ({elapsed / len(messages) * 1e6:.1f} µs/msg)")
+
+
+if __name__ == "__main__":
+    main()
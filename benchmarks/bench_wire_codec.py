@@ -0,0 +1,67 @@
+"""Compare the JSON and binary XBee wire encodings: bytes per message and encode/decode time.
+
+    python benchmarks/bench_wire_codec.py --number 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wire_protocol import WireCodec
+
+SAMPLES = [
+    {"t": "reg", "id": "boat12"},
+    {"t": "hb", "id": "boat12", "s": "auto", "n": ""},
+    {"t": "dt1", "id": "boat12", "lt": 32.7157345, "lg": -117.1610839},
+    {"t": "dt2", "id": "boat12", "w": 271.4, "tp": 18.62, "h": 93.7},
+    {"t": "cmd", "id": "boat12", "md": "mnl", "r": 12.5, "s": 40, "th": 65},
+    {"t": "cmd", "id": "boat12", "md": "auto", "tlat": 32.7161, "tlng": -117.1599},
+    {"t": "cal", "id": "boat12", "rm": -35.0, "rx": 35.0, "sm": 0.0, "sx": 90.0, "em": 0.0, "ex": 100.0},
+    {"t": "data_req", "id": "boat12"},
+]
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    args = parser.parse_args()
+
+    # Server side codec with the boat already negotiated onto the binary protocol
+    codec = WireCodec()
+    ack = codec.negotiate("boat12", 1)
+    codec.encode(ack)
+    index = ack["ix"]
+
+    print(f"{'message':<12} {'json B':>7} {'bin B':>6} {'json enc':>9} {'bin enc':>8} "
+          f"{'json dec':>9} {'bin dec':>8}   (µs)")
+    totals = [0, 0]
+    for payload in SAMPLES:
+        label = payload["t"] + (f"/{payload['md']}" if "md" in payload else "")
+        json_frame = json.dumps(payload).encode()
+        if payload["t"] in ("cmd", "cal", "data_req"):
+            # Server -> boat: negotiated encode
+            binary_frame = codec.encode(payload)
+            binary_encode = lambda: codec.encode(payload)
+        else:
+            # Boat -> server: what the boat puts on the air
+            binary_frame = codec.encode_binary(payload, index)
+            binary_encode = lambda: codec.encode_binary(payload, index)
+        totals[0] += len(json_frame)
+        totals[1] += len(binary_frame)
+        print(f"{label:<12} {len(json_frame):>7} {len(binary_frame):>6} "
+              f"{per_call_us(lambda: json.dumps(payload).encode(), args.number):>9.2f} "
+              f"{per_call_us(binary_encode, args.number):>8.2f} "
+              f"{per_call_us(lambda: codec.decode(json_frame), args.number):>9.2f} "
+              f"{per_call_us(lambda: codec.decode(binary_frame), args.number):>8.2f}")
+    print(f"{'total':<12} {totals[0]:>7} {totals[1]:>6}   ({totals[1] / totals[0]:.0%} of JSON)")
+
+
+if __name__ == "__main__":
+    main()
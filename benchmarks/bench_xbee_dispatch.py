@@ -0,0 +1,155 @@
+"""Benchmark the XBee RX/TX paths against a fake XBeeDevice.
+
+Reports outgoing messages/sec and queue-to-wire latency for the TX worker,
+and frames/sec through the sharded incoming pipeline with per-stage latency.
+
+    python benchmarks/bench_xbee_dispatch.py --messages 5000 --wire-ms 0.5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import xbee_handler
+
+
+class FakeRemote:
+    def __init__(self, address):
+        self.address = address
+
+    def get_64bit_addr(self):
+        return self.address
+
+
+class FakeXBeeMessage:
+    def __init__(self, data, remote_device=None):
+        self.data = data
+        self.remote_device = remote_device
+
+
+class NullBroadcaster:
+    def publish(self, boat_id, update):
+        pass
+
+    def forget(self, boat_id):
+        pass
+
+
+class FakeXBeeDevice:
+    """Stand-in for digi's XBeeDevice that records when each frame hits the wire."""
+
+    def __init__(self, wire_seconds):
+        self.wire_seconds = wire_seconds
+        self.sent = {}
+        self.callbacks = []
+        self.done = threading.Event()
+        self.expected = 0
+
+    def add_data_received_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def read_data(self):
+        return None
+
+    def _transmit(self, data):
+        if self.wire_seconds:
+            time.sleep(self.wire_seconds)
+        seq = json.loads(data)["seq"]
+        self.sent[seq] = time.perf_counter()
+        if len(self.sent) >= self.expected:
+            self.done.set()
+
+    def send_data_async(self, remote_device, data):
+        self._transmit(data)
+
+    def send_data_broadcast(self, data):
+        self._transmit(data)
+
+    def receive(self, data, remote_device=None):
+        message = FakeXBeeMessage(data, remote_device)
+        for callback in self.callbacks:
+            callback(message)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def bench_tx(fake, messages, rate):
+    fake.sent.clear()
+    fake.done.clear()
+    fake.expected = messages
+    queued = {}
+    interval = 1.0 / rate if rate else 0
+    start = time.perf_counter()
+    for seq in range(messages):
+        # Unique boat ids so nothing is merged or dropped on the way out
+        queued[seq] = time.perf_counter()
+        config.outgoing_queue.put({"t": "data_req", "id": f"bench{seq}", "seq": seq})
+        if interval:
+            time.sleep(interval)
+    fake.done.wait(timeout=60)
+    elapsed = time.perf_counter() - start
+    latencies = [(fake.sent[seq] - queued[seq]) * 1000 for seq in fake.sent]
+    print(f"TX: {len(fake.sent)}/{messages} sent in {elapsed:.3f}s "
+          f"({len(fake.sent) / elapsed:.0f} msg/s)")
+    print(f"TX queue-to-wire latency ms: p50={percentile(latencies, 50):.3f} "
+          f"p99={percentile(latencies, 99):.3f} max={max(latencies or [0]):.3f}")
+    print(f"TX queue stats: {json.dumps(config.outgoing_queue.stats())}")
+
+
+def bench_rx(fake, frames, boats):
+    pipeline = config.incoming_pipeline
+    pipeline.start([('decode', xbee_handler.decode_message), ('handle', xbee_handler.dispatch_message)])
+    senders = [(json.dumps({"t": "dt1", "id": f"rx{i}", "lt": 32.7, "lg": -117.2}).encode(),
+                FakeRemote(f"0013A200{i:08X}")) for i in range(boats)]
+    start = time.perf_counter()
+    for seq in range(frames):
+        frame, remote = senders[seq % boats]
+        fake.receive(frame, remote)
+    queued = time.perf_counter() - start
+    while pipeline.stats()['processed'] + pipeline.dropped() < frames:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    print(f"RX: {frames} frames from {boats} boats queued in {queued:.3f}s, processed in {elapsed:.3f}s "
+          f"({stats['processed'] / elapsed:.0f} frames/s, {pipeline.workers} workers, "
+          f"dropped {stats['dropped']}, max depth {stats['max_depth_seen']})")
+    for name, stage in stats['stages'].items():
+        print(f"RX stage {name:<7} avg={stage['latency_avg_ms']:.3f} ms max={stage['latency_max_ms']:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="producer rate in msg/s (0 = as fast as possible)")
+    parser.add_argument("--wire-ms", type=float, default=0.5,
+                        help="simulated serial time per frame")
+    parser.add_argument("--boats", type=int, default=20, help="distinct senders for the RX test")
+    args = parser.parse_args()
+
+    fake = FakeXBeeDevice(args.wire_ms / 1000.0)
+    fake.add_data_received_callback(xbee_handler.on_xbee_data_received)
+    xbee_handler.device = fake
+    xbee_handler.xbee_ready = True
+    xbee_handler.RemoteXBeeDevice = lambda local, address: address
+    config.broadcaster = NullBroadcaster()
+    config.telemetry_log.append = lambda row: None
+
+    threading.Thread(target=xbee_handler.xbee_sender, daemon=True).start()
+    bench_tx(fake, args.messages, args.rate)
+    bench_rx(fake, args.messages, args.boats)
+
+
+if __name__ == "__main__":
+    main()
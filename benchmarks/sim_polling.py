@@ -0,0 +1,166 @@
+"""Simulate telemetry polling over a shared XBee mesh link.
+
+Compares the old dt_requester (every boat polled at the top of each second)
+with PollScheduler. The link is modelled as a single shared channel of the
+given bandwidth with no carrier sense: any two frames that overlap in time
+are both lost. Boats reply to a data_req with a dt1 and a dt2 frame; a share
+of the fleet also pushes dt1/dt2 on its own, and a share is moving fast.
+
+    python benchmarks/sim_polling.py --boats 5 10 20 40 --seconds 120
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poll_scheduler import PollScheduler
+
+STATION = "station"
+REQUEST_BYTES = 24 + 18  # JSON data_req + API/mesh overhead
+DT1_BYTES = 60 + 18
+DT2_BYTES = 70 + 18
+
+
+class Boat:
+    def __init__(self, boat_id, rng, pusher, fast):
+        self.boat_id = boat_id
+        self.pusher = pusher
+        self.speed = 3.0 if fast else 0.2
+        self.latitude = 32.7 + rng.uniform(-0.01, 0.01)
+        self.longitude = -117.2 + rng.uniform(-0.01, 0.01)
+        self.radio_free_at = 0.0
+
+    def position(self, now):
+        # Heading north at constant speed
+        return self.latitude + self.speed * now / 111320.0, self.longitude
+
+
+class Link:
+    """Shared channel; collisions are resolved when a frame finishes."""
+
+    def __init__(self, bandwidth_bps):
+        self.bandwidth_bps = bandwidth_bps
+        self.frames = []
+
+    def airtime(self, size):
+        return size * 8.0 / self.bandwidth_bps
+
+    def collided(self, frame):
+        start, end = frame['start'], frame['end']
+        for other in self.frames:
+            if other is not frame and other['start'] < end and other['end'] > start \
+                    and other['sender'] != frame['sender']:
+                return True
+        return False
+
+    def prune(self, now, horizon=1.0):
+        self.frames = [f for f in self.frames if f['end'] > now - horizon]
+
+
+def simulate(mode, boat_count, seconds, bandwidth_bps, pusher_share, fast_share, budget, seed):
+    rng = random.Random(seed)
+    boats = {}
+    for index in range(boat_count):
+        boat_id = f"boat{index}"
+        boats[boat_id] = Boat(boat_id, rng,
+                              pusher=index < boat_count * pusher_share,
+                              fast=rng.random() < fast_share)
+    link = Link(bandwidth_bps)
+    scheduler = PollScheduler(max_polls_per_second=budget)
+    events = []  # (time, seq, kind, data)
+    seq = [0]
+    stats = {'polls': 0, 'samples': 0, 'lost': 0, 'frames': 0}
+    station_free_at = [0.0]
+
+    def push(time, kind, data):
+        seq[0] += 1
+        heapq.heappush(events, (time, seq[0], kind, data))
+
+    def transmit(now, sender, size, payload):
+        if sender == STATION:
+            start = max(now, station_free_at[0])
+            station_free_at[0] = start + link.airtime(size)
+        else:
+            boat = boats[sender]
+            start = max(now, boat.radio_free_at)
+            boat.radio_free_at = start + link.airtime(size)
+        frame = {'start': start, 'end': start + link.airtime(size), 'sender': sender, 'payload': payload}
+        link.frames.append(frame)
+        push(frame['end'], 'frame_end', frame)
+
+    def boat_reply(now, boat_id):
+        delay = rng.uniform(0.002, 0.015)
+        transmit(now + delay, boat_id, DT1_BYTES, ('dt1', boat_id))
+        transmit(now + delay, boat_id, DT2_BYTES, ('dt2', boat_id))
+
+    for boat_id, boat in boats.items():
+        scheduler.add_boat(boat_id, 0.0)
+        if boat.pusher:
+            push(rng.uniform(0, 1), 'push', boat_id)
+    if mode == 'burst':
+        push(0.0, 'burst', None)
+    else:
+        push(0.0, 'poll', None)
+
+    while events:
+        now, _, kind, data = heapq.heappop(events)
+        if now > seconds:
+            break
+        if kind == 'burst':
+            for boat_id in boats:
+                stats['polls'] += 1
+                transmit(now, STATION, REQUEST_BYTES, ('data_req', boat_id))
+            push(now + 1.0, 'burst', None)
+        elif kind == 'poll':
+            boat_id, wait = scheduler.next_poll(now)
+            if boat_id is not None:
+                stats['polls'] += 1
+                transmit(now, STATION, REQUEST_BYTES, ('data_req', boat_id))
+            push(now + max(wait, 0.001), 'poll', None)
+        elif kind == 'push':
+            boat_reply(now, data)
+            push(now + 1.0, 'push', data)
+        elif kind == 'frame_end':
+            stats['frames'] += 1
+            message_type, boat_id = data['payload']
+            if link.collided(data):
+                stats['lost'] += 1
+            elif message_type == 'data_req':
+                boat_reply(now, boat_id)
+            else:
+                stats['samples'] += 1
+                if message_type == 'dt1':
+                    latitude, longitude = boats[boat_id].position(now)
+                    scheduler.note_telemetry(boat_id, now, latitude, longitude)
+                else:
+                    scheduler.note_telemetry(boat_id, now)
+            link.prune(now)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boats", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--bandwidth", type=float, default=20000, help="effective link bits/s")
+    parser.add_argument("--pushers", type=float, default=0.25, help="share of boats pushing dt1/dt2 at 1 Hz")
+    parser.add_argument("--fast", type=float, default=0.2, help="share of boats moving fast")
+    parser.add_argument("--budget", type=float, default=10.0, help="scheduler polls/sec budget")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'boats':>5} {'mode':>9} {'polls/s':>8} {'samples/s':>10} {'lost %':>7}")
+    for boat_count in args.boats:
+        for mode in ('burst', 'scheduler'):
+            stats = simulate(mode, boat_count, args.seconds, args.bandwidth,
+                             args.pushers, args.fast, args.budget, args.seed)
+            lost_pct = 100.0 * stats['lost'] / stats['frames'] if stats['frames'] else 0.0
+            print(f"{boat_count:>5} {mode:>9} {stats['polls'] / args.seconds:>8.1f} "
+                  f"{stats['samples'] / args.seconds:>10.1f} {lost_pct:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
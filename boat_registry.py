@@ -0,0 +1,123 @@
+import threading
+import time
+
+# Telemetry fields with a typed slot; fields of other message types live only in data
+TELEMETRY_SLOTS = frozenset(('latitude', 'longitude', 'wind_dir', 'temperature', 'heading'))
+
+
+class BoatState:
+    """Live state of one boat.
+
+    Writers take the boat's own lock, so updates to different boats never
+    contend. Every update publishes a new immutable-by-convention data
+    dict (copy-on-write), so readers just take the current reference
+    without locking and never see a half-applied update.
+    """
+    __slots__ = ('boat_id', 'address', 'last_seen', 'status', 'notification',
+                 'latitude', 'longitude', 'wind_dir', 'temperature', 'heading',
+                 'data', '_lock')
+
+    def __init__(self, boat_id, address, now=None, status=None, notification=None):
+        self.boat_id = boat_id
+        self.address = address
+        self.last_seen = time.time() if now is None else now
+        self.status = status
+        self.notification = notification
+        self.latitude = None
+        self.longitude = None
+        self.wind_dir = None
+        self.temperature = None
+        self.heading = None
+        # Snapshot of the fields received so far; replaced, never mutated
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def update(self, fields, now=None):
+        """Apply telemetry fields and return the new data snapshot."""
+        with self._lock:
+            data = dict(self.data)
+            for name, value in fields.items():
+                if name in TELEMETRY_SLOTS:
+                    setattr(self, name, value)
+                data[name] = value
+            self.data = data
+            self.last_seen = time.time() if now is None else now
+            return data
+
+    def heartbeat(self, status, notification, now=None):
+        with self._lock:
+            self.status = status
+            self.notification = notification
+            self.last_seen = time.time() if now is None else now
+
+
+class BoatRegistry:
+    """Thread-safe map of boat_id -> BoatState.
+
+    Membership changes (register, remove) copy the dict under a lock and
+    swap it in, so lookups and iteration are lock-free and cleanup never
+    blocks the dispatcher or the Socket.IO handlers.
+    """
+
+    def __init__(self):
+        self._boats = {}
+        self._lock = threading.Lock()
+
+    def get(self, boat_id):
+        return self._boats.get(boat_id)
+
+    def __contains__(self, boat_id):
+        return boat_id in self._boats
+
+    def __len__(self):
+        return len(self._boats)
+
+    def ids(self):
+        return list(self._boats)
+
+    def address(self, boat_id):
+        state = self._boats.get(boat_id)
+        return state.address if state is not None else None
+
+    def register(self, boat_id, address, now=None, **kwargs):
+        """Add a boat, replacing any earlier state for the same id."""
+        state = BoatState(boat_id, address, now, **kwargs)
+        with self._lock:
+            boats = dict(self._boats)
+            boats[boat_id] = state
+            self._boats = boats
+        return state
+
+    def get_or_register(self, boat_id, address_factory, now=None, **kwargs):
+        """Return (state, created); address_factory() is only called for a new boat."""
+        state = self._boats.get(boat_id)
+        if state is not None:
+            return state, False
+        with self._lock:
+            state = self._boats.get(boat_id)
+            if state is not None:
+                return state, False
+            state = BoatState(boat_id, address_factory(), now, **kwargs)
+            boats = dict(self._boats)
+            boats[boat_id] = state
+            self._boats = boats
+            return state, True
+
+    def remove(self, boat_id, state=None):
+        """Drop a boat; with state given, only if that is still its current registration."""
+        with self._lock:
+            current = self._boats.get(boat_id)
+            if current is None or (state is not None and current is not state):
+                return False
+            boats = dict(self._boats)
+            del boats[boat_id]
+            self._boats = boats
+        return True
+
+    def states(self):
+        """Every BoatState, without locking."""
+        return list(self._boats.values())
+
+    def snapshot(self):
+        """[{'boat_id', 'data'}] for every boat, without locking."""
+        return [{'boat_id': boat_id, 'data': state.data} for boat_id, state in self._boats.items()]
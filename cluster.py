@@ -0,0 +1,68 @@
+"""Run the shore server as one gateway process plus Socket.IO worker processes.
+
+The gateway (TAFLAB_ROLE=gateway) owns the XBee radio, the telemetry log,
+the uploads and the message bus on config.BUS_PATH, and serves Socket.IO on
+config.SERVER_PORT like a standalone server. Each worker (TAFLAB_ROLE=worker)
+serves Socket.IO on SERVER_PORT + 1, + 2, ... with a fleet mirror fed by the
+bus; commands from its dashboards are forwarded to the gateway's XBee queue.
+
+Socket.IO clients must keep talking to the process that holds their session,
+so put a load balancer with sticky sessions in front of the worker ports,
+e.g. nginx:
+
+    upstream taflab { ip_hash; server 127.0.0.1:5002; server 127.0.0.1:5003; }
+
+    python cluster.py
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOOTSTRAP = "import app; app.main()"
+
+
+def spawn(role, port):
+    env = dict(os.environ, TAFLAB_ROLE=role, TAFLAB_PORT=str(port))
+    logger.info("Starting %s on port %d", role, port)
+    return subprocess.Popen([sys.executable, "-c", BOOTSTRAP], cwd=ROOT, env=env)
+
+
+def main():
+    logging.basicConfig(level=config.LOGGING_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    processes = [spawn("gateway", config.SERVER_PORT)]
+    # Workers reconnect to the bus on their own, but starting them after the broker avoids the warnings
+    deadline = time.monotonic() + 10
+    while not os.path.exists(config.BUS_PATH) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    for i in range(1, config.SOCKETIO_WORKERS + 1):
+        processes.append(spawn("worker", config.SERVER_PORT + i))
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    try:
+        # If any process dies, take the whole group down so a supervisor can restart it cleanly
+        while not stopping and all(process.poll() is None for process in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return max((process.returncode or 0) for process in processes)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+# Priority classes, highest first
+MANUAL = "manual"
+CALIBRATION = "calibration"
+TELEMETRY = "telemetry"
+PRIORITY_ORDER = (MANUAL, CALIBRATION, TELEMETRY)
+
+CALIBRATION_TYPES = ("cal", "cal_test", "req_cal_data")
+
+
+def classify(payload):
+    """Return (priority class, coalescing key or None) for an outgoing payload."""
+    message_type = payload.get('t')
+    boat_id = payload.get('id')
+    if message_type == 'cmd':
+        # A newer mnl/auto command for the same boat supersedes the queued one
+        return MANUAL, ('cmd', boat_id)
+    if message_type in CALIBRATION_TYPES:
+        return CALIBRATION, None
+    if message_type == 'data_req':
+        # Only one pending poll per boat
+        return TELEMETRY, ('data_req', boat_id)
+    return TELEMETRY, None
+
+
+class CommandQueue:
+    """Outgoing command scheduler with priority classes and per-boat coalescing.
+
+    Drop-in for the Queue previously used as config.outgoing_queue: put(),
+    get(), qsize() and empty() behave like queue.Queue.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queues = {name: deque() for name in PRIORITY_ORDER}
+        # coalescing key -> queued entry ([payload, enqueue_time, key])
+        self._pending = {}
+        self._stats = {name: {'enqueued': 0, 'sent': 0, 'coalesced': 0,
+                              'latency_total': 0.0, 'latency_max': 0.0}
+                       for name in PRIORITY_ORDER}
+
+    def put(self, payload, block=True, timeout=None):
+        priority, key = classify(payload)
+        with self._cond:
+            stats = self._stats[priority]
+            stats['enqueued'] += 1
+            entry = self._pending.get(key) if key is not None else None
+            if entry is not None:
+                if key[0] == 'cmd':
+                    # Keep the original slot and enqueue time, send the newest values
+                    entry[0] = payload
+                stats['coalesced'] += 1
+                return
+            entry = [payload, time.monotonic(), key]
+            if key is not None:
+                self._pending[key] = entry
+            self._queues[priority].append(entry)
+            self._cond.notify()
+
+    def put_nowait(self, payload):
+        self.put(payload, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                for priority in PRIORITY_ORDER:
+                    queue = self._queues[priority]
+                    if queue:
+                        payload, queued_at, key = queue.popleft()
+                        if key is not None:
+                            del self._pending[key]
+                        self._record_latency(priority, time.monotonic() - queued_at)
+                        return payload
+                if not block:
+                    raise Empty
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self._cond.wait(remaining)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def _record_latency(self, priority, latency):
+        stats = self._stats[priority]
+        stats['sent'] += 1
+        stats['latency_total'] += latency
+        if latency > stats['latency_max']:
+            stats['latency_max'] = latency
+
+    def qsize(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def stats(self):
+        """Queue depth and latency counters per priority class."""
+        with self._cond:
+            result = {}
+            for priority in PRIORITY_ORDER:
+                stats = self._stats[priority]
+                sent = stats['sent']
+                result[priority] = {
+                    'depth': len(self._queues[priority]),
+                    'enqueued': stats['enqueued'],
+                    'sent': sent,
+                    'coalesced': stats['coalesced'],
+                    'latency_avg_ms': (stats['latency_total'] / sent * 1000) if sent else 0.0,
+                    'latency_max_ms': stats['latency_max'] * 1000,
+                }
+            return result
@@ -1,50 +1,197 @@
 import threading
-from queue import Queue
+from async_mode import ASYNC_MODE
+from boat_registry import BoatRegistry
+from liveness import LivenessTracker
+from command_queue import CommandQueue
+from message_pipeline import ShardedPipeline
+from pending_requests import PendingRequests
+from poll_scheduler import PollScheduler
+from telemetry_history import TelemetryHistory
+from telemetry_log import TelemetryLogWriter
+from timer_wheel import TimerWheel
+from wire_protocol import WireCodec
 import json
 import os
+import sys
 
-# Load configuration from config.json safely
+# Site settings (SERVER_IP) live in config.json. It is read on first use of
+# SERVER_IP or one of the URLs below, not at import, so importing config
+# touches no files and tools can override SERVER_IP before anything reads it.
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config.json")
-with open(CONFIG_PATH, "r") as config_file:
-    config_data = json.load(config_file)  
 
-SERVER_IP = config_data["SERVER_IP"]  
+### Server Configuration ###
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = int(os.environ.get("TAFLAB_PORT", 5001))
+DEBUG = False  # Flask debug mode (tracebacks in responses); never enable in the field
+# ASYNC_MODE comes from the TAFLAB_ASYNC_MODE environment variable, see async_mode.py
+
+### Multi-process Configuration (see cluster.py) ###
+SERVER_ROLE = os.environ.get("TAFLAB_ROLE", "standalone")  # "standalone", "gateway" (XBee, log, uploads, bus) or "worker" (Socket.IO only)
+SOCKETIO_WORKERS = 2  # Socket.IO worker processes cluster.py starts next to the gateway, on SERVER_PORT + 1, + 2, ...
+BUS_PATH = "/tmp/taflab-bus.sock"  # Unix socket of the gateway's message bus
+SOCKETIO_MESSAGE_QUEUE = None  # e.g. "redis://localhost:6379/0" to share Socket.IO emits through Redis instead of the bus
 
 ### XBee Configuration ###
 PORT = "/dev/cu.usbserial-AG0JYY5U"  # Serial port for XBee module
 BAUD_RATE = 115200  # Baud rate for XBee communication
+XBEE_SIMULATOR = None  # None: real XBee on PORT; "fleet": synthetic boats; or the path of a capture file to replay
+SIM_BOATS = 5  # Boats in the synthetic fleet
+SIM_RATE = 1.0  # dt1/dt2 pairs each simulated boat pushes per second (0: only answer polls)
+SIM_BINARY = False  # Simulated boats offer the binary wire protocol
+SIM_REPLAY_SPEED = 1.0  # Capture replay speed factor (0: as fast as possible)
+XBEE_CAPTURE_FILE = None  # Append every received frame to this file, for replay with XBEE_SIMULATOR
+
+### Telemetry Polling Configuration ###
+POLL_INTERVAL = 1.0  # Default seconds between data_req polls per boat
+POLL_MIN_INTERVAL = 0.5  # Poll interval for boats moving faster than POLL_FAST_SPEED
+POLL_MAX_INTERVAL = 8.0  # Longest back-off for boats that push dt1/dt2 on their own
+POLL_FAST_SPEED = 2.0  # m/s
+POLL_MAX_PER_SECOND = 10.0  # Airtime budget: total data_req polls per second across the fleet
 
 ### CSV and File Uploader Configuration ###
 CSV_DIR = "csv_data"  # Directory for storing CSV files before upload
 CSV_SENT_DIR = "csv_data_sent"  # Directory for successfully uploaded CSV files
 CHECK_INTERVAL = 60  # Time interval (in seconds) to check for connectivity and new files
+LOG_ROTATE_BYTES = 5 * 1024 * 1024  # Rotate the telemetry CSV segment at this size
+LOG_ROTATE_SECONDS = 300  # ...or once it has been open this long
+LOG_FSYNC_ROWS = 50  # fsync after this many rows
+LOG_FSYNC_INTERVAL = 2.0  # ...or this many seconds, whichever comes first
+LOG_MAX_PENDING_ROWS = 10000  # Rows buffered for the writer before new rows are dropped
+LOG_FORMAT = "csv"  # "csv" or "columnar" (compressed float32 segments, exported to CSV on upload)
+LOG_COMPRESSION_LEVEL = 6  # zlib level for columnar segments
+
+### GUI Telemetry Broadcast Configuration ###
+BROADCAST_HZ = 10  # Batched 'boat_data_batch' emits per second
+EMIT_LEGACY_BOAT_DATA = True  # Also emit coalesced per-boat 'boat_data' events for older frontends
 
 ### Server API Configuration ###
 
-TEST_URL = f"http://{SERVER_IP}/tables"  # API endpoint to check connectivity
-UPLOAD_URL = f"http://{SERVER_IP}/upload"  # API endpoint to upload CSV files
+# Built from SERVER_IP on first use, see __getattr__
+SERVER_URL_PATHS = {
+    "HEALTH_URL": "/health",  # HEAD target for reachability probes (a 404 still counts as reachable)
+    "UPLOAD_URL": "/upload",  # API endpoint to upload CSV files
+    "UPLOAD_CHUNK_URL": "/upload_chunk",  # Resumable byte-range uploads (falls back to UPLOAD_URL on 404)
+    "UPLOAD_BATCH_URL": "/upload_batch",  # Several small files per request (falls back on 404)
+}
+CONNECTIVITY_TTL_UP = 30.0  # Seconds a "reachable" result is trusted before probing again
+CONNECTIVITY_TTL_DOWN = 10.0  # Seconds an "unreachable" result is trusted before probing again
+CONNECTIVITY_TIMEOUT = 3.0  # Probe timeout
+
+### Table Proxy Cache Configuration ###
+PROXY_CACHE_TTL = 30.0  # Seconds a cached table is served before revalidating upstream
+PROXY_CACHE_MAX_ENTRIES = 64  # Tables kept in the cache
+PROXY_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Memory cap for cached response bodies
+AGGREGATE_CACHE_TTL = 60.0  # Seconds a heatmap/track result is served before it is recomputed
+AGGREGATE_CACHE_MAX_ENTRIES = 256  # One entry per (table, zoom, bbox, ...) query
+AGGREGATE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+HEATMAP_DEFAULT_ZOOM = 14
+HEATMAP_MAX_ZOOM = 20
+TRACK_DEFAULT_POINTS = 500
+TRACK_MAX_POINTS = 10000
+HISTORY_SECONDS = 600.0  # Telemetry kept in memory per boat for trails and rolling stats
+HISTORY_PRUNE_INTERVAL = 10.0  # Seconds between sweeps dropping history of boats silent for HISTORY_SECONDS
+HISTORY_CAPACITY = 4096  # Samples per boat ring buffer (bounds memory regardless of rate)
+PROCESSOR_WORKERS = 4  # Incoming message workers; frames are sharded by sender so each boat stays in order
+INCOMING_HIGH_WATER = 500  # Queued frames above which dt_requester stops polling
+INCOMING_MAX_DEPTH = 5000  # Queued frames above which new frames are dropped
+LOGGING_LEVEL = "INFO"  # Per-frame messages are DEBUG, so they cost only a level check in production
+LOGGING_MODULE_LEVELS = {"werkzeug": "WARNING", "engineio": "WARNING", "socketio": "WARNING"}  # e.g. "xbee_handler": "DEBUG"
+LOGGING_JSON = False  # One JSON object per log line instead of plain text
+LOGGING_RATE_LIMIT = 10.0  # Identical log messages are let through at most once per this many seconds
+PROFILER_ENABLED = False  # Serve /profiler and allow POST /profiler/start; the routes are unauthenticated, enable only on a trusted network
+PROFILER_INTERVAL = 0.005  # Seconds between profiler stack samples
+PROFILER_MAX_STACKS = 5000  # Distinct stacks kept; later new stacks are counted as "(other)"
+TIMER_TICK = 0.1  # Resolution of the shared timer wheel (boat liveness, request timeouts), in seconds
+TIMER_SLOTS = 512  # Timer wheel slots; one turn covers TIMER_TICK * TIMER_SLOTS seconds
+BOAT_TIMEOUT = 6.0  # Seconds of silence after which a boat is removed and 'boat_lost' is emitted
+CALIBRATION_TIMEOUT = 5.0  # Seconds to wait for a boat's cal_data reply to req_cal_data
+WIRE_BINARY_ENABLED = True  # Agree to the binary XBee wire protocol with boats that offer it
+
+### Upload Transfer Configuration ###
+UPLOAD_COMPRESSION = "none"  # "none", "gzip" or "zstd" (requires the zstandard package); used only if the server advertises it
+UPLOAD_TIMEOUT = 30  # Seconds per upload request
+UPLOAD_RETRIES = 3  # Retries per request on connection errors / 5xx
+UPLOAD_CHUNK_SIZE = 256 * 1024  # Compressed files larger than this are uploaded in chunks of this size
+UPLOAD_BATCH_FILE_BYTES = 64 * 1024  # Files up to this size are batched together
+UPLOAD_BATCH_MAX_BYTES = 512 * 1024  # Upper bound on raw bytes per batch request
+UPLOAD_MANIFEST = os.path.join(CSV_DIR, "upload_manifest.json")  # Byte offsets of interrupted chunked uploads
+UPLOAD_QUEUE_DB = os.path.join(CSV_DIR, "upload_queue.sqlite3")  # Persistent upload job queue
+UPLOAD_WORKERS = 3  # Files uploaded concurrently
+UPLOAD_BACKOFF_BASE = 5.0  # Seconds before the first retry of a failed file; doubles per attempt
+UPLOAD_BACKOFF_CAP = 900.0  # Longest delay between retries
+UPLOAD_SCAN_INTERVAL = 2.0  # Directory poll interval when the watchdog package is not installed
 
 ### Global Data Stores ###
-# Dictionary for active boats, with thread-safe access
-active_boats = {}
-active_boats_lock = threading.Lock()
+# Active boats: per-boat locks for writers, lock-free snapshots for readers
+active_boats = BoatRegistry()
+# Last HISTORY_SECONDS of samples per boat, in preallocated ring buffers
+telemetry_history = TelemetryHistory(capacity=HISTORY_CAPACITY, max_age=HISTORY_SECONDS)
 
 # Dictionary for storing calibration settings, with thread-safe access
 calibration_settings = {}
 calibration_lock = threading.Lock()
 
+# One thread for all timeouts
+timer_wheel = TimerWheel(tick=TIMER_TICK, slots=TIMER_SLOTS)
+# Evicts boats BOAT_TIMEOUT seconds after their last frame
+liveness = LivenessTracker(active_boats, timer_wheel, timeout=BOAT_TIMEOUT)
+# Outstanding req_cal_data requests, completed by incoming cal_data frames
+calibration_requests = PendingRequests(timer_wheel, timeout=CALIBRATION_TIMEOUT,
+                                       first_id=1 if SERVER_ROLE == "standalone" else SERVER_PORT * 100000 + 1)
+
 # Dictionary for connected clients (e.g., GUI users), with thread-safe access
 clients = {}
 clients_lock = threading.Lock()
 
-# Queues for handling incoming and outgoing messages asynchronously
-incoming_queue = Queue()
-outgoing_queue = Queue()
+# Queues for handling incoming and outgoing messages asynchronously.
+# Incoming frames are processed by a sharded worker pool.
+# Outgoing commands are prioritized (manual > calibration > telemetry polls)
+# and stale control commands / duplicate polls are coalesced per boat.
+incoming_pipeline = ShardedPipeline(workers=PROCESSOR_WORKERS,
+                                    high_water=INCOMING_HIGH_WATER,
+                                    max_depth=INCOMING_MAX_DEPTH)
+outgoing_queue = CommandQueue()
 
-# Global log for data to be written to CSV, with thread-safe access
-data_log = []
-data_log_lock = threading.Lock()
+# JSON/binary XBee frame codec with per-boat version negotiation
+wire_codec = WireCodec(enabled=WIRE_BINARY_ENABLED)
+
+# Staggered, adaptive scheduler driving dt_requester
+poll_scheduler = PollScheduler(base_interval=POLL_INTERVAL,
+                               min_interval=POLL_MIN_INTERVAL,
+                               max_interval=POLL_MAX_INTERVAL,
+                               max_polls_per_second=POLL_MAX_PER_SECOND,
+                               fast_speed=POLL_FAST_SPEED)
+
+# Streaming writer for telemetry rows; rotated segments land in CSV_DIR
+telemetry_log = TelemetryLogWriter(CSV_DIR,
+                                   max_bytes=LOG_ROTATE_BYTES,
+                                   max_age=LOG_ROTATE_SECONDS,
+                                   fsync_rows=LOG_FSYNC_ROWS,
+                                   fsync_interval=LOG_FSYNC_INTERVAL,
+                                   max_pending=LOG_MAX_PENDING_ROWS,
+                                   log_format=LOG_FORMAT,
+                                   compression_level=LOG_COMPRESSION_LEVEL)
 
 # Placeholders for Flask and SocketIO instances (to be initialized in app.py)
 app = None
 socketio = None
+broadcaster = None
+# Gateway only: mirrors fleet state to the Socket.IO worker processes
+fleet_relay = None
+
+
+def load_config_file(path=CONFIG_PATH):
+    with open(path, "r") as config_file:
+        return json.load(config_file)
+
+
+def __getattr__(name):
+    """Resolve SERVER_IP and the server URLs lazily; the value is cached as a module global."""
+    if name == "SERVER_IP":
+        value = load_config_file()["SERVER_IP"]
+    elif name in SERVER_URL_PATHS:
+        value = f"http://{sys.modules[__name__].SERVER_IP}{SERVER_URL_PATHS[name]}"
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
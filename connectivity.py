@@ -0,0 +1,80 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+# One pooled session shared by the uploader and the table proxy routes
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=config.UPLOAD_WORKERS + 4))
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=config.UPLOAD_WORKERS + 4))
+
+
+class ConnectivityMonitor:
+    """Cached reachability of the DB server.
+
+    Real traffic (uploads, table fetches) reports its outcome through
+    record_success()/record_failure(), so in steady state no probe is sent
+    at all. Only when the cached state is older than its TTL does
+    is_available() send a HEAD to the health URL. Any HTTP answer below 500
+    counts as reachable, so a server without a health route still answers
+    with a cheap 404 instead of doing real work. Without a health_url it
+    probes config.HEALTH_URL, resolved on first use.
+    """
+
+    def __init__(self, health_url=None, ttl_up=30.0, ttl_down=10.0, timeout=3.0):
+        self.health_url = health_url
+        self.ttl_up = ttl_up
+        self.ttl_down = ttl_down
+        self.timeout = timeout
+        self.probes = 0
+        self._lock = threading.Lock()
+        self._reachable = None
+        self._checked_at = 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._reachable = True
+            self._checked_at = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self._reachable = False
+            self._checked_at = time.monotonic()
+
+    def cached(self):
+        """Cached state if still within its TTL, else None."""
+        with self._lock:
+            if self._reachable is None:
+                return None
+            ttl = self.ttl_up if self._reachable else self.ttl_down
+            if time.monotonic() - self._checked_at > ttl:
+                return None
+            return self._reachable
+
+    def known_down(self):
+        return self.cached() is False
+
+    def is_available(self):
+        state = self.cached()
+        if state is not None:
+            return state
+        return self.probe()
+
+    def probe(self):
+        self.probes += 1
+        try:
+            response = session.head(self.health_url or config.HEALTH_URL, timeout=self.timeout)
+            reachable = response.status_code < 500
+        except requests.RequestException:
+            reachable = False
+        if reachable:
+            self.record_success()
+        else:
+            self.record_failure()
+        return reachable
+
+
+monitor = ConnectivityMonitor(ttl_up=config.CONNECTIVITY_TTL_UP,
+                              ttl_down=config.CONNECTIVITY_TTL_DOWN,
+                              timeout=config.CONNECTIVITY_TIMEOUT)
@@ -1,93 +1,216 @@
-import csv
-import datetime
-import os
+import codecs
+import itertools
+import logging
 import time
 import requests
-import pandas as pd
 import json
-from config import SERVER_IP
 import config
+import connectivity
+import instrumentation
+import segment_format
 import urllib.parse 
 
-# Ensure CSV directory exists
-if not os.path.exists(config.CSV_DIR):
-    os.makedirs(config.CSV_DIR)
-
-def write_data_to_csv(data):
-    timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(config.CSV_DIR, f"{timestamp}_data.csv")
-    # Determine fieldnames by combining all keys present in the data entries.
-    if data:
-        fieldnames = set()
-        for row in data:
-            fieldnames.update(row.keys())
-        fieldnames = list(fieldnames)
-    else:
-        fieldnames = []
-    try:
-        with open(filename, mode="w", newline="") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in data:
-                writer.writerow(row)
-        print(f"Saved CSV: {filename}")
-    except Exception as e:
-        print(f"Error writing CSV: {e}")
-
-def periodic_csv_writer():
-    while True:
-        # Wait for 5 minutes (300 seconds)
-        time.sleep(60)
-        with config.data_log_lock:
-            if not config.data_log:
-                print("No new data to write in the last 5 minutes.")
-                continue
-            # Copy and clear the global data log
-            data_to_save = config.data_log.copy()
-            config.data_log.clear()
-        write_data_to_csv(data_to_save)
+logger = logging.getLogger(__name__)
 
+def load_log_segment(path):
+    """Load a local telemetry log segment (CSV or columnar) into a DataFrame."""
+    # pandas takes seconds to import on the shore box, so only the routes that need it pay for it
+    import numpy as np
+    import pandas as pd
+    if path.endswith(segment_format.EXTENSION):
+        schema, columns = segment_format.read_segment(path)
+        frame = {}
+        for name, kind in schema:
+            if kind == "ts":
+                frame[name] = pd.to_datetime(np.frombuffer(columns[name], dtype="<i8"), unit="us")
+            elif kind == "f4":
+                frame[name] = np.frombuffer(columns[name], dtype="<f4")
+            else:
+                frame[name] = pd.Categorical(columns[name])
+        return pd.DataFrame(frame)
+    return pd.read_csv(path, parse_dates=["timestamp"])
 
+def table_path(table_name):
+    """Upstream URL path for a table, with the name quoted and percent-encoded."""
+    formatted_table_name = '"' + table_name.strip('"') + '"'  # Ensure quotes
+    encoded_table_name = urllib.parse.quote(formatted_table_name, safe='')  # <-- Fix encoding
+    return f"/table/{encoded_table_name}"
 
-def get_all_tables():
-    """Fetch all available tables from the database."""
+
+def fetch_upstream(path, etag=None, last_modified=None):
+    """Conditional GET of a DB server path; returns the response, or None if the server is unreachable."""
+    if connectivity.monitor.known_down():
+        return None
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     try:
-        url = f"http://{SERVER_IP}/tables"  # Ensure this is correct
-        print(f"Fetching tables from {url}")  # Debug step 1
-        
-        response = requests.get(url, timeout=10)
-        print(f"Response status: {response.status_code}")  # Debug step 2
-        print(f"Response text: {response.text}")  # Debug step 3
-        
-        if response.status_code == 200:
-            tables = response.json()
-            print(f"Tables received: {tables}")  # Debug step 4
-            
-            if not tables:
-                return []
-            return tables["tables"]  # Extract table names
+        with instrumentation.UPSTREAM_SECONDS.labels('fetch').time():
+            response = connectivity.session.get(f"http://{config.SERVER_IP}{path}", headers=headers, timeout=10)
+        if response.status_code >= 500:
+            # A failing DB server is no more usable than an unreachable one
+            connectivity.monitor.record_failure()
         else:
-            print(f"Failed to fetch tables: {response.status_code}")
-            return []
-    except Exception as e:
-        print(f"Error fetching tables: {e}")
-        return []
+            connectivity.monitor.record_success()
+        if response.status_code >= 400:
+            instrumentation.UPSTREAM_ERRORS.labels('fetch').inc()
+        return response
+    except requests.RequestException as e:
+        connectivity.monitor.record_failure()
+        instrumentation.UPSTREAM_ERRORS.labels('fetch').inc()
+        logger.warning("Error fetching %s: %s", path, e)
+        return None
+
 
+def stream_upstream(path):
+    """Streaming GET of a DB server path; returns the open response, or None if unreachable.
 
-def fetch_boat_data(table_name):
-    """Fetch boat data from a specific table in the database."""
+    The caller must close the response.
+    """
+    if connectivity.monitor.known_down():
+        return None
     try:
-        formatted_table_name = f'"{table_name.strip("\"")}"'  # Ensure quotes
-        encoded_table_name = urllib.parse.quote(formatted_table_name, safe='')  # <-- Fix encoding
-        url = f"http://{SERVER_IP}/table/{encoded_table_name}"  # Fetch data from database
-        print(f"🔍 Fetching data from: {url}")  # Debugging
-        
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            return pd.DataFrame(response.json())
+        # Time to response headers; the body is streamed by the caller
+        with instrumentation.UPSTREAM_SECONDS.labels('stream').time():
+            response = connectivity.session.get(f"http://{config.SERVER_IP}{path}", timeout=10, stream=True)
+        if response.status_code >= 500:
+            # A failing DB server is no more usable than an unreachable one
+            connectivity.monitor.record_failure()
         else:
-            print(f"❌ Failed to fetch data from {table_name}: {response.status_code}")
-            return pd.DataFrame()
-    except Exception as e:
-        print(f"❌ Error fetching data: {e}")
-        return pd.DataFrame()
+            connectivity.monitor.record_success()
+        if response.status_code >= 400:
+            instrumentation.UPSTREAM_ERRORS.labels('stream').inc()
+        return response
+    except requests.RequestException as e:
+        connectivity.monitor.record_failure()
+        instrumentation.UPSTREAM_ERRORS.labels('stream').inc()
+        logger.warning("Error fetching %s: %s", path, e)
+        return None
+
+
+_json_decoder = json.JSONDecoder()
+
+
+def iter_json_array(chunks, max_element_bytes=1024 * 1024):
+    """Incrementally yield the elements of a JSON array arriving as byte chunks.
+
+    Only the current partial element is held in memory, never the whole array.
+    Raises ValueError if the body is not a JSON array, an element is malformed
+    or longer than max_element_bytes, or the array is cut off.
+    """
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+    chunks = iter(chunks)
+    eof = False
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer += text_decoder.decode(b"", final=True)
+        else:
+            buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Upstream body is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                element, end = _json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Malformed element in upstream JSON array")
+                if len(buffer) - pos > max_element_bytes:
+                    raise ValueError(f"Upstream JSON array element exceeds {max_element_bytes} bytes")
+                break  # Element continues in the next chunk
+            if end == len(buffer) and not eof and not isinstance(element, (dict, list)):
+                break  # A trailing number may still have more digits to come
+            yield element
+            pos = end
+        buffer = buffer[pos:]
+    raise ValueError("Upstream JSON array is truncated")
+
+
+def records_from_json(body):
+    """Rows of a table body that is not a list of records (e.g. a dict of columns), as the DataFrame path built them."""
+    import pandas as pd
+    try:
+        return pd.DataFrame(json.loads(body)).to_dict(orient="records")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Upstream table body is not a table: {e}") from e
+
+
+def open_table_records(table_name, chunk_size=64 * 1024):
+    """Stream the rows of a table as dicts without loading the table; None if unavailable.
+
+    A body that is not a JSON array is read whole and normalized by
+    records_from_json(); ValueError if that fails.
+    """
+    response = stream_upstream(table_path(table_name))
+    if response is None:
+        return None
+    if response.status_code != 200:
+        logger.warning("Failed to fetch data from %s: %s", table_name, response.status_code)
+        response.close()
+        return None
+
+    chunks = response.iter_content(chunk_size=chunk_size)
+    head = b""
+    try:
+        for chunk in chunks:
+            head += chunk
+            if head.strip():
+                break
+        if head.lstrip()[:1] != b"[":
+            rows = records_from_json(head + b"".join(chunks))
+            response.close()
+            return (row for row in rows)
+    except Exception:
+        response.close()
+        raise
+
+    def records():
+        try:
+            yield from iter_json_array(itertools.chain([head], chunks))
+        finally:
+            response.close()
+
+    return records()
+
+
+def select_records(records, columns=None, start=None, end=None, time_field="timestamp",
+                   offset=0, limit=None):
+    """Lazily filter rows to a [start, end] time range, skip offset, take limit and project columns.
+
+    start/end are compared with the row's time field as ISO-8601 strings.
+    """
+    skipped = 0
+    taken = 0
+    for record in records:
+        if start is not None or end is not None:
+            value = record.get(time_field)
+            if value is None:
+                continue
+            value = str(value)
+            if (start is not None and value < start) or (end is not None and value > end):
+                continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        if limit is not None and taken >= limit:
+            break
+        taken += 1
+        if columns:
+            record = {name: record.get(name) for name in columns}
+        yield record
@@ -0,0 +1,136 @@
+import json
+import logging
+import threading
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+# Gateway -> workers: batched fleet state changes and boat replies
+FLEET_CHANNEL = "fleet"
+# Workers -> gateway: outgoing XBee commands from dashboard handlers
+COMMANDS_CHANNEL = "commands"
+# Workers -> gateway: a worker (re)subscribed and needs the whole fleet
+SYNC_CHANNEL = "fleet_sync"
+
+
+class FleetRelay:
+    """Gateway side: mirrors fleet state to the Socket.IO worker processes.
+
+    The gateway's handlers call sample() with each boat's new snapshot,
+    lost() on eviction and reply() for frames answering a worker's request
+    (cal_data). run() publishes everything collected once per interval as
+    one message, keeping only the latest snapshot per boat so bus traffic
+    does not grow with the frame rate. After snapshot() the next message
+    carries every registered boat and is marked full, so a worker that
+    missed updates while disconnected can drop boats lost in the meantime.
+    """
+
+    def __init__(self, bus, interval=0.1):
+        self.bus = bus
+        self.interval = interval
+        self.published = 0
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._lost = []
+        self._replies = []
+        self._full = False
+
+    def sample(self, boat_id, data, timestamp):
+        with self._lock:
+            self._samples[boat_id] = (timestamp, data)
+
+    def lost(self, boat_id):
+        with self._lock:
+            self._samples.pop(boat_id, None)
+            self._lost.append(boat_id)
+
+    def reply(self, message):
+        with self._lock:
+            self._replies.append(message)
+
+    def snapshot(self):
+        with self._lock:
+            self._full = True
+
+    def flush(self):
+        with self._lock:
+            if not (self._samples or self._lost or self._replies or self._full):
+                return
+            if self._full:
+                for state in config.active_boats.states():
+                    self._samples.setdefault(state.boat_id, (state.last_seen, state.data))
+            message = {'samples': [[boat_id, timestamp, data] for boat_id, (timestamp, data) in self._samples.items()],
+                       'lost': self._lost, 'replies': self._replies, 'full': self._full}
+            self._samples, self._lost, self._replies, self._full = {}, [], [], False
+        if self.bus.publish_json(FLEET_CHANNEL, message):
+            self.published += 1
+
+    def run(self):
+        logger.info("Fleet relay started.")
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Error in fleet relay: %s", e)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+class BusCommandQueue:
+    """Worker side stand-in for config.outgoing_queue: put() forwards the payload to the gateway."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.forwarded = 0
+
+    def put(self, payload, block=True, timeout=None):
+        if self.bus.publish_json(COMMANDS_CHANNEL, payload):
+            self.forwarded += 1
+
+    def qsize(self):
+        return 0
+
+    def empty(self):
+        return True
+
+    def stats(self):
+        return {'forwarded': self.forwarded, 'failed': self.bus.failed}
+
+
+def forward_commands(bus):
+    """Gateway: queue commands published by the workers for the XBee sender."""
+    for _, payload in bus.listen([COMMANDS_CHANNEL]):
+        try:
+            config.outgoing_queue.put(json.loads(payload))
+        except Exception as e:
+            logger.exception("Error forwarding command from worker: %s", e)
+
+
+def serve_snapshots(bus, relay):
+    """Gateway: send the whole fleet whenever a worker asks for it."""
+    for _ in bus.listen([SYNC_CHANNEL]):
+        relay.snapshot()
+
+
+def apply_fleet_updates(bus):
+    """Worker: keep the local boat registry and history in step with the gateway."""
+    for _, payload in bus.listen([FLEET_CHANNEL], hello=(SYNC_CHANNEL, b"")):
+        try:
+            message = json.loads(payload)
+            if message.get('full'):
+                # Boats the gateway lost while this worker was not listening
+                current = {boat_id for boat_id, _, _ in message['samples']}
+                for boat_id in set(config.active_boats.ids()) - current:
+                    config.active_boats.remove(boat_id)
+            for boat_id, timestamp, data in message['samples']:
+                state, _ = config.active_boats.get_or_register(boat_id, lambda: None, timestamp)
+                state.update(data, timestamp)
+                if data:
+                    config.telemetry_history.append(boat_id, data, timestamp)
+            for boat_id in message['lost']:
+                config.active_boats.remove(boat_id)
+            for reply in message['replies']:
+                config.calibration_requests.complete(reply.get('id'), reply.get('rq'), reply)
+        except Exception as e:
+            logger.exception("Error applying fleet update: %s", e)
@@ -0,0 +1,210 @@
+import bisect
+import math
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond handler work up to slow uploads
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *labelvalues):
+        """Child for one label combination; cache it on hot paths."""
+        labelvalues = tuple(str(value) for value in labelvalues)
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def remove(self, *labelvalues):
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in labelvalues), None)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, child in list(self._children.items()):
+            lines.extend(self._render_child(labelvalues, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, labelvalues, child):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, labelvalues, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, ('le', _format_value(float(bound))))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value read at scrape time from callback(), which returns {labelvalues tuple: value}.
+
+    kind="counter" exports a running total kept elsewhere (e.g. a stats() dict) as a counter.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None, kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        values = self.callback() if self.callback is not None else {}
+        for labelvalues, value in values.items():
+            if not isinstance(labelvalues, tuple):
+                labelvalues = (labelvalues,)
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in list(_metrics):
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {e}")
+    return "\n".join(lines) + "\n"
+
+
+### Hot-path metrics ###
+
+MESSAGES_RECEIVED = Counter("taflab_xbee_messages_received_total",
+                            "Incoming XBee messages by type", ("type",))
+BOAT_MESSAGES = Counter("taflab_boat_messages_total",
+                        "Incoming XBee messages per boat", ("boat_id",))
+MESSAGE_HANDLE_SECONDS = Histogram("taflab_message_handle_seconds",
+                                   "Time to run a message's handler", ("type",))
+XBEE_SENT = Counter("taflab_xbee_sent_total",
+                    "Outgoing XBee frames by message type and format", ("type", "format"))
+XBEE_SEND_FAILURES = Counter("taflab_xbee_send_failures_total",
+                             "Outgoing XBee frames that raised while sending")
+XBEE_SEND_SECONDS = Histogram("taflab_xbee_send_seconds",
+                              "Time spent handing a frame to the XBee device")
+EMIT_SECONDS = Histogram("taflab_socketio_emit_seconds",
+                         "Time to emit one batched telemetry flush to Socket.IO clients")
+LOG_FLUSH_SECONDS = Histogram("taflab_telemetry_log_flush_seconds",
+                              "Time to flush and fsync the open telemetry log segment")
+UPSTREAM_SECONDS = Histogram("taflab_upstream_request_seconds",
+                             "DB server requests made by the proxy routes", ("operation",))
+UPSTREAM_ERRORS = Counter("taflab_upstream_errors_total",
+                          "DB server requests that failed or returned an error status", ("operation",))
+UPLOAD_REQUEST_SECONDS = Histogram("taflab_upload_request_seconds",
+                                   "Duration of each upload HTTP request")
+UPLOAD_JOB_SECONDS = Histogram("taflab_upload_job_seconds",
+                               "Duration of an upload job (one file or one batch)")
@@ -0,0 +1,51 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LivenessTracker:
+    """Evicts boats from the registry once they have been silent for timeout seconds.
+
+    Each tracked boat has one timer on the shared timer wheel, set for
+    last_seen + timeout. Telemetry handlers only refresh last_seen; when
+    the timer fires it re-reads last_seen and either evicts the boat or
+    re-arms for the new deadline. So a live boat costs one timer firing
+    per timeout period, eviction work is O(boats expiring), and a silent
+    boat is dropped within one wheel tick of its real deadline.
+    on_lost(state) is called for every evicted boat.
+    """
+
+    def __init__(self, registry, timer_wheel, timeout=6.0, on_lost=None):
+        self.registry = registry
+        self.timer_wheel = timer_wheel
+        self.timeout = timeout
+        self.on_lost = on_lost
+        self.evicted = 0
+        self.rearmed = 0
+
+    def track(self, state):
+        """Start watching a newly registered boat."""
+        self._arm(state, time.time())
+
+    def _arm(self, state, now):
+        delay = max(0.0, state.last_seen + self.timeout - now)
+        self.timer_wheel.schedule(delay, self._check, state)
+
+    def _check(self, state):
+        now = time.time()
+        if now - state.last_seen < self.timeout:
+            # Heard from since the timer was set
+            self.rearmed += 1
+            self._arm(state, now)
+            return
+        # Only evict this registration; a boat that registered again has its own timer
+        if not self.registry.remove(state.boat_id, state):
+            return
+        self.evicted += 1
+        if self.on_lost is not None:
+            self.on_lost(state)
+
+    def stats(self):
+        return {'tracked': len(self.registry), 'timeout': self.timeout,
+                'evicted': self.evicted, 'rearmed': self.rearmed}
@@ -0,0 +1,111 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+
+class RateLimitFilter(logging.Filter):
+    """Let an identical message through at most once per interval.
+
+    Repeats inside the window are counted, and the next copy that gets
+    through says how many were suppressed. Runs on the caller's thread, so
+    suppressed records never reach the queue. Keys older than the window
+    are swept out once per interval (or when max_keys is reached), so
+    messages with interpolated ids don't pile up.
+    """
+
+    def __init__(self, interval=10.0, max_keys=1000):
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen = {}
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.interval <= 0:
+            return True
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                return False
+            suppressed = entry[1] if entry is not None else 0
+            if now >= self._next_sweep or len(self._seen) >= self.max_keys:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.interval}
+                self._next_sweep = now + self.interval
+            self._seen[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for journald/log shippers."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _PreformattedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Keep exc_info for the listener's formatter instead of flattening it into msg
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level="INFO", module_levels=None, json_output=False, rate_limit=10.0, stream=None):
+    """Route all logging through a queue to a single writer thread.
+
+    Callers only pay for a level check and, for records that pass, a queue
+    put; formatting and stdout I/O happen on the listener thread.
+    module_levels maps logger names (module names) to their own levels.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if json_output:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+    records = queue.SimpleQueue()
+    handler = _PreformattedQueueHandler(records)
+    handler.addFilter(RateLimitFilter(rate_limit))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
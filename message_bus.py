@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from socketio import PubSubManager
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct('>I')
+# Control channel: the payload is a JSON list of channels to subscribe to
+SUBSCRIBE = "__subscribe__"
+
+
+def _send_frame(sock, channel, payload):
+    channel = channel.encode()
+    header = _LENGTH.pack(1 + len(channel) + len(payload)) + bytes((len(channel),)) + channel
+    sock.sendall(header + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_frame(sock):
+    """(channel, payload) of the next frame, or None when the peer has gone."""
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    frame = _recv_exact(sock, _LENGTH.unpack(header)[0])
+    if frame is None:
+        return None
+    end = 1 + frame[0]
+    return frame[1:end].decode(), frame[end:]
+
+
+class _Peer:
+    def __init__(self, conn, max_pending):
+        self.conn = conn
+        self.channels = set()
+        self.dropped = 0
+        self.outbox = deque()
+        self.max_pending = max_pending
+        self.cond = threading.Condition(threading.Lock())
+        self.closed = False
+
+    def send(self, channel, payload):
+        with self.cond:
+            if len(self.outbox) >= self.max_pending:
+                self.outbox.popleft()
+                self.dropped += 1
+            self.outbox.append((channel, payload))
+            self.cond.notify()
+
+    def writer(self):
+        while True:
+            with self.cond:
+                while not self.outbox and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                channel, payload = self.outbox.popleft()
+            try:
+                _send_frame(self.conn, channel, payload)
+            except OSError:
+                self.close()
+                return
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class BusBroker:
+    """Local pub/sub broker on a Unix socket, run by the gateway process.
+
+    Peers subscribe to channels and every frame published on a channel is
+    delivered to all its subscribers, the publisher included. Frames are
+    length-prefixed: 4-byte length, 1-byte channel length, channel, payload.
+    Each peer has its own outbox and writer thread, so a slow worker never
+    stalls the others; past max_pending queued frames its oldest are
+    dropped and counted.
+    """
+
+    def __init__(self, path, max_pending=10000):
+        self.path = path
+        self.max_pending = max_pending
+        self.published = 0
+        self._peers = []
+        self._lock = threading.Lock()
+        self._sock = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            # Left over from a previous run
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(64)
+        threading.Thread(target=self._accept, name="bus-broker", daemon=True).start()
+        logger.info("Message bus listening on %s", self.path)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError as e:
+                logger.error("Message bus stopped accepting: %s", e)
+                return
+            peer = _Peer(conn, self.max_pending)
+            with self._lock:
+                self._peers = self._peers + [peer]
+            threading.Thread(target=peer.writer, daemon=True).start()
+            threading.Thread(target=self._serve, args=(peer,), daemon=True).start()
+
+    def _serve(self, peer):
+        try:
+            while True:
+                frame = _recv_frame(peer.conn)
+                if frame is None:
+                    break
+                channel, payload = frame
+                if channel == SUBSCRIBE:
+                    peer.channels.update(json.loads(payload))
+                    continue
+                self.published += 1
+                for subscriber in self._peers:
+                    if channel in subscriber.channels:
+                        subscriber.send(channel, payload)
+        except OSError:
+            pass
+        finally:
+            peer.close()
+            with self._lock:
+                self._peers = [other for other in self._peers if other is not peer]
+
+    def stats(self):
+        peers = self._peers
+        return {'peers': len(peers), 'published': self.published,
+                'pending': sum(len(peer.outbox) for peer in peers),
+                'dropped': sum(peer.dropped for peer in peers)}
+
+
+class BusClient:
+    """Connection to the BusBroker; publish() and listen() reconnect on their own."""
+
+    def __init__(self, path, retry_interval=1.0):
+        self.path = path
+        self.retry_interval = retry_interval
+        self.failed = 0
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock
+
+    def publish(self, channel, payload):
+        """Send payload (bytes) on a channel; returns False if the broker is unreachable."""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = self._connect()
+                _send_frame(self._sock, channel, payload)
+                return True
+            except OSError as e:
+                self.failed += 1
+                logger.warning("Cannot publish to message bus %s: %s", self.path, e)
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                return False
+
+    def publish_json(self, channel, message):
+        return self.publish(channel, json.dumps(message).encode())
+
+    def listen(self, channels, hello=None):
+        """Yield (channel, payload) for frames on channels, forever.
+
+        hello, a (channel, payload) pair, is published after every
+        (re)subscription, e.g. to ask for state missed while disconnected.
+        """
+        while True:
+            sock = None
+            try:
+                sock = self._connect()
+                _send_frame(sock, SUBSCRIBE, json.dumps(list(channels)).encode())
+                if hello is not None:
+                    # Same connection as the subscription, so any reply finds it in place
+                    _send_frame(sock, *hello)
+                while True:
+                    frame = _recv_frame(sock)
+                    if frame is None:
+                        break
+                    yield frame
+                logger.warning("Message bus %s closed the connection", self.path)
+            except OSError as e:
+                logger.warning("Cannot listen on message bus %s: %s", self.path, e)
+            finally:
+                if sock is not None:
+                    sock.close()
+            time.sleep(self.retry_interval)
+
+
+class UnixSocketManager(PubSubManager):
+    """Socket.IO client manager that shares emits between processes over the BusBroker.
+
+    Works like python-socketio's RedisManager with the local bus standing in
+    for Redis: an emit in any process reaches the matching clients of every
+    process. url is "unix://" followed by the socket path.
+    """
+    name = 'unix'
+
+    def __init__(self, url='unix:///tmp/taflab-bus.sock', channel='socketio', write_only=False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.bus = BusClient(urlparse(url).path)
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, self.json.dumps(data).encode())
+
+    def _listen(self):
+        for _, payload in self.bus.listen([self.channel]):
+            yield payload.decode()
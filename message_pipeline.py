@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedPipeline:
+    """Pool of worker threads fed by per-shard FIFO queues.
+
+    Items are routed to a shard by a key (the sender's address), so all
+    messages from one boat are handled in order by the same worker while
+    different boats run in parallel. Each item runs through a list of
+    (name, func) stages; a stage's return value feeds the next one, and
+    None ends the item early. Time spent queued and in each stage is
+    recorded per stage.
+
+    Above high_water queued items overloaded() turns true, which callers
+    use to stop generating more traffic; above max_depth new items are
+    dropped and counted instead of growing memory without bound.
+    """
+
+    def __init__(self, workers=4, high_water=500, max_depth=5000):
+        self.workers = workers
+        self.high_water = high_water
+        self.max_depth = max_depth
+        self.stages = []
+        self._queues = [deque() for _ in range(workers)]
+        self._conds = [threading.Condition(threading.Lock()) for _ in range(workers)]
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'dropped': 0, 'max_depth_seen': 0}
+        # Per-worker counters and stage timings ([count, total, max]), so workers never share them
+        self._worker_stats = [{'processed': 0, 'errors': 0, 'timings': {}} for _ in range(workers)]
+
+    def start(self, stages):
+        self.stages = list(stages)
+        for worker_stats in self._worker_stats:
+            worker_stats['timings'] = {name: [0, 0.0, 0.0] for name in ['queue'] + [name for name, _ in self.stages]}
+        for shard in range(self.workers):
+            threading.Thread(target=self._worker, args=(shard,), daemon=True).start()
+        logger.info("Message pipeline started with %d workers.", self.workers)
+
+    def shard_for(self, key):
+        if key is None:
+            return 0
+        # Stable across runs, unlike hash() of a str
+        return zlib.crc32(str(key).encode()) % self.workers
+
+    def put(self, item, key=None):
+        """Queue an item; returns False if it was dropped because the pipeline is full."""
+        with self._depth_lock:
+            if self._depth >= self.max_depth:
+                self._counters['dropped'] += 1
+                return False
+            self._depth += 1
+            self._counters['enqueued'] += 1
+            if self._depth > self._counters['max_depth_seen']:
+                self._counters['max_depth_seen'] = self._depth
+        shard = self.shard_for(key)
+        with self._conds[shard]:
+            self._queues[shard].append((item, time.perf_counter()))
+            self._conds[shard].notify()
+        return True
+
+    def dropped(self):
+        return self._counters['dropped']
+
+    def depth(self):
+        return self._depth
+
+    def overloaded(self):
+        return self._depth >= self.high_water
+
+    @staticmethod
+    def _record(timings, stage, seconds):
+        timing = timings[stage]
+        timing[0] += 1
+        timing[1] += seconds
+        if seconds > timing[2]:
+            timing[2] = seconds
+
+    def _worker(self, shard):
+        queue = self._queues[shard]
+        cond = self._conds[shard]
+        worker_stats = self._worker_stats[shard]
+        timings = worker_stats['timings']
+        while True:
+            with cond:
+                while not queue:
+                    cond.wait()
+                value, queued_at = queue.popleft()
+            with self._depth_lock:
+                self._depth -= 1
+            started = time.perf_counter()
+            self._record(timings, 'queue', started - queued_at)
+            try:
+                for name, func in self.stages:
+                    value = func(value)
+                    finished = time.perf_counter()
+                    self._record(timings, name, finished - started)
+                    started = finished
+                    if value is None:
+                        break
+                worker_stats['processed'] += 1
+            except Exception as e:
+                worker_stats['errors'] += 1
+                logger.exception("Error in message pipeline worker %d: %s", shard, e)
+
+    def stats(self):
+        """Depth, counters and per-stage latency (avg/max ms)."""
+        stats = dict(self._counters)
+        stats.update({'depth': self._depth, 'workers': self.workers,
+                      'high_water': self.high_water, 'max_depth': self.max_depth,
+                      'shard_depths': [len(queue) for queue in self._queues],
+                      'processed': sum(worker['processed'] for worker in self._worker_stats),
+                      'errors': sum(worker['errors'] for worker in self._worker_stats),
+                      'stages': {}})
+        for name in self._worker_stats[0]['timings']:
+            timings = [worker['timings'][name] for worker in self._worker_stats]
+            count = sum(timing[0] for timing in timings)
+            total = sum(timing[1] for timing in timings)
+            stats['stages'][name] = {'count': count,
+                                     'latency_avg_ms': total / count * 1000 if count else 0.0,
+                                     'latency_max_ms': max(timing[2] for timing in timings) * 1000}
+        return stats
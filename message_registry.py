@@ -0,0 +1,50 @@
+class MessageSpec:
+    """How to handle one incoming message type.
+
+    fields maps wire keys to (state field, default), e.g. {'lt': ('latitude', 0.0)}.
+    Telemetry types declare fields and run through the shared pipeline;
+    handler, if given, is called instead as handler(boat_id, data, xbee_message).
+    log=True also appends the boat's snapshot to the telemetry log.
+    """
+    __slots__ = ('message_type', 'fields', 'handler', 'log', 'label')
+
+    def __init__(self, message_type, fields=None, handler=None, log=False, label=None):
+        self.message_type = message_type
+        self.fields = tuple((key, name, default) for key, (name, default) in (fields or {}).items())
+        self.handler = handler
+        self.log = log
+        self.label = label or message_type.upper()
+
+    def extract(self, data):
+        """State update for a message, with defaults for missing keys."""
+        return {name: data.get(key, default) for key, name, default in self.fields}
+
+
+class MessageRegistry:
+    """Maps message type ('t') to its MessageSpec.
+
+    New sensor types are added with register() from anywhere, e.g.
+    registry.register('dt3', fields={'sl': ('salinity', 0.0)}), without
+    touching the dispatcher.
+    """
+
+    def __init__(self):
+        self._specs = {}
+
+    def register(self, message_type, fields=None, handler=None, log=False, label=None):
+        spec = MessageSpec(message_type, fields, handler, log, label)
+        self._specs[message_type] = spec
+        return spec
+
+    def handler(self, message_type, label=None):
+        """Decorator form of register() for message types with custom handling."""
+        def decorator(func):
+            self.register(message_type, handler=func, label=label)
+            return func
+        return decorator
+
+    def get(self, message_type):
+        return self._specs.get(message_type)
+
+    def types(self):
+        return list(self._specs)
@@ -0,0 +1,77 @@
+import itertools
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PendingRequests:
+    """Correlation table for requests sent to boats that expect a reply frame.
+
+    add() records a request under (boat_id, request_id) and arms a timeout
+    on the shared timer wheel; nothing waits on it. When the reply arrives
+    the incoming pipeline calls complete(), which runs on_response; if it
+    does not arrive in time, on_timeout runs on the wheel's thread. A reply
+    without a request id (older boat firmware does not echo it) completes
+    every request pending for that boat, since they all asked for the same
+    thing.
+    """
+
+    def __init__(self, timer_wheel, timeout=5.0, first_id=1):
+        self.timer_wheel = timer_wheel
+        self.timeout = timeout
+        # Processes sharing a gateway start from different first_ids so their ids never collide
+        self._ids = itertools.count(first_id)
+        self._lock = threading.Lock()
+        self._pending = {}  # (boat_id, request_id) -> (on_response, on_timeout, timer)
+        self._counters = {'sent': 0, 'completed': 0, 'timed_out': 0, 'unmatched': 0}
+
+    def add(self, boat_id, on_response, on_timeout, timeout=None):
+        """Register a request; returns its request id to put on the wire."""
+        request_id = next(self._ids)
+        key = (boat_id, request_id)
+        with self._lock:
+            timer = self.timer_wheel.schedule(self.timeout if timeout is None else timeout,
+                                              self._expire, key)
+            self._pending[key] = (on_response, on_timeout, timer)
+            self._counters['sent'] += 1
+        return request_id
+
+    def complete(self, boat_id, request_id, response):
+        """Deliver a reply; returns the number of requests it completed."""
+        with self._lock:
+            if request_id is not None:
+                # Unknown ids belong to requests that already timed out, or to another process
+                keys = [(boat_id, request_id)] if (boat_id, request_id) in self._pending else []
+            else:
+                keys = [key for key in self._pending if key[0] == boat_id]
+            entries = [self._pending.pop(key) for key in keys]
+            if entries:
+                self._counters['completed'] += len(entries)
+            else:
+                self._counters['unmatched'] += 1
+        for (_, request_id), (on_response, _, timer) in zip(keys, entries):
+            timer.cancel()
+            try:
+                on_response(boat_id, request_id, response)
+            except Exception as e:
+                logger.exception("Error completing request %s for %s: %s", request_id, boat_id, e)
+        return len(entries)
+
+    def _expire(self, key):
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is not None:
+                self._counters['timed_out'] += 1
+        if entry is not None:
+            entry[1](*key)
+
+    def pending(self, boat_id=None):
+        with self._lock:
+            return sum(1 for key in self._pending if boat_id is None or key[0] == boat_id)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['pending'] = len(self._pending)
+        return stats
@@ -0,0 +1,158 @@
+import heapq
+import math
+import threading
+
+# Golden-ratio sequence for spreading first polls evenly over the interval
+_PHASE_STEP = (math.sqrt(5) - 1) / 2
+EARTH_RADIUS_M = 6371000.0
+
+
+class _BoatPollState:
+    __slots__ = ('interval', 'due', 'version', 'last_request', 'last_push',
+                 'backoff', 'last_fix', 'speed')
+
+    def __init__(self, interval, due):
+        self.interval = interval
+        self.due = due
+        self.version = 0
+        self.last_request = None
+        self.last_push = None
+        self.backoff = 1
+        self.last_fix = None  # (time, latitude, longitude)
+        self.speed = 0.0
+
+
+class PollScheduler:
+    """Staggered, adaptive data_req scheduler.
+
+    Boats are polled one at a time in due order instead of all at once, with
+    at least 1 / max_polls_per_second between requests so the mesh never sees
+    a burst. Boats that push telemetry on their own are backed off towards
+    max_interval, boats moving faster than fast_speed (m/s) are polled every
+    min_interval, and when the fleet's combined poll rate would exceed
+    max_polls_per_second every interval is stretched to fit that budget.
+
+    All methods take the current time explicitly so the scheduler can be
+    driven by a simulated clock, and are safe to call from several threads.
+    """
+
+    def __init__(self, base_interval=1.0, min_interval=0.5, max_interval=8.0,
+                 max_polls_per_second=10.0, fast_speed=2.0, response_window=0.5):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_polls_per_second = max_polls_per_second
+        self.fast_speed = fast_speed
+        self.response_window = response_window
+        self._boats = {}
+        self._heap = []
+        self._phase = 0.0
+        self._last_send = None
+        self._demand = 0.0  # sum of 1 / interval over all boats
+        self._lock = threading.RLock()
+
+    def boats(self):
+        with self._lock:
+            return list(self._boats)
+
+    def add_boat(self, boat_id, now):
+        with self._lock:
+            if boat_id in self._boats:
+                return
+            self._phase = (self._phase + _PHASE_STEP) % 1.0
+            state = _BoatPollState(self.base_interval, now + self._phase * self.base_interval)
+            self._boats[boat_id] = state
+            self._demand += 1.0 / state.interval
+            self._push(boat_id, state)
+
+    def remove_boat(self, boat_id):
+        with self._lock:
+            state = self._boats.pop(boat_id, None)
+            if state is not None:
+                self._demand -= 1.0 / state.interval
+                # Heap entry is discarded lazily in next_poll()
+
+    def sync(self, boat_ids, now):
+        """Track exactly the given set of boats."""
+        with self._lock:
+            boat_ids = set(boat_ids)
+            for boat_id in list(self._boats):
+                if boat_id not in boat_ids:
+                    self.remove_boat(boat_id)
+            for boat_id in boat_ids:
+                self.add_boat(boat_id, now)
+
+    def note_telemetry(self, boat_id, now, latitude=None, longitude=None):
+        """Record a dt1/dt2 sample; distinguishes replies to our polls from unsolicited pushes."""
+        with self._lock:
+            state = self._boats.get(boat_id)
+            if state is None:
+                return
+            # Frames arriving within response_window of a poll are treated as its reply
+            if state.last_request is None or now - state.last_request > self.response_window:
+                state.last_push = now
+            if latitude is not None and longitude is not None:
+                if state.last_fix is not None:
+                    fix_time, fix_lat, fix_lng = state.last_fix
+                    elapsed = now - fix_time
+                    if elapsed > 0:
+                        state.speed = _distance_m(fix_lat, fix_lng, latitude, longitude) / elapsed
+                state.last_fix = (now, latitude, longitude)
+
+    def next_poll(self, now):
+        """Return (boat_id, 0) if a poll should be sent now, else (None, seconds to wait)."""
+        with self._lock:
+            min_gap = 1.0 / self.max_polls_per_second
+            if self._last_send is not None and now - self._last_send < min_gap:
+                return None, min_gap - (now - self._last_send)
+            while self._heap:
+                due, version, boat_id = self._heap[0]
+                state = self._boats.get(boat_id)
+                if state is None or state.version != version:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    return None, due - now
+                heapq.heappop(self._heap)
+                self._last_send = now
+                state.last_request = now
+                self._reschedule(boat_id, state, now)
+                return boat_id, 0.0
+            return None, self.base_interval
+
+    def _reschedule(self, boat_id, state, now):
+        if state.last_push is not None and now - state.last_push < 2 * state.interval:
+            # Boat is streaming on its own; poll only as a keepalive
+            state.backoff = min(state.backoff * 2, self.max_interval / self.base_interval)
+        else:
+            state.backoff = 1
+        if state.speed >= self.fast_speed and state.backoff == 1:
+            interval = self.min_interval
+        else:
+            interval = min(self.base_interval * state.backoff, self.max_interval)
+        self._demand += 1.0 / interval - 1.0 / state.interval
+        state.interval = interval
+        # Stretch everyone's interval when the fleet wants more polls than the airtime budget
+        stretch = max(1.0, self._demand / self.max_polls_per_second)
+        state.due = max(state.due + interval * stretch, now)
+        self._push(boat_id, state)
+
+    def _push(self, boat_id, state):
+        state.version += 1
+        heapq.heappush(self._heap, (state.due, state.version, boat_id))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'boats': len(self._boats),
+                'demand_polls_per_second': self._demand,
+                'budget_polls_per_second': self.max_polls_per_second,
+                'intervals': {boat_id: state.interval for boat_id, state in self._boats.items()},
+            }
+
+
+def _distance_m(lat1, lng1, lat2, lng2):
+    # Equirectangular approximation; fine for the few metres between fixes
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * EARTH_RADIUS_M
@@ -0,0 +1,93 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'upstream_etag', 'upstream_last_modified', 'fetched_at')
+
+    def __init__(self, body, upstream_etag=None, upstream_last_modified=None, last_modified=None):
+        self.body = body
+        # Our own validators for browsers, derived from the bytes we actually serve
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified or datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        # Upstream validators, replayed as If-None-Match / If-Modified-Since
+        self.upstream_etag = upstream_etag
+        self.upstream_last_modified = upstream_last_modified
+        self.fetched_at = time.monotonic()
+
+
+class ProxyCache:
+    """Bounded LRU cache of serialized proxy responses with a freshness TTL.
+
+    Entries older than ttl are not dropped but revalidated upstream with
+    If-None-Match / If-Modified-Since by the caller; a 304 just refreshes
+    them. Such lookups count as 'revalidated' (or 'stale_served' when the
+    upstream is down), never as 'misses'. The cache holds at most
+    max_entries entries and max_bytes of body, evicting least recently
+    used entries first.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=64, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evictions': 0, 'not_modified_sent': 0,
+                          'stale_served': 0}
+
+    def get(self, key):
+        """Return (entry, fresh) or (None, False)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            return entry, time.monotonic() - entry.fetched_at <= self.ttl
+
+    def put(self, key, entry):
+        size = len(entry.body)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self._counters['evictions'] += 1
+
+    def refresh(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.fetched_at = time.monotonic()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= len(entry.body)
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({'entries': len(self._entries), 'bytes': self._bytes,
+                          'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                          'ttl': self.ttl})
+            return stats
@@ -0,0 +1,100 @@
+import collections
+import sys
+import threading
+import time
+
+# Accepted sampling intervals, in seconds; shorter ones would keep a core busy
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+# Stacks first seen after max_stacks distinct ones are counted under "<thread>;(other)"
+OTHER_FRAME = "(other)"
+
+
+class SamplingProfiler:
+    """Statistical profiler that can be switched on in a running server.
+
+    While running, a background thread wakes every interval seconds and
+    records the current stack of every other thread. The result is in
+    collapsed-stack format ("frame;frame;frame count" per line), which
+    flamegraph.pl and speedscope read directly. When stopped it costs
+    nothing. At most max_stacks distinct stacks are kept so a long run
+    stays bounded; rarer stacks seen after that are folded into one
+    "(other)" stack per thread.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64, max_stacks=5000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self._counts = collections.Counter()
+        self._samples = 0
+        self._folded = 0
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+        self._started_at = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """Start sampling, clearing any previous profile; returns False if already running."""
+        if interval is not None and not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+            raise ValueError(f"Profiler interval must be between {MIN_INTERVAL} and {MAX_INTERVAL} seconds")
+        with self._lock:
+            if self.running():
+                return False
+            if interval is not None:
+                self.interval = interval
+            self._counts = collections.Counter()
+            self._samples = 0
+            self._folded = 0
+            self._started_at = time.time()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def _run(self, stop):
+        own_id = threading.get_ident()
+        while not stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                thread_name = names.get(thread_id, str(thread_id))
+                stack.append(thread_name)
+                key = ";".join(reversed(stack))
+                with self._lock:
+                    if key not in self._counts and len(self._counts) >= self.max_stacks:
+                        key = f"{thread_name};{OTHER_FRAME}"
+                        self._folded += 1
+                    self._counts[key] += 1
+            with self._lock:
+                self._samples += 1
+
+    def status(self):
+        with self._lock:
+            return {'running': self.running(), 'interval': self.interval,
+                    'samples': self._samples, 'stacks': len(self._counts),
+                    'folded': self._folded, 'max_stacks': self.max_stacks,
+                    'started_at': self._started_at}
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most frequent first."""
+        with self._lock:
+            items = self._counts.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in items)
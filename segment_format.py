@@ -0,0 +1,205 @@
+import csv
+import datetime
+import json
+import math
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+# Compact columnar telemetry segment ("TLM1").
+#
+#   file   := MAGIC, uint32 schema_len, schema_json, block*
+#   block  := uint32 nrows, uint32 compressed_len, zlib(column*)
+#   column := uint32 len, data
+#
+# Column data is little-endian: 'ts' columns are int64 microseconds since the
+# Unix epoch (UTC), 'f4' columns float32 with NaN for missing values, and
+# 'str' columns a JSON list of distinct values followed by uint16 indices.
+# Each block is one fsync batch, so a crash loses at most the block being
+# written; a truncated trailing block is ignored on read.
+
+MAGIC = b"TLM1"
+EXTENSION = ".tlm"
+_BLOCK_HEADER = struct.Struct("<II")
+_LEN = struct.Struct("<I")
+_TYPECODES = {"ts": "q", "f4": "f"}
+_SWAP = sys.byteorder == "big"
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Column types for the telemetry log schema; anything not listed is float32
+COLUMN_TYPES = {"timestamp": "ts", "boat_id": "str"}
+
+# Values that could not be converted to their column type and were stored
+# as missing (NaN, or 0 for timestamps) instead; only the log writer thread encodes
+invalid_values = 0
+
+
+def schema_for(fields):
+    return [[name, COLUMN_TYPES.get(name, "f4")] for name in fields]
+
+
+def _to_micros(value):
+    global invalid_values
+    if value in (None, ""):
+        return 0
+    try:
+        if isinstance(value, (int, float)):
+            return int(value * 1000000)
+        return (datetime.datetime.fromisoformat(value) - _EPOCH) // datetime.timedelta(microseconds=1)
+    except (TypeError, ValueError, OverflowError):
+        invalid_values += 1
+        return 0
+
+
+def _from_micros(value):
+    return (_EPOCH + datetime.timedelta(microseconds=value)).isoformat()
+
+
+def _to_float(value):
+    global invalid_values
+    if value in (None, ""):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # One bad field must not make the whole block unwritable
+        invalid_values += 1
+        return math.nan
+
+
+def _pack(typecode, values):
+    data = array(typecode, values)
+    if _SWAP:
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+def encode_block(schema, rows, level=6):
+    parts = []
+    for name, kind in schema:
+        if kind == "str":
+            table = {}
+            indices = [table.setdefault(str(row.get(name, "")), len(table)) for row in rows]
+            names = json.dumps(list(table)).encode()
+            data = _LEN.pack(len(names)) + names + _pack("H", indices)
+        elif kind == "ts":
+            data = _pack("q", [_to_micros(row.get(name)) for row in rows])
+        else:
+            data = _pack("f", [_to_float(row.get(name)) for row in rows])
+        parts.append(_LEN.pack(len(data)))
+        parts.append(data)
+    compressed = zlib.compress(b"".join(parts), level)
+    return _BLOCK_HEADER.pack(len(rows), len(compressed)) + compressed
+
+
+def _decode_block(schema, payload, columns):
+    offset = 0
+    for name, kind in schema:
+        (length,) = _LEN.unpack_from(payload, offset)
+        offset += _LEN.size
+        data = payload[offset:offset + length]
+        offset += length
+        if kind == "str":
+            (names_len,) = _LEN.unpack_from(data, 0)
+            names = json.loads(data[_LEN.size:_LEN.size + names_len])
+            columns[name].extend(names[i] for i in _unpack("H", data[_LEN.size + names_len:]))
+        else:
+            columns[name].extend(_unpack(_TYPECODES[kind], data))
+
+
+def read_segment(path):
+    """Return (schema, {column: array or list}) for a segment file."""
+    with open(path, "rb") as f:
+        content = f.read()
+    if content[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a telemetry segment")
+    offset = len(MAGIC)
+    (schema_len,) = _LEN.unpack_from(content, offset)
+    offset += _LEN.size
+    schema = json.loads(content[offset:offset + schema_len])
+    offset += schema_len
+    columns = {name: ([] if kind == "str" else array(_TYPECODES[kind])) for name, kind in schema}
+    while offset + _BLOCK_HEADER.size <= len(content):
+        nrows, compressed_len = _BLOCK_HEADER.unpack_from(content, offset)
+        offset += _BLOCK_HEADER.size
+        if offset + compressed_len > len(content):
+            break  # Truncated block from an interrupted write
+        _decode_block(schema, zlib.decompress(content[offset:offset + compressed_len]), columns)
+        offset += compressed_len
+    return schema, columns
+
+
+def iter_rows(path):
+    """Yield segment rows as dicts with CSV-compatible values."""
+    schema, columns = read_segment(path)
+    names = [name for name, _ in schema]
+    kinds = dict(schema)
+    count = len(columns[names[0]]) if names else 0
+    for i in range(count):
+        row = {}
+        for name in names:
+            value = columns[name][i]
+            if kinds[name] == "ts":
+                value = _from_micros(value)
+            elif kinds[name] == "f4":
+                # 8 significant digits is the precision float32 actually holds
+                value = "" if math.isnan(value) else float(format(value, ".8g"))
+            row[name] = value
+        yield row
+
+
+def export_csv(path, out):
+    """Write a segment as CSV to a path or text file object; returns the row count."""
+    schema, _ = read_segment(path)
+    fields = [name for name, _ in schema]
+    if isinstance(out, str):
+        with open(out, "w", newline="") as f:
+            return export_csv(path, f)
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    count = 0
+    for row in iter_rows(path):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+class ColumnarSegmentWriter:
+    """Appends rows to a segment; each sync() writes one compressed block and fsyncs it."""
+
+    def __init__(self, path, fields, level=6):
+        self.schema = schema_for(fields)
+        self.level = level
+        self._rows = []
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            header = json.dumps(self.schema).encode()
+            self._file.write(MAGIC + _LEN.pack(len(header)) + header)
+
+    def write(self, row):
+        self._rows.append(row)
+
+    def sync(self):
+        if self._rows:
+            # Taken before encoding, so rows that still fail are dropped rather than retried forever
+            rows, self._rows = self._rows, []
+            self._file.write(encode_block(self.schema, rows, self.level))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self.sync()
+        self._file.close()
@@ -0,0 +1,129 @@
+import datetime
+import logging
+import threading
+import time
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Clients join this room on connect and receive every boat's updates
+FLEET_ROOM = 'fleet'
+
+
+def boat_room(boat_id):
+    return f"boat:{boat_id}"
+
+
+class TelemetryBroadcaster:
+    """Collects per-boat telemetry deltas and fans them out to GUI clients once per tick.
+
+    Handlers call publish() for every frame; run() emits a single
+    'boat_data_batch' to the fleet room per tick containing only the boats
+    whose values changed. Clients that subscribed to specific boats get the
+    same batch restricted to those boats through per-boat rooms.
+
+    With local_rooms=False (several processes sharing a message queue)
+    per-boat subscribers may be connected to another process, so every
+    changed boat's room gets its batch.
+    """
+
+    def __init__(self, socketio, interval=0.1, legacy_emit=False, local_rooms=True):
+        self.socketio = socketio
+        self.interval = interval
+        self.legacy_emit = legacy_emit
+        self.local_rooms = local_rooms
+        self._lock = threading.Lock()
+        self._pending = {}  # boat_id -> changed fields since last tick
+        self._latest = {}  # boat_id -> full data as last published
+        self._subscriptions = {}  # sid -> set of boat_ids
+        self._subscriber_counts = {}  # boat_id -> number of per-boat subscribers
+
+    def publish(self, boat_id, changes):
+        with self._lock:
+            latest = self._latest.setdefault(boat_id, {})
+            delta = {key: value for key, value in changes.items() if latest.get(key) != value}
+            if not delta:
+                return
+            latest.update(delta)
+            self._pending.setdefault(boat_id, {}).update(delta)
+
+    def forget(self, boat_id):
+        with self._lock:
+            self._latest.pop(boat_id, None)
+            self._pending.pop(boat_id, None)
+
+    def lost(self, boat_id, last_seen):
+        """Drop a boat's pending updates and tell every client it is gone, per-boat subscribers included."""
+        self.forget(boat_id)
+        self.socketio.emit('boat_lost', {
+            'boat_id': boat_id,
+            'last_seen': datetime.datetime.utcfromtimestamp(last_seen).isoformat()
+        }, to=[FLEET_ROOM, boat_room(boat_id)])
+
+    def subscribe(self, sid, boat_ids):
+        """Record a client's per-boat subscription; returns (joined, left) boat ids."""
+        boat_ids = set(boat_ids)
+        with self._lock:
+            previous = self._subscriptions.get(sid, set())
+            for boat_id in previous - boat_ids:
+                self._release(boat_id)
+            for boat_id in boat_ids - previous:
+                self._subscriber_counts[boat_id] = self._subscriber_counts.get(boat_id, 0) + 1
+            if boat_ids:
+                self._subscriptions[sid] = boat_ids
+            else:
+                self._subscriptions.pop(sid, None)
+        return boat_ids - previous, previous - boat_ids
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            for boat_id in self._subscriptions.pop(sid, set()):
+                self._release(boat_id)
+
+    def _release(self, boat_id):
+        count = self._subscriber_counts.get(boat_id, 0) - 1
+        if count > 0:
+            self._subscriber_counts[boat_id] = count
+        else:
+            self._subscriber_counts.pop(boat_id, None)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = {}
+            subscribed = [boat_id for boat_id in pending
+                          if boat_id in self._subscriber_counts or not self.local_rooms]
+            legacy = {boat_id: dict(self._latest.get(boat_id, {})) for boat_id in pending} if self.legacy_emit else None
+
+        started = time.perf_counter()
+        timestamp = datetime.datetime.utcnow().isoformat()
+        batch = [{'boat_id': boat_id, 'data': data} for boat_id, data in pending.items()]
+        self.socketio.emit('boat_data_batch', {'timestamp': timestamp, 'boats': batch}, to=FLEET_ROOM)
+        for boat_id in subscribed:
+            self.socketio.emit('boat_data_batch', {
+                'timestamp': timestamp,
+                'boats': [{'boat_id': boat_id, 'data': pending[boat_id]}]
+            }, to=boat_room(boat_id))
+        if legacy:
+            # Coalesced per-boat frames for clients that still listen for 'boat_data'.
+            # Per-boat subscribers have left the fleet room; a client in both rooms gets one copy.
+            subscribed = set(subscribed)
+            for boat_id, data in legacy.items():
+                self.socketio.emit('boat_data', {
+                    'boat_id': boat_id,
+                    'data': data,
+                    'timestamp': timestamp
+                }, to=[FLEET_ROOM, boat_room(boat_id)] if boat_id in subscribed else FLEET_ROOM)
+        instrumentation.EMIT_SECONDS.observe(time.perf_counter() - started)
+
+    def run(self):
+        logger.info("Telemetry broadcaster started (%.0f Hz).", 1 / self.interval)
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Error in telemetry broadcaster: %s", e)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
@@ -0,0 +1,139 @@
+import threading
+import time
+import numpy as np
+
+HISTORY_FIELDS = ('latitude', 'longitude', 'wind_dir', 'temperature', 'heading')
+
+
+class TelemetryRing:
+    """Fixed-size ring buffer of timestamped samples for one boat.
+
+    Samples live in preallocated NumPy arrays (one float64 column per field,
+    NaN for fields not reported yet), so memory per boat is constant and
+    reading a window is a couple of array slices.
+    """
+
+    def __init__(self, capacity, fields=HISTORY_FIELDS):
+        self.fields = fields
+        self.capacity = capacity
+        self._times = np.full(capacity, np.nan)
+        self._values = np.full((capacity, len(fields)), np.nan)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, data):
+        row = [data.get(field, np.nan) for field in self.fields]
+        with self._lock:
+            self._times[self._next] = timestamp
+            self._values[self._next] = row
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def last_time(self):
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._times[self._next - 1]
+
+    def window(self, since=None):
+        """(times, values) copies of the samples at or after since, oldest first."""
+        with self._lock:
+            start = (self._next - self._count) % self.capacity
+            order = (np.arange(self._count) + start) % self.capacity
+            times = self._times[order]
+            values = self._values[order]
+        if since is not None:
+            # Times are appended in order, so the window is a suffix
+            first = np.searchsorted(times, since, side='left')
+            times, values = times[first:], values[first:]
+        return times, values
+
+    def __len__(self):
+        return self._count
+
+
+def circular_mean(degrees):
+    radians = np.radians(degrees)
+    return float(np.degrees(np.arctan2(np.sin(radians).mean(), np.cos(radians).mean())) % 360)
+
+
+class TelemetryHistory:
+    """Recent telemetry for every boat, kept in memory for trails and rolling statistics."""
+
+    def __init__(self, capacity=4096, max_age=600.0, fields=HISTORY_FIELDS):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.fields = fields
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def append(self, boat_id, data, timestamp=None):
+        ring = self._rings.get(boat_id)
+        if ring is None:
+            with self._lock:
+                ring = self._rings.setdefault(boat_id, TelemetryRing(self.capacity, self.fields))
+        ring.append(time.time() if timestamp is None else timestamp, data)
+
+    def boats(self):
+        return list(self._rings)
+
+    def prune(self, now=None):
+        """Drop boats with no sample newer than max_age; returns their ids."""
+        now = time.time() if now is None else now
+        with self._lock:
+            stale = [boat_id for boat_id, ring in self._rings.items()
+                     if ring.last_time() is None or now - ring.last_time() > self.max_age]
+            for boat_id in stale:
+                del self._rings[boat_id]
+        return stale
+
+    def _window(self, boat_id, seconds, now):
+        ring = self._rings.get(boat_id)
+        if ring is None:
+            return None, None
+        seconds = self.max_age if seconds is None else min(seconds, self.max_age)
+        now = time.time() if now is None else now
+        return ring.window(now - seconds)
+
+    def track(self, boat_id, seconds=None, now=None):
+        """[[timestamp, lat, lng], ...] for fixes in the last seconds, or None for an unknown boat."""
+        times, values = self._window(boat_id, seconds, now)
+        if times is None:
+            return None
+        lat = values[:, self.fields.index('latitude')]
+        lng = values[:, self.fields.index('longitude')]
+        valid = ~(np.isnan(lat) | np.isnan(lng))
+        return np.column_stack((times[valid], lat[valid], lng[valid]))
+
+    def stats(self, boat_id, seconds=None, now=None):
+        """Rolling mean/min/max per field plus heading drift over the last seconds."""
+        times, values = self._window(boat_id, seconds, now)
+        if times is None:
+            return None
+        stats = {'samples': len(times),
+                 'start': float(times[0]) if len(times) else None,
+                 'end': float(times[-1]) if len(times) else None}
+        for index, field in enumerate(self.fields):
+            column = values[:, index]
+            column = column[~np.isnan(column)]
+            if len(column) == 0:
+                stats[field] = None
+                continue
+            stats[field] = {'mean': float(column.mean()), 'min': float(column.min()),
+                            'max': float(column.max()), 'last': float(column[-1])}
+        if stats.get('wind_dir'):
+            # Directions wrap at 360, so average them on the circle
+            column = values[:, self.fields.index('wind_dir')]
+            stats['wind_dir']['mean'] = circular_mean(column[~np.isnan(column)])
+        if stats.get('heading'):
+            column = values[:, self.fields.index('heading')]
+            valid = ~np.isnan(column)
+            headings, heading_times = column[valid], times[valid]
+            # Net turn in degrees, following the shortest way round at each step
+            drift = float(np.degrees(np.unwrap(np.radians(headings)))[-1] - headings[0])
+            elapsed = float(heading_times[-1] - heading_times[0])
+            stats['heading']['mean'] = circular_mean(headings)
+            stats['heading']['drift'] = drift
+            stats['heading']['drift_per_minute'] = drift * 60 / elapsed if elapsed > 0 else 0.0
+        return stats
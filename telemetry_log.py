@@ -0,0 +1,184 @@
+import csv
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+import instrumentation
+import segment_format
+
+logger = logging.getLogger(__name__)
+
+# Fixed column order for every log segment
+LOG_FIELDS = ["timestamp", "boat_id", "latitude", "longitude", "wind_dir", "temperature", "heading"]
+
+# Segments are written under this suffix and renamed to .csv once rotated,
+# so the uploader never picks up a file that is still being appended to
+ACTIVE_SUFFIX = ".part"
+
+_CLOSE = object()
+
+
+class CsvSegmentWriter:
+    """Plain CSV segment with the fixed schema; same interface as ColumnarSegmentWriter."""
+
+    def __init__(self, path, fields):
+        self._file = open(path, mode="a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def size(self):
+        return self._file.tell()
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+class TelemetryLogWriter:
+    """Streams telemetry rows to rolling log segments as they arrive.
+
+    append() is non-blocking and bounded: once max_pending rows are waiting
+    the newest row is dropped and counted rather than growing memory. The
+    writer thread (run()) fsyncs every fsync_rows rows or fsync_interval
+    seconds and rotates the segment once it reaches max_bytes or max_age
+    seconds; on_rotate(path) is called with each finished segment.
+
+    log_format selects plain CSV segments ("csv") or compressed columnar
+    segments ("columnar", see segment_format).
+    """
+
+    def __init__(self, directory, fields=LOG_FIELDS, max_bytes=5 * 1024 * 1024, max_age=300,
+                 fsync_rows=50, fsync_interval=2.0, max_pending=10000, on_rotate=None,
+                 log_format="csv", compression_level=6):
+        if log_format not in ("csv", "columnar"):
+            raise ValueError(f"Unknown telemetry log format: {log_format}")
+        self.directory = directory
+        self.fields = fields
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync_rows = fsync_rows
+        self.fsync_interval = fsync_interval
+        self.on_rotate = on_rotate
+        self.log_format = log_format
+        self.compression_level = compression_level
+        self.dropped = 0
+        self.rows_written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._segment = None
+        self._path = None
+        self._opened_at = 0
+        self._unsynced = 0
+        self._last_sync = 0
+        self._closed = threading.Event()
+
+    def append(self, row):
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def recover(self):
+        """Finish segments left open by a previous run so they get uploaded."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(ACTIVE_SUFFIX):
+                self._finish(os.path.join(self.directory, name))
+
+    def run(self):
+        self.recover()
+        logger.info("Telemetry log writer started in %s", self.directory)
+        while True:
+            try:
+                try:
+                    row = self._queue.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    row = None
+                if row is _CLOSE:
+                    self._rotate()
+                    self._closed.set()
+                    return
+                if row is not None:
+                    self._write(row)
+                self._maybe_sync_and_rotate()
+            except Exception as e:
+                logger.exception("Error in telemetry log writer: %s", e)
+                time.sleep(1)
+
+    def close(self, timeout=5):
+        """Flush queued rows and rotate the open segment."""
+        try:
+            self._queue.put(_CLOSE, timeout=timeout)
+        except queue.Full:
+            return False
+        return self._closed.wait(timeout)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        extension = ".csv" if self.log_format == "csv" else segment_format.EXTENSION
+        name = f"{timestamp}_data{extension}"
+        suffix = 1
+        # Never reuse the name of a segment rotated within the same second
+        while os.path.exists(os.path.join(self.directory, name)):
+            suffix += 1
+            name = f"{timestamp}_{suffix}_data{extension}"
+        self._path = os.path.join(self.directory, name + ACTIVE_SUFFIX)
+        if self.log_format == "csv":
+            self._segment = CsvSegmentWriter(self._path, self.fields)
+        else:
+            self._segment = segment_format.ColumnarSegmentWriter(self._path, self.fields,
+                                                                 self.compression_level)
+        self._opened_at = time.monotonic()
+        self._last_sync = self._opened_at
+
+    def _write(self, row):
+        if self._segment is None:
+            self._open()
+        self._segment.write(row)
+        self._unsynced += 1
+        self.rows_written += 1
+
+    def _sync(self):
+        with instrumentation.LOG_FLUSH_SECONDS.time():
+            self._segment.sync()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _maybe_sync_and_rotate(self):
+        if self._segment is None:
+            return
+        now = time.monotonic()
+        if self._unsynced >= self.fsync_rows or (self._unsynced and now - self._last_sync >= self.fsync_interval):
+            self._sync()
+            if self._segment.size() >= self.max_bytes:
+                self._rotate()
+                return
+        if now - self._opened_at >= self.max_age:
+            self._rotate()
+
+    def _rotate(self):
+        if self._segment is None:
+            return
+        self._segment.close()
+        path = self._path
+        self._segment = self._path = None
+        self._finish(path)
+
+    def _finish(self, active_path):
+        final_path = active_path[:-len(ACTIVE_SUFFIX)]
+        os.replace(active_path, final_path)
+        logger.info("Saved log segment: %s", final_path)
+        if self.on_rotate:
+            self.on_rotate(final_path)
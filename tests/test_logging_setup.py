@@ -0,0 +1,36 @@
+import logging
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_setup import RateLimitFilter
+
+
+def record(message):
+    return logging.LogRecord("xbee_handler", logging.WARNING, __file__, 1, message, None, None)
+
+
+class RateLimitFilterTest(unittest.TestCase):
+    def test_repeats_inside_the_window_are_suppressed(self):
+        rate_limit = RateLimitFilter(interval=10.0)
+        with mock.patch("logging_setup.time.monotonic", side_effect=[0.0, 1.0, 11.0]):
+            self.assertTrue(rate_limit.filter(record("radio timeout")))
+            self.assertFalse(rate_limit.filter(record("radio timeout")))
+            repeat = record("radio timeout")
+            self.assertTrue(rate_limit.filter(repeat))
+        self.assertIn("1 similar messages suppressed", repeat.getMessage())
+
+    def test_expired_keys_are_dropped(self):
+        rate_limit = RateLimitFilter(interval=10.0)
+        with mock.patch("logging_setup.time.monotonic", side_effect=[float(i) for i in range(5)] + [20.0]):
+            for i in range(5):
+                rate_limit.filter(record(f"unknown boat b{i}"))
+            rate_limit.filter(record("unknown boat b99"))
+        self.assertEqual(len(rate_limit._seen), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from proxy_cache import CacheEntry, ProxyCache
+
+
+class Response:
+    def __init__(self, status_code, body=b'[]'):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {'ETag': '"v2"'}
+
+
+class RevalidationCountTest(unittest.TestCase):
+    def setUp(self):
+        # ttl=-1 makes every cached entry stale
+        self.cache = ProxyCache(ttl=-1)
+        self.cache.put('key', CacheEntry(b'[]', upstream_etag='"v1"'))
+        patcher = mock.patch.object(app, 'proxy_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lookup(self, response):
+        with mock.patch('data_processor.fetch_upstream', return_value=response):
+            return app.cached_upstream('key', '/path', lambda response: response.body)
+
+    def test_not_modified_counts_as_revalidated(self):
+        self.lookup(Response(304))
+        stats = self.cache.stats()
+        self.assertEqual((stats['revalidated'], stats['misses']), (1, 0))
+
+    def test_changed_body_counts_as_revalidated(self):
+        entry = self.lookup(Response(200, b'[1]'))
+        stats = self.cache.stats()
+        self.assertEqual(entry.body, b'[1]')
+        self.assertEqual((stats['revalidated'], stats['misses']), (1, 0))
+
+    def test_upstream_down_serves_stale(self):
+        self.lookup(None)
+        stats = self.cache.stats()
+        self.assertEqual((stats['stale_served'], stats['revalidated'], stats['misses']), (1, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sampling_profiler import OTHER_FRAME, SamplingProfiler
+
+
+def spin(stop, depth):
+    if depth:
+        return spin(stop, depth - 1)
+    while not stop.is_set():
+        time.sleep(0.0005)
+
+
+class StackCapTest(unittest.TestCase):
+    def test_new_stacks_past_the_cap_are_folded(self):
+        stop = threading.Event()
+        workers = [threading.Thread(target=spin, args=(stop, depth), name=f"spin{depth}") for depth in range(4)]
+        for worker in workers:
+            worker.start()
+        profiler = SamplingProfiler(interval=0.001, max_stacks=2)
+        profiler.start()
+        time.sleep(0.2)
+        profiler.stop()
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        status = profiler.status()
+        stacks = profiler.collapsed().splitlines()
+        regular = [line for line in stacks if f";{OTHER_FRAME} " not in line]
+        self.assertLessEqual(len(regular), 2)
+        self.assertGreater(status['folded'], 0)
+        self.assertTrue(any(f";{OTHER_FRAME} " in line for line in stacks))
+
+
+if __name__ == '__main__':
+    unittest.main()
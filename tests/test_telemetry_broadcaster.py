@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+import config
+
+
+class BoatLostTest(unittest.TestCase):
+    def setUp(self):
+        self.fleet = app.socketio.test_client(app.app)
+        self.subscriber = app.socketio.test_client(app.app)
+        self.subscriber.emit('subscribe_boats', {'boat_ids': ['b1']})
+        self.fleet.get_received()
+        self.subscriber.get_received()
+
+    def tearDown(self):
+        self.fleet.disconnect()
+        self.subscriber.disconnect()
+
+    def lost_events(self, client):
+        return [message['args'][0]['boat_id'] for message in client.get_received()
+                if message['name'] == 'boat_lost']
+
+    def test_subscriber_hears_its_boat_lost(self):
+        config.broadcaster.lost('b1', time.time())
+        self.assertEqual(self.lost_events(self.subscriber), ['b1'])
+        self.assertEqual(self.lost_events(self.fleet), ['b1'])
+
+    def test_subscriber_does_not_hear_other_boats(self):
+        config.broadcaster.lost('b2', time.time())
+        self.assertEqual(self.lost_events(self.subscriber), [])
+        self.assertEqual(self.lost_events(self.fleet), ['b2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wire_protocol import MAGIC, WireCodec
+
+
+def binary_codec(boat_id='b1'):
+    """A codec that has agreed the binary protocol with boat_id."""
+    codec = WireCodec()
+    codec.encode(codec.negotiate(boat_id, 1))
+    return codec
+
+
+class RequestIdTest(unittest.TestCase):
+    def test_req_cal_data_keeps_request_id(self):
+        codec = binary_codec()
+        frame = codec.encode({'t': 'req_cal_data', 'id': 'b1', 'rq': 7})
+        self.assertEqual(frame[0] & 0xF0, MAGIC)
+        self.assertEqual(codec.decode(frame), {'t': 'req_cal_data', 'id': 'b1', 'rq': 7})
+
+    def test_large_request_id(self):
+        codec = binary_codec()
+        frame = codec.encode({'t': 'req_cal_data', 'id': 'b1', 'rq': 500200001})
+        self.assertEqual(codec.decode(frame)['rq'], 500200001)
+
+    def test_req_cal_data_without_request_id(self):
+        codec = binary_codec()
+        frame = codec.encode({'t': 'req_cal_data', 'id': 'b1'})
+        self.assertEqual(codec.decode(frame), {'t': 'req_cal_data', 'id': 'b1'})
+
+
+
+class CommandFallbackTest(unittest.TestCase):
+    def assert_json(self, frame, payload):
+        self.assertEqual(frame[:1], b'{')
+        self.assertEqual(WireCodec().decode(frame), payload)
+
+    def test_string_values_are_converted(self):
+        codec = binary_codec()
+        frame = codec.encode({'t': 'cmd', 'id': 'b1', 'md': 'mnl', 'r': '10', 's': '2.5', 'th': 0})
+        self.assertEqual(frame[0] & 0xF0, MAGIC)
+        self.assertEqual(codec.decode(frame), {'t': 'cmd', 'id': 'b1', 'md': 'mnl', 'r': 10.0, 's': 2.5, 'th': 0.0})
+
+    def test_non_numeric_value_falls_back_to_json(self):
+        payload = {'t': 'cmd', 'id': 'b1', 'md': 'mnl', 'r': 'left', 's': 0, 'th': 0}
+        self.assert_json(binary_codec().encode(payload), payload)
+
+    def test_missing_target_falls_back_to_json(self):
+        payload = {'t': 'cmd', 'id': 'b1', 'md': 'auto', 'tlat': None, 'tlng': -117.2}
+        self.assert_json(binary_codec().encode(payload), payload)
+
+    def test_calibration_out_of_range_falls_back_to_json(self):
+        payload = {'t': 'cal', 'id': 'b1', 'rm': -30, 'rx': 5000, 'sm': 0, 'sx': 90, 'em': 0, 'ex': 100}
+        self.assert_json(binary_codec().encode(payload), payload)
+
+    def test_calibration_in_range_stays_binary(self):
+        codec = binary_codec()
+        frame = codec.encode({'t': 'cal', 'id': 'b1', 'rm': -30, 'rx': 3276.7, 'sm': 0, 'sx': 90, 'em': 0, 'ex': 100})
+        self.assertEqual(frame[0] & 0xF0, MAGIC)
+        self.assertEqual(codec.decode(frame)['rx'], 3276.7)
+
+
+if __name__ == '__main__':
+    unittest.main()
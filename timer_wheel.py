@@ -0,0 +1,96 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ('deadline', 'tick', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, tick, callback, args):
+        self.deadline = deadline
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        # Removed lazily when its slot comes round
+        self.cancelled = True
+
+
+class TimerWheel:
+    """Hashed timer wheel: one thread fires every timeout in the process.
+
+    Timers go into slot (deadline tick % slots); each tick only that slot
+    is looked at, so scheduling and cancelling are O(1) and a tick costs
+    O(timers in the slot), not O(all timers). Timers more than one turn
+    ahead stay in their slot until their tick comes round. Callbacks run on
+    the wheel's thread, at most one tick late, and must not block.
+    """
+
+    def __init__(self, tick=0.1, slots=512):
+        self.tick = tick
+        self.slots = slots
+        self.fired = 0
+        self._wheel = [[] for _ in range(slots)]
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._current = 0  # Last tick processed
+        self._pending = 0
+
+    def _tick_of(self, deadline):
+        return math.ceil((deadline - self._start) / self.tick)
+
+    def schedule(self, delay, callback, *args):
+        """Call callback(*args) after delay seconds; returns a Timer that can be cancelled."""
+        deadline = time.monotonic() + delay
+        with self._lock:
+            tick = max(self._tick_of(deadline), self._current + 1)
+            timer = Timer(deadline, tick, callback, args)
+            self._wheel[tick % self.slots].append(timer)
+            self._pending += 1
+        return timer
+
+    def pending(self):
+        """Scheduled timers, including cancelled ones not yet swept."""
+        return self._pending
+
+    def advance(self, now=None):
+        """Fire every timer due by now; returns how many fired."""
+        now = time.monotonic() if now is None else now
+        target = math.floor((now - self._start) / self.tick)
+        fired = 0
+        while True:
+            with self._lock:
+                if self._current >= target:
+                    break
+                self._current += 1
+                tick = self._current
+                slot = self._wheel[tick % self.slots]
+                due = [timer for timer in slot if timer.tick <= tick]
+                if due:
+                    self._wheel[tick % self.slots] = [timer for timer in slot if timer.tick > tick]
+                    self._pending -= len(due)
+            for timer in due:
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    logger.exception("Error in timer callback %r: %s", timer.callback, e)
+                fired += 1
+        self.fired += fired
+        return fired
+
+    def run(self):
+        logger.info("Timer wheel started (%.0f ms tick, %d slots).", self.tick * 1000, self.slots)
+        while True:
+            try:
+                self.advance()
+            except Exception as e:
+                logger.exception("Error in timer wheel: %s", e)
+            next_tick = self._start + (self._current + 1) * self.tick
+            time.sleep(max(0.0, next_tick - time.monotonic()))
@@ -0,0 +1,112 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+UPLOADING = "uploading"
+
+
+class UploadQueue:
+    """Persistent queue of log segments waiting to be uploaded, backed by SQLite.
+
+    A job is pending until a worker claims it (uploading). A successful
+    upload deletes the job; a failed one goes back to pending with its next
+    attempt pushed out by exponential backoff with jitter. Jobs left in the
+    uploading state by a crash are made pending again on startup.
+    """
+
+    def __init__(self, path, backoff_base=5.0, backoff_cap=900.0):
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                file TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                added REAL NOT NULL,
+                last_error TEXT
+            )""")
+        self._db.execute("UPDATE jobs SET state = ? WHERE state = ?", (PENDING, UPLOADING))
+
+    def add(self, file, size, now=None):
+        """Queue a file; returns False if it was already queued."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (file, size, state, next_attempt, added) VALUES (?, ?, ?, ?, ?)",
+                (file, size, PENDING, now, now))
+            return cursor.rowcount == 1
+
+    def sync(self, files):
+        """Make the queue match the files present on disk ({file: size})."""
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT file FROM jobs")}
+        for file in known - set(files):
+            self.remove(file)
+        for file in set(files) - known:
+            self.add(file, files[file])
+
+    def claim(self, limit, now=None):
+        """Mark up to limit due jobs as uploading and return them as (file, size), oldest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT file, size FROM jobs WHERE state = ? AND next_attempt <= ? ORDER BY added LIMIT ?",
+                (PENDING, now, limit)).fetchall()
+            self._db.executemany("UPDATE jobs SET state = ? WHERE file = ?",
+                                 [(UPLOADING, file) for file, _ in rows])
+            return rows
+
+    def release(self, files):
+        """Return claimed jobs to pending without counting an attempt."""
+        with self._lock:
+            self._db.executemany("UPDATE jobs SET state = ? WHERE file = ?",
+                                 [(PENDING, file) for file in files])
+
+    def complete(self, file):
+        self.remove(file)
+
+    def remove(self, file):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE file = ?", (file,))
+
+    def fail(self, file, error=None, now=None):
+        """Reschedule a failed job; returns the delay until its next attempt."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM jobs WHERE file = ?", (file,)).fetchone()
+            if row is None:
+                return None
+            attempts = row[0] + 1
+            delay = self.backoff(attempts)
+            self._db.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE file = ?",
+                (PENDING, attempts, now + delay, error, file))
+            return delay
+
+    def backoff(self, attempts):
+        # Exponential backoff with jitter so retries after an outage do not all land at once
+        ceiling = min(self.backoff_cap, self.backoff_base * 2 ** (attempts - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def next_due(self):
+        """Seconds-since-epoch of the earliest pending job, or None if nothing is pending."""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM jobs WHERE state = ?", (PENDING,)).fetchone()
+        return row[0]
+
+    def counts(self):
+        with self._lock:
+            counts = {PENDING: 0, UPLOADING: 0}
+            counts.update(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            return counts
@@ -1,39 +1,434 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
 import os
 import time
+import uuid
 import requests
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import config
+import connectivity
+import instrumentation
+from connectivity import session
+import segment_format
+from upload_queue import UploadQueue
 
-# Ensure the csv_data_sent directory exists
-if not os.path.exists(config.CSV_SENT_DIR):
-    os.makedirs(config.CSV_SENT_DIR)
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Set when the telemetry log writer finishes a segment, to upload it right away
+new_segment_event = threading.Event()
+
+# Server capabilities discovered at runtime; None means not probed yet
+server_supports = {"compression": None, "chunks": None, "batch": None}
+
+metrics_lock = threading.Lock()
+metrics = {
+    "files_uploaded": 0,
+    "files_failed": 0,
+    "requests": 0,
+    "retries": 0,
+    "resumed_uploads": 0,
+    "raw_bytes": 0,
+    "sent_bytes": 0,
+    "upload_seconds": 0.0,
+}
+
+def record(**counts):
+    with metrics_lock:
+        for key, value in counts.items():
+            metrics[key] += value
+
+def upload_stats():
+    """Upload counters plus derived throughput, compression ratio and queue depth."""
+    with metrics_lock:
+        stats = dict(metrics)
+    if upload_queue is not None:
+        stats["queue"] = upload_queue.counts()
+    seconds = stats["upload_seconds"]
+    stats["throughput_bytes_per_second"] = stats["sent_bytes"] / seconds if seconds else 0.0
+    stats["compression_ratio"] = stats["raw_bytes"] / stats["sent_bytes"] if stats["sent_bytes"] else 0.0
+    return stats
 
 def is_internet_available():
+    # Cached and fed by upload outcomes; only probes (HEAD) once the cache expires
+    return connectivity.monitor.is_available()
+
+def read_upload_file(file_path):
+    """Return (upload name, CSV bytes) for a log segment; columnar segments are exported to CSV."""
+    file = os.path.basename(file_path)
+    if file.endswith(segment_format.EXTENSION):
+        # The DB server ingests CSV, so columnar segments are converted on the way out
+        buffer = io.StringIO()
+        segment_format.export_csv(file_path, buffer)
+        return file[:-len(segment_format.EXTENSION)] + ".csv", buffer.getvalue().encode()
+    with open(file_path, "rb") as f:
+        return file, f.read()
+
+compression_lock = threading.Lock()
+
+def probe_compression(encoding):
+    """Ask the server whether it decodes uploads in encoding; None if it cannot be asked now.
+
+    A server lists the content codings it accepts in requests in the
+    Accept-Encoding header of its responses (RFC 7694), so an OPTIONS on the
+    upload URL tells us without sending any data. Servers that do not
+    answer that way get plain CSV.
+    """
+    try:
+        response = session.options(config.UPLOAD_URL, timeout=config.UPLOAD_TIMEOUT)
+    except requests.RequestException as e:
+        logger.info("Cannot probe upload compression support: %s", e)
+        return None
+    accepted = [coding.split(";")[0].strip().lower()
+                for coding in response.headers.get("Accept-Encoding", "").split(",")]
+    return encoding in accepted
+
+def compress(content):
+    """Return (encoding, body). Output is deterministic so chunk offsets stay valid across retries."""
+    encoding = config.UPLOAD_COMPRESSION
+    if encoding == "zstd" and zstandard is None:
+        encoding = "gzip"
+    if encoding == "none":
+        return "identity", content
+    # Compress only for a server that has said it can decode it
+    with compression_lock:
+        if server_supports["compression"] is None:
+            server_supports["compression"] = probe_compression(encoding)
+            if server_supports["compression"] is not None:
+                logger.info("Server %s %s-compressed uploads.",
+                            "accepts" if server_supports["compression"] else "does not accept", encoding)
+    if not server_supports["compression"]:
+        return "identity", content
+    if encoding == "zstd":
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(content)
+    return "gzip", gzip.compress(content, compresslevel=9, mtime=0)
+
+def file_part(upload_name, encoding, body):
+    """Multipart file field; a compressed body is labelled with the part's Content-Encoding."""
+    if encoding == "identity":
+        return (upload_name, body, "text/csv")
+    return (upload_name, body, "text/csv", {"Content-Encoding": encoding})
+
+### Resumable upload manifest ###
+
+manifest_lock = threading.Lock()
+
+def load_manifest():
+    try:
+        with open(config.UPLOAD_MANIFEST, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest_entry(file, entry):
+    with manifest_lock:
+        manifest = load_manifest()
+        if entry is None:
+            manifest.pop(file, None)
+        else:
+            manifest[file] = entry
+        tmp_path = config.UPLOAD_MANIFEST + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, config.UPLOAD_MANIFEST)
+
+def post_with_retries(url, **kwargs):
+    """POST through the pooled session, retrying connection errors and 5xx responses."""
+    for attempt in range(config.UPLOAD_RETRIES + 1):
+        if attempt:
+            record(retries=1)
+            time.sleep(min(2 ** attempt, 30))
+        try:
+            record(requests=1)
+            with instrumentation.UPLOAD_REQUEST_SECONDS.time():
+                response = session.post(url, timeout=config.UPLOAD_TIMEOUT, **kwargs)
+            if response.status_code < 500:
+                connectivity.monitor.record_success()
+                return response
+            logger.warning("Upload request to %s failed with status %s", url, response.status_code)
+        except requests.RequestException as e:
+            connectivity.monitor.record_failure()
+            logger.warning("Upload request to %s failed: %s", url, e)
+    return None
+
+### Upload strategies ###
+
+def upload_whole(upload_name, content):
+    """Upload a file in a single multipart request, compressed when the server accepts it."""
+    encoding, body = compress(content)
+    started = time.monotonic()
+    response = post_with_retries(config.UPLOAD_URL, files={"file": file_part(upload_name, encoding, body)})
+    record(upload_seconds=time.monotonic() - started, sent_bytes=len(body))
+    if response is not None and response.status_code in (400, 415) and encoding != "identity":
+        # Server cannot decode compressed uploads; send plain CSV from now on
+        logger.warning("Server rejected compressed upload; falling back to uncompressed uploads.")
+        server_supports["compression"] = False
+        return upload_whole(upload_name, content)
+    if response is not None and response.status_code == 200:
+        if encoding != "identity":
+            server_supports["compression"] = True
+        return True
+    return False
+
+def upload_chunked(file, upload_name, content):
+    """Upload a large file in byte-range chunks, resuming from the offset in the manifest."""
+    encoding, body = compress(content)
+    digest = hashlib.sha256(body).hexdigest()
+    entry = load_manifest().get(file)
+    if entry and entry.get("sha256") == digest:
+        offset = entry["offset"]
+        if offset:
+            record(resumed_uploads=1)
+            logger.info("Resuming upload of %s at byte %d/%d", file, offset, len(body))
+    else:
+        entry = {"upload_id": uuid.uuid4().hex, "sha256": digest, "offset": 0, "size": len(body)}
+        offset = 0
+    while offset < len(body):
+        chunk = body[offset:offset + config.UPLOAD_CHUNK_SIZE]
+        headers = {
+            "X-Upload-Id": entry["upload_id"],
+            "X-File-Name": upload_name,
+            "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{len(body)}",
+            "Content-Type": "application/octet-stream",
+        }
+        if encoding != "identity":
+            # Byte ranges are of the encoded body, so every chunk carries its coding
+            headers["Content-Encoding"] = encoding
+        started = time.monotonic()
+        response = post_with_retries(config.UPLOAD_CHUNK_URL, data=chunk, headers=headers)
+        record(upload_seconds=time.monotonic() - started)
+        if response is None:
+            return False
+        if response.status_code == 404 and offset == 0:
+            # Server has no chunk endpoint
+            server_supports["chunks"] = False
+            return None
+        if response.status_code not in (200, 201, 202, 308):
+            logger.warning("Chunk upload of %s failed with status %s", file, response.status_code)
+            return False
+        server_supports["chunks"] = True
+        record(sent_bytes=len(chunk))
+        try:
+            # The server reports how many bytes it holds; trust it over our own count
+            offset = int(response.json().get("offset", offset + len(chunk)))
+        except (ValueError, AttributeError, TypeError):
+            offset += len(chunk)
+        entry["offset"] = offset
+        save_manifest_entry(file, entry)
+    return True
+
+def upload_batch(items):
+    """Upload several small files in one multipart request; items are (upload_name, content)."""
+    files = []
+    sent = 0
+    for upload_name, content in items:
+        encoding, body = compress(content)
+        files.append(("file", file_part(upload_name, encoding, body)))
+        sent += len(body)
+    started = time.monotonic()
+    response = post_with_retries(config.UPLOAD_BATCH_URL, files=files)
+    record(upload_seconds=time.monotonic() - started, sent_bytes=sent)
+    if response is not None and response.status_code == 404:
+        server_supports["batch"] = False
+        return None
+    if response is not None and response.status_code == 200:
+        server_supports["batch"] = True
+        return True
+    return False
+
+def mark_uploaded(file, raw_bytes):
+    shutil.move(os.path.join(config.CSV_DIR, file), os.path.join(config.CSV_SENT_DIR, file))
+    save_manifest_entry(file, None)
+    record(files_uploaded=1, raw_bytes=raw_bytes)
+    logger.info("Uploaded %s successfully. Moving file to csv_data_sent.", file)
+
+def upload_file(file):
+    file_path = os.path.join(config.CSV_DIR, file)
+    upload_name, content = read_upload_file(file_path)
+    ok = None
+    if len(content) > config.UPLOAD_CHUNK_SIZE and server_supports["chunks"] is not False:
+        ok = upload_chunked(file, upload_name, content)
+    if ok is None:
+        ok = upload_whole(upload_name, content)
+    if ok:
+        mark_uploaded(file, len(content))
+    else:
+        record(files_failed=1)
+        logger.warning("Failed to upload %s.", file)
+    return ok
+
+def upload_small_files(files):
+    """Upload files as one batch when the server supports it; returns {file: ok}."""
+    items = [read_upload_file(os.path.join(config.CSV_DIR, file)) for file in files]
+    ok = upload_batch(items) if server_supports["batch"] is not False else None
+    if ok is None:
+        # The server has no batch endpoint
+        return {file: upload_file(file) for file in files}
+    if ok:
+        for file, (_, content) in zip(files, items):
+            mark_uploaded(file, len(content))
+    else:
+        record(files_failed=len(files))
+        logger.warning("Failed to upload batch of %d files.", len(files))
+    return {file: ok for file in files}
+
+### Persistent upload queue and worker pool ###
+
+upload_queue = None
+in_flight = set()
+in_flight_lock = threading.Lock()
+
+def is_upload_file(file):
+    return file.endswith(".csv") or file.endswith(segment_format.EXTENSION)
+
+def pending_files():
+    """{file: size} for every segment waiting in CSV_DIR."""
+    files = {}
+    with os.scandir(config.CSV_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and is_upload_file(entry.name):
+                files[entry.name] = entry.stat().st_size
+    return files
+
+def notify_new_segment(path):
+    """Queue a finished segment and wake the upload loop."""
+    if upload_queue is not None and path:
+        file = os.path.basename(path)
+        if is_upload_file(file) and os.path.exists(path):
+            upload_queue.add(file, os.path.getsize(path))
+    new_segment_event.set()
+
+def group_jobs(jobs):
+    """Split claimed (file, size) jobs into upload groups: large files alone, small ones batched."""
+    groups = []
+    batch, batch_bytes = [], 0
+    for file, size in jobs:
+        if size > config.UPLOAD_BATCH_FILE_BYTES or server_supports["batch"] is False:
+            groups.append([file])
+            continue
+        batch.append(file)
+        batch_bytes += size
+        if batch_bytes >= config.UPLOAD_BATCH_MAX_BYTES:
+            groups.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        groups.append(batch)
+    return groups
+
+def run_upload_job(files):
+    """Worker: upload one group and record each file's outcome in the queue."""
+    error = None
+    started = time.perf_counter()
     try:
-        response = requests.get(config.TEST_URL, timeout=5)
-        return response.status_code == 200
-    except Exception:
-        return False
+        if len(files) > 1:
+            results = upload_small_files(files)
+        else:
+            results = {files[0]: upload_file(files[0])}
+    except FileNotFoundError as e:
+        # Moved or deleted underneath us; nothing left to upload
+        logger.info("Upload skipped: %s", e)
+        results = {file: not os.path.exists(os.path.join(config.CSV_DIR, file)) for file in files}
+    except Exception as e:
+        logger.exception("Error uploading %s: %s", files, e)
+        error = str(e)
+        results = {file: False for file in files}
+    instrumentation.UPLOAD_JOB_SECONDS.observe(time.perf_counter() - started)
+    for file, ok in results.items():
+        if ok:
+            upload_queue.complete(file)
+        else:
+            delay = upload_queue.fail(file, error)
+            if delay is not None:
+                logger.info("Will retry %s in %.0fs", file, delay)
+
+def job_finished(future):
+    with in_flight_lock:
+        in_flight.discard(future)
+    # A worker slot is free; let the loop hand out more work
+    new_segment_event.set()
+
+def dispatch_jobs(executor):
+    with in_flight_lock:
+        free = config.UPLOAD_WORKERS - len(in_flight)
+    if free <= 0:
+        return
+    jobs = upload_queue.claim(free * 16)
+    groups = group_jobs(jobs)
+    for group in groups[:free]:
+        future = executor.submit(run_upload_job, group)
+        with in_flight_lock:
+            in_flight.add(future)
+        future.add_done_callback(job_finished)
+    leftover = [file for group in groups[free:] for file in group]
+    if leftover:
+        upload_queue.release(leftover)
+
+def watch_directory():
+    """Wake the uploader as soon as a segment appears in CSV_DIR."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        Observer = None
+    if Observer is not None:
+        class SegmentHandler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    notify_new_segment(event.src_path)
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    notify_new_segment(event.dest_path)
+
+        observer = Observer()
+        observer.schedule(SegmentHandler(), config.CSV_DIR, recursive=False)
+        observer.start()
+        logger.info("Watching %s for new segments (watchdog).", config.CSV_DIR)
+        return
+    # No watchdog installed: a directory listing every few seconds is still cheap
+    logger.info("Watching %s for new segments (polling every %ss).", config.CSV_DIR, config.UPLOAD_SCAN_INTERVAL)
+    known = set()
+    while True:
+        try:
+            files = pending_files()
+            for file in set(files) - known:
+                notify_new_segment(os.path.join(config.CSV_DIR, file))
+            known = set(files)
+        except Exception as e:
+            logger.exception("Error watching %s: %s", config.CSV_DIR, e)
+        time.sleep(config.UPLOAD_SCAN_INTERVAL)
 
 def upload_csv_files():
+    global upload_queue
+    os.makedirs(config.CSV_DIR, exist_ok=True)
+    os.makedirs(config.CSV_SENT_DIR, exist_ok=True)
+    upload_queue = UploadQueue(config.UPLOAD_QUEUE_DB,
+                               backoff_base=config.UPLOAD_BACKOFF_BASE,
+                               backoff_cap=config.UPLOAD_BACKOFF_CAP)
+    upload_queue.sync(pending_files())
+    threading.Thread(target=watch_directory, daemon=True).start()
+    executor = ThreadPoolExecutor(max_workers=config.UPLOAD_WORKERS, thread_name_prefix="uploader")
+    logger.info("Uploader started with %d workers; queue: %s", config.UPLOAD_WORKERS, upload_queue.counts())
     while True:
-        if is_internet_available():
-            print("Internet is available. Checking for CSV files to upload...")
-            for file in os.listdir(config.CSV_DIR):
-                if file.endswith(".csv"):
-                    file_path = os.path.join(config.CSV_DIR, file)
-                    try:
-                        with open(file_path, "rb") as f:
-                            files = {"file": (file, f, "text/csv")}
-                            response = requests.post(config.UPLOAD_URL, files=files, timeout=10)
-                        if response.status_code == 200:
-                            print(f"Uploaded {file} successfully. Moving file to csv_data_sent.")
-                            destination = os.path.join(config.CSV_SENT_DIR, file)
-                            shutil.move(file_path, destination)
-                        else:
-                            print(f"Failed to upload {file}. Status: {response.status_code}")
-                    except Exception as e:
-                        print(f"Error uploading {file}: {e}")
-        else:
-            print("Internet not available. Will check again later.")
-        time.sleep(config.CHECK_INTERVAL)
+        wait = config.CHECK_INTERVAL
+        try:
+            if is_internet_available():
+                dispatch_jobs(executor)
+                next_due = upload_queue.next_due()
+                if next_due is not None:
+                    wait = min(wait, max(0.5, next_due - time.time()))
+            else:
+                logger.info("Internet not available. Will check again later.")
+        except Exception as e:
+            logger.exception("Error in upload loop: %s", e)
+        new_segment_event.wait(wait)
+        new_segment_event.clear()
@@ -0,0 +1,256 @@
+import json
+import struct
+import threading
+
+# Binary frames start with 0xB0 | version; JSON frames start with '{' (0x7B), so the two never collide
+VERSION = 1
+MAGIC = 0xB0
+HEADER = struct.Struct('<BBB')  # magic|version, message type, boat index
+NO_INDEX = 0xFF  # Boat index for frames sent before the boat has one (reg)
+MAX_BOATS = NO_INDEX
+
+# Fixed point scales: 1e-7 deg ~ 1 cm for positions, 0.01 for angles and temperature, 0.1 for calibration
+LATLNG_SCALE = 10 ** 7
+ANGLE_SCALE = 100
+CAL_SCALE = 10
+
+CAL_FIELDS = ('rm', 'rx', 'sm', 'sx', 'em', 'ex')
+
+
+def is_binary(frame):
+    return bool(frame) and frame[0] & 0xF0 == MAGIC
+
+
+def _pack_str(value):
+    raw = str(value).encode()[:255]
+    return bytes((len(raw),)) + raw
+
+
+def _unpack_str(body, offset):
+    length = body[offset]
+    end = offset + 1 + length
+    return body[offset + 1:end].decode(), end
+
+
+def _encode_reg(payload):
+    return str(payload.get('id')).encode()
+
+
+def _encode_hb(payload):
+    return _pack_str(payload.get('s', 'unknown')) + _pack_str(payload.get('n', ''))
+
+
+def _decode_hb(body):
+    status, offset = _unpack_str(body, 0)
+    notification, _ = _unpack_str(body, offset)
+    return {'s': status, 'n': notification}
+
+
+_DT1 = struct.Struct('<ii')
+_DT2 = struct.Struct('<HhH')
+_CMD_MNL = struct.Struct('<Bfff')
+_CMD_AUTO = struct.Struct('<Bii')
+_CAL = struct.Struct('<6h')
+_REQUEST_ID = struct.Struct('<I')
+
+
+def _encode_dt1(payload):
+    return _DT1.pack(round(payload.get('lt', 0.0) * LATLNG_SCALE), round(payload.get('lg', 0.0) * LATLNG_SCALE))
+
+
+def _decode_dt1(body):
+    lt, lg = _DT1.unpack(body)
+    return {'lt': lt / LATLNG_SCALE, 'lg': lg / LATLNG_SCALE}
+
+
+def _encode_dt2(payload):
+    return _DT2.pack(round(payload.get('w', 0.0) % 360 * ANGLE_SCALE),
+                     round(payload.get('tp', 0.0) * ANGLE_SCALE),
+                     round(payload.get('h', 0.0) % 360 * ANGLE_SCALE))
+
+
+def _decode_dt2(body):
+    w, tp, h = _DT2.unpack(body)
+    return {'w': w / ANGLE_SCALE, 'tp': tp / ANGLE_SCALE, 'h': h / ANGLE_SCALE}
+
+
+def _encode_cmd(payload):
+    # GUI values may arrive as strings; anything float() rejects makes encode() fall back to JSON
+    if payload.get('md') == 'mnl':
+        return _CMD_MNL.pack(0, float(payload.get('r', 0)), float(payload.get('s', 0)), float(payload.get('th', 0)))
+    if payload.get('md') == 'auto':
+        return _CMD_AUTO.pack(1, round(float(payload.get('tlat', 0)) * LATLNG_SCALE),
+                              round(float(payload.get('tlng', 0)) * LATLNG_SCALE))
+    return None
+
+
+def _decode_cmd(body):
+    if body[0] == 0:
+        _, r, s, th = _CMD_MNL.unpack(body)
+        return {'md': 'mnl', 'r': r, 's': s, 'th': th}
+    _, tlat, tlng = _CMD_AUTO.unpack(body)
+    return {'md': 'auto', 'tlat': tlat / LATLNG_SCALE, 'tlng': tlng / LATLNG_SCALE}
+
+
+def _encode_cal(payload):
+    # Values beyond +-3276.7 do not fit the int16 fields; struct.error sends the frame as JSON
+    return _CAL.pack(*(round(float(payload.get(field, 0)) * CAL_SCALE) for field in CAL_FIELDS))
+
+
+def _decode_cal(body):
+    return {field: value / CAL_SCALE for field, value in zip(CAL_FIELDS, _CAL.unpack(body))}
+
+
+def _encode_request(payload):
+    # The request id ('rq') the boat echoes in its reply; older requests carry none
+    request_id = payload.get('rq')
+    if request_id is None:
+        return b''
+    if not 0 <= request_id <= 0xFFFFFFFF:
+        return None
+    return _REQUEST_ID.pack(request_id)
+
+
+def _decode_request(body):
+    if len(body) < _REQUEST_ID.size:
+        return {}
+    return {'rq': _REQUEST_ID.unpack_from(body)[0]}
+
+
+def _encode_empty(payload):
+    return b''
+
+
+def _decode_empty(body):
+    return {}
+
+
+# message type -> (type code, encode(payload) -> body bytes or None, decode(body) -> fields)
+MESSAGE_TYPES = {
+    'reg': (0x01, _encode_reg, _decode_empty),
+    'hb': (0x02, _encode_hb, _decode_hb),
+    'dt1': (0x03, _encode_dt1, _decode_dt1),
+    'dt2': (0x04, _encode_dt2, _decode_dt2),
+    'cmd': (0x10, _encode_cmd, _decode_cmd),
+    'cal': (0x11, _encode_cal, _decode_cal),
+    'data_req': (0x12, _encode_empty, _decode_empty),
+    'req_cal_data': (0x13, _encode_request, _decode_request),
+}
+TYPE_CODES = {code: (message_type, decode) for message_type, (code, _, decode) in MESSAGE_TYPES.items()}
+
+
+class WireCodec:
+    """Encodes outgoing payloads and decodes incoming frames, JSON or binary.
+
+    A boat opts in by sending 'v': <version> in its reg or hb. negotiate()
+    assigns it a one-byte index and returns a JSON 'wire' ack carrying the
+    agreed version and index; once that ack has been encoded, everything
+    for the boat is sent binary. Boats that never offer a version, message
+    types without a binary form (cal_test, ...) and boats beyond the index
+    space stay on JSON. Decoding accepts both formats from anyone.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._ids = []
+        self._versions = {}
+        self._pending = {}
+
+    def index_of(self, boat_id):
+        with self._lock:
+            index = self._indexes.get(boat_id)
+            if index is None and len(self._ids) < MAX_BOATS:
+                # Indexes are never reused, so a stale frame cannot be attributed to another boat
+                index = len(self._ids)
+                self._ids.append(boat_id)
+                self._indexes[boat_id] = index
+            return index
+
+    def version(self, boat_id):
+        return self._versions.get(boat_id, 0)
+
+    def negotiate(self, boat_id, offered, force=False, json_frame=False):
+        """Handle a version offer; returns the 'wire' ack payload to send, or None if nothing changes.
+
+        force re-sends the ack even if the version is unchanged, for a boat
+        that registered again and may have lost its index. json_frame says
+        the offer came as JSON: a boat already sent a binary ack only does
+        that if the ack was lost on the mesh, so it goes back to JSON until
+        the ack is sent again.
+        """
+        try:
+            offered = int(offered)
+        except (TypeError, ValueError):
+            offered = 0
+        agreed = min(offered, VERSION) if self.enabled else 0
+        index = self.index_of(boat_id) if agreed else None
+        if index is None:
+            agreed = 0
+        with self._lock:
+            if json_frame and self._versions.get(boat_id, 0) >= 1:
+                self._versions.pop(boat_id)
+            # An ack already queued for this version counts as done
+            current = self._pending.get(boat_id, self._versions.get(boat_id, 0))
+            if not force and current == agreed:
+                return None
+            self._pending[boat_id] = agreed
+        ack = {"t": "wire", "id": boat_id, "v": agreed}
+        if agreed:
+            ack["ix"] = index
+        return ack
+
+    def forget(self, boat_id):
+        """Back to JSON until the boat offers a version again; its index is kept."""
+        with self._lock:
+            self._versions.pop(boat_id, None)
+            self._pending.pop(boat_id, None)
+
+    def encode(self, payload):
+        """Bytes for an outgoing payload: binary if the boat has agreed to it, else JSON."""
+        boat_id = payload.get('id')
+        message_type = payload.get('t')
+        if message_type == 'wire':
+            # The ack itself goes out as JSON; the switch takes effect for the frames after it
+            with self._lock:
+                agreed = self._pending.pop(boat_id, None)
+                if agreed is not None:
+                    self._versions[boat_id] = agreed
+            return json.dumps(payload).encode()
+        spec = MESSAGE_TYPES.get(message_type)
+        if spec is not None and self._versions.get(boat_id, 0) >= 1:
+            try:
+                body = spec[1](payload)
+            except (TypeError, ValueError, OverflowError, struct.error):
+                # Not representable in the binary form; the boat still parses JSON
+                body = None
+            if body is not None:
+                return HEADER.pack(MAGIC | VERSION, spec[0], self._indexes[boat_id]) + body
+        return json.dumps(payload).encode()
+
+    def encode_binary(self, payload, boat_index=NO_INDEX):
+        """Binary frame for a payload regardless of negotiation (what a boat sends); None if unsupported."""
+        spec = MESSAGE_TYPES.get(payload.get('t'))
+        body = spec[1](payload) if spec is not None else None
+        if body is None:
+            return None
+        return HEADER.pack(MAGIC | VERSION, spec[0], boat_index) + body
+
+    def decode(self, frame):
+        """Message dict for a received frame, in the same shape as its JSON form."""
+        if not is_binary(frame):
+            return json.loads(frame.decode() if isinstance(frame, (bytes, bytearray)) else frame)
+        marker, code, index = HEADER.unpack_from(frame)
+        if marker & 0x0F > VERSION:
+            raise ValueError(f"Unsupported wire protocol version {marker & 0x0F}")
+        message_type, decode = TYPE_CODES[code]
+        body = bytes(frame[HEADER.size:])
+        if message_type == 'reg':
+            # Not indexed yet: the body carries the boat id
+            return {'t': 'reg', 'id': body.decode(), 'v': marker & 0x0F}
+        if index >= len(self._ids):
+            raise ValueError(f"Unknown boat index {index}")
+        message = {'t': message_type, 'id': self._ids[index]}
+        message.update(decode(body))
+        return message
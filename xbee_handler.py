@@ -1,10 +1,15 @@
-import json
 import datetime
+import logging
 import time
 import threading
-import traceback
 from digi.xbee.devices import XBeeDevice, RemoteXBeeDevice
 import config
+import instrumentation
+from message_registry import MessageRegistry
+from wire_protocol import is_binary
+import xbee_simulator
+
+logger = logging.getLogger(__name__)
 
 # Global variables for the XBee device
 device = None
@@ -13,241 +18,268 @@ xbee_ready = False
 def open_xbee_device():
     global device, xbee_ready
     try:
-        device = XBeeDevice(config.PORT, config.BAUD_RATE)
+        if config.XBEE_SIMULATOR:
+            # No radio: a synthetic fleet or a recorded capture drives the real pipeline
+            device = xbee_simulator.create_device(config.XBEE_SIMULATOR,
+                                                  boats=config.SIM_BOATS,
+                                                  rate=config.SIM_RATE,
+                                                  binary=config.SIM_BINARY,
+                                                  speed=config.SIM_REPLAY_SPEED)
+        else:
+            device = XBeeDevice(config.PORT, config.BAUD_RATE)
         device.open()
+        # Ready before the callback goes in, so the first frames (e.g. a simulator's reg) are not skipped
         xbee_ready = True
-        print("XBee device opened and ready.")
+        if config.XBEE_CAPTURE_FILE:
+            device.add_data_received_callback(xbee_simulator.CaptureRecorder(config.XBEE_CAPTURE_FILE))
+            logger.info("Recording received frames to %s", config.XBEE_CAPTURE_FILE)
+        # Frames are delivered by the library's reader thread instead of polling read_data()
+        device.add_data_received_callback(on_xbee_data_received)
+        logger.info("XBee device opened and ready%s.",
+                    f" (simulated: {config.XBEE_SIMULATOR})" if config.XBEE_SIMULATOR else "")
         return True
     except Exception as e:
         xbee_ready = False
-        print(f"Error opening XBee device: {e}")
+        logger.error("Error opening XBee device: %s", e)
         return False
 
+def on_xbee_data_received(xbee_message):
+    # Runs on the XBee library's reader thread, so only hand the frame off here.
+    # Sharding by sender address keeps each boat's frames in order.
+    remote = xbee_message.remote_device
+    key = str(remote.get_64bit_addr()) if remote is not None else None
+    if not config.incoming_pipeline.put(xbee_message, key):
+        dropped = config.incoming_pipeline.dropped()
+        if dropped % 100 == 1:
+            logger.warning("Incoming pipeline full, dropped %d frames so far", dropped)
+
 def send_via_xbee(payload):
     global device, xbee_ready
     if not xbee_ready:
         # Fallback mechanism if XBee is not available
-        print(f"XBee not available. Simulating send: {payload}")
+        logger.debug("XBee not available. Simulating send: %s", payload)
         return
     
     try:
         boat_id = payload.get('id')
-        payload_json = json.dumps(payload)
-        with config.active_boats_lock:
-            if boat_id in config.active_boats:
-                remote_address = config.active_boats[boat_id]['address']
-                remote_device = RemoteXBeeDevice(device, remote_address)
-                device.send_data_async(remote_device, payload_json)
-                print(f"Sent data to {boat_id}: {payload_json}")
-            else:
-                device.send_data_broadcast(payload_json)
-                print(f"Boat {boat_id} not found, sent broadcast: {payload_json}")
+        # Binary for boats that negotiated it, JSON otherwise
+        frame = config.wire_codec.encode(payload)
+        remote_address = config.active_boats.address(boat_id)
+        started = time.perf_counter()
+        if remote_address is not None:
+            remote_device = RemoteXBeeDevice(device, remote_address)
+            device.send_data_async(remote_device, frame)
+            logger.debug("Sent data to %s (%d bytes): %s", boat_id, len(frame), payload)
+        else:
+            device.send_data_broadcast(frame)
+            logger.debug("Boat %s not found, sent broadcast (%d bytes): %s", boat_id, len(frame), payload)
+        instrumentation.XBEE_SEND_SECONDS.observe(time.perf_counter() - started)
+        instrumentation.XBEE_SENT.labels(payload.get('t'), 'json' if frame[:1] == b'{' else 'binary').inc()
     except Exception as e:
-        print(f"Error sending via XBee: {e}")
-        traceback.print_exc()
+        instrumentation.XBEE_SEND_FAILURES.inc()
+        logger.exception("Error sending via XBee: %s", e)
 
-def xbee_dispatcher():
-    print("XBee dispatcher thread started.")
+def xbee_sender():
+    """TX worker: send outgoing commands as soon as they are queued."""
+    logger.info("XBee sender thread started.")
     if not xbee_ready:
-        print("XBee device not available. Running in simulation mode.")
+        logger.warning("XBee device not available. Running in simulation mode.")
     while True:
         try:
-            if xbee_ready:
-                xbee_message = device.read_data()
-                if xbee_message:
-                    config.incoming_queue.put(xbee_message)
-            else:
-                time.sleep(0.1)
-                
-            if not config.outgoing_queue.empty():
-                payload = config.outgoing_queue.get()
-                send_via_xbee(payload)
+            payload = config.outgoing_queue.get()
+            send_via_xbee(payload)
         except Exception as e:
-            print(f"Error in xbee_dispatcher: {e}")
-            traceback.print_exc()
+            logger.exception("Error in xbee_sender: %s", e)
             time.sleep(1)
 
-def message_processor():
-    print("Message processor thread started.")
+def dt_requester():
+    """Send data_req polls one boat at a time as the poll scheduler makes them due."""
+    last_sync = 0
     while True:
         try:
-            xbee_message = config.incoming_queue.get()
-            process_incoming_message(xbee_message)
+            now = time.monotonic()
+            if now - last_sync >= 1:
+                # Pick up newly registered and removed boats
+                config.poll_scheduler.sync(config.active_boats.ids(), now)
+                last_sync = now
+            if config.incoming_pipeline.overloaded():
+                # Backpressure: let the processors catch up before asking for more telemetry
+                time.sleep(0.1)
+                continue
+            boat_id, wait = config.poll_scheduler.next_poll(now)
+            if boat_id is None:
+                time.sleep(min(wait, 1))
+                continue
+            request_payload = {
+                "t": "data_req",
+                "id": boat_id
+            }
+            config.outgoing_queue.put(request_payload)
+            logger.debug("Requested data from boat %s", boat_id)
         except Exception as e:
-            print(f"Error in message_processor: {e}")
-            traceback.print_exc()
+            logger.exception("Error in dt_requester: %s", e)
             time.sleep(1)
 
-def dt_requester():
-    while True:
-        try:
-            with config.active_boats_lock:
-                for boat_id in list(config.active_boats.keys()):
-                    request_payload = {
-                        "t": "data_req",
-                        "id": boat_id
-                    }
-                    config.outgoing_queue.put(request_payload)
-                    print(f"Requested data from boat {boat_id}")
-            time.sleep(1)  # Request data every 1 second
-        except Exception as e:
-            print(f"Error in dt_requester: {e}")
-            traceback.print_exc()
+# Incoming message types. Telemetry types only declare how wire keys map to
+# state fields; they all share handle_telemetry's upsert/emit/log pipeline.
+registry = MessageRegistry()
 
 def process_incoming_message(xbee_message):
     try:
-        if not xbee_ready:
-            print("Incoming XBee message processing (simulation mode)")
-            return  # Simulate behavior without processing
-        data = json.loads(xbee_message.data.decode())
+        decoded = decode_message(xbee_message)
+        if decoded is not None:
+            dispatch_message(decoded)
+    except Exception as e:
+        logger.exception("Error processing incoming message: %s", e)
+
+def decode_message(xbee_message):
+    """Pipeline stage 1: frame -> (data, xbee_message), or None to skip it."""
+    if not xbee_ready:
+        logger.debug("Incoming XBee message processing (simulation mode)")
+        return None  # Simulate behavior without processing
+    return config.wire_codec.decode(xbee_message.data), xbee_message
+
+def dispatch_message(decoded):
+    """Pipeline stage 2: negotiate, then run the registered handler."""
+    data, xbee_message = decoded
+    try:
         message_type = data.get('t')
         boat_id = data.get('id')
 
-        if message_type == 'reg':
-            register_boat(boat_id, xbee_message)
-        elif message_type == 'hb':
-            handle_heartbeat(boat_id, data, xbee_message)
-        elif message_type == 'dt1':
-            handle_dt_1(boat_id, data, xbee_message)
-        elif message_type == 'dt2':
-            handle_dt_2(boat_id, data, xbee_message)
-        else:
-            print(f"Unknown message type '{message_type}' from boat '{boat_id}'")
+        if 'v' in data and message_type in ('reg', 'hb'):
+            # Boat offers the binary wire protocol; the ack switches it over
+            ack = config.wire_codec.negotiate(boat_id, data['v'], force=message_type == 'reg',
+                                              json_frame=not is_binary(xbee_message.data))
+            if ack is not None:
+                config.outgoing_queue.put(ack)
+
+        spec = registry.get(message_type)
+        if spec is None:
+            instrumentation.MESSAGES_RECEIVED.labels('unknown').inc()
+            logger.warning("Unknown message type '%s' from boat '%s'", message_type, boat_id)
+            return
+        instrumentation.MESSAGES_RECEIVED.labels(message_type).inc()
+        with instrumentation.MESSAGE_HANDLE_SECONDS.labels(message_type).time():
+            if spec.handler is not None:
+                spec.handler(boat_id, data, xbee_message)
+            else:
+                handle_telemetry(spec, boat_id, data, xbee_message)
+        # Per-boat series only for registered boats; boat_lost removes them again
+        if boat_id in config.active_boats:
+            instrumentation.BOAT_MESSAGES.labels(boat_id).inc()
     except Exception as e:
-        print(f"Error processing incoming message: {e}")
-        traceback.print_exc()
+        logger.exception("Error processing incoming message: %s", e)
 
-def register_boat(boat_id, xbee_message):
+@registry.handler('reg')
+def register_boat(boat_id, data, xbee_message):
     try:
         address = xbee_message.remote_device.get_64bit_addr()
-        with config.active_boats_lock:
-            config.active_boats[boat_id] = {
-                'address': address,
-                'last_seen': time.time(),
-                'data': {}
-            }
-        print(f"Boat {boat_id} registered with address {address}")
+        state = config.active_boats.register(boat_id, address)
+        config.liveness.track(state)
+        if config.fleet_relay is not None:
+            config.fleet_relay.sample(boat_id, state.data, state.last_seen)
+        logger.info("Boat %s registered with address %s", boat_id, address)
     except Exception as e:
-        print(f"Error in register_boat: {e}")
-        traceback.print_exc()
+        logger.exception("Error in register_boat: %s", e)
+
+@registry.handler('cal_data')
+def handle_calibration_data(boat_id, data, xbee_message):
+    # Reply to req_cal_data; boats that echo the request id ('rq') are matched exactly
+    completed = config.calibration_requests.complete(boat_id, data.get('rq'), data)
+    if config.fleet_relay is not None:
+        # The request may have come from a dashboard on a worker process
+        config.fleet_relay.reply(data)
+    elif not completed:
+        logger.info("Unsolicited calibration data from %s: %s", boat_id, data)
 
+def get_or_register_boat(boat_id, xbee_message, source, now=None, **kwargs):
+    """Return the boat's state, registering it from the sender address if it is new."""
+    state, created = config.active_boats.get_or_register(
+        boat_id, xbee_message.remote_device.get_64bit_addr, now, **kwargs)
+    if created:
+        config.liveness.track(state)
+        if config.fleet_relay is not None:
+            config.fleet_relay.sample(boat_id, state.data, state.last_seen)
+        logger.info("Boat %s automatically registered via %s.", boat_id, source)
+    return state, created
+
+@registry.handler('hb')
 def handle_heartbeat(boat_id, data, xbee_message):
     try:
-        with config.active_boats_lock:
-            if boat_id not in config.active_boats:
-                address = xbee_message.remote_device.get_64bit_addr()
-                config.active_boats[boat_id] = {
-                    'address': address,
-                    'last_seen': time.time(),
-                    'data': {},
-                    'status': data.get('s', 'unknown'),
-                    'notification': data.get('n', '')
-                }
-                print(f"Boat {boat_id} automatically registered via heartbeat.")
-            else:
-                config.active_boats[boat_id]['last_seen'] = time.time()
-                config.active_boats[boat_id]['status'] = data.get('s', 'unknown')
-                config.active_boats[boat_id]['notification'] = data.get('n', '')
-                print(f"Heartbeat received from {boat_id} with status '{config.active_boats[boat_id]['status']}'")
+        status = data.get('s', 'unknown')
+        notification = data.get('n', '')
+        state, created = get_or_register_boat(boat_id, xbee_message, "heartbeat",
+                                              status=status, notification=notification)
+        if not created:
+            state.heartbeat(status, notification)
+            logger.debug("Heartbeat received from %s with status '%s'", boat_id, status)
     except Exception as e:
-        print(f"Error in handle_heartbeat: {e}")
-        traceback.print_exc()
+        logger.exception("Error in handle_heartbeat: %s", e)
 
-def handle_dt_1(boat_id, data, xbee_message):
+def handle_telemetry(spec, boat_id, data, xbee_message):
+    """Shared pipeline for telemetry frames: upsert the boat, record history, emit, log."""
     try:
-        with config.active_boats_lock:
-            if boat_id not in config.active_boats:
-                address = xbee_message.remote_device.get_64bit_addr()
-                config.active_boats[boat_id] = {
-                    'address': address,
-                    'last_seen': time.time(),
-                    'data': {}
-                }
-                print(f"Boat {boat_id} automatically registered via DT1.")
-            
-            config.active_boats[boat_id]['data'].update({
-                'latitude': data.get('lt', 0.0),
-                'longitude': data.get('lg', 0.0)
-            })
-            config.active_boats[boat_id]['last_seen'] = time.time()
-            print(f"Received DT 1 data from {boat_id}: {data}")
-
-        time_now = datetime.datetime.utcnow().isoformat()
-        with config.app.app_context():
-            config.socketio.emit('boat_data', {
-                'boat_id': boat_id,
-                'data': config.active_boats[boat_id]['data'],
-                'timestamp': time_now
-            })
-    except Exception as e:
-        print(f"Error in handle_dt_1: {e}")
-        traceback.print_exc()
+        now = time.time()
+        state, _ = get_or_register_boat(boat_id, xbee_message, spec.label, now)
+        update = spec.extract(data)
+        snapshot = state.update(update, now)
+        config.telemetry_history.append(boat_id, snapshot, now)
+        logger.debug("Received %s data from %s: %s", spec.label, boat_id, data)
 
-def handle_dt_2(boat_id, data, xbee_message):
-    try:
-        with config.active_boats_lock:
-            if boat_id not in config.active_boats:
-                address = xbee_message.remote_device.get_64bit_addr()
-                config.active_boats[boat_id] = {
-                    'address': address,
-                    'last_seen': time.time(),
-                    'data': {}
-                }
-                print(f"Boat {boat_id} automatically registered via DT2.")
-
-            # Update DT2-specific fields
-            config.active_boats[boat_id]['data'].update({
-                'wind_dir': data.get('w', 0.0),
-                'temperature': data.get('tp', 0.0),
-                'heading': data.get('h', 0.0)
-            })
-            config.active_boats[boat_id]['last_seen'] = time.time()
-            print(f"Received DT 2 data from {boat_id}: {data}")
-
-        # Emit updated data to the frontend
-        time_now = datetime.datetime.utcnow().isoformat()
-        with config.app.app_context():
-            config.socketio.emit('boat_data', {
-                'boat_id': boat_id,
-                'data': config.active_boats[boat_id]['data'],
-                'timestamp': time_now
-            })
-
-        # **Log the current snapshot of the boat's data**
-        log_entry = {
-            "timestamp": time_now,
-            "boat_id": boat_id,
-        }
-        # Merge the boat's current data into the snapshot
-        log_entry.update(config.active_boats[boat_id]['data'])
-        with config.data_log_lock:
-            config.data_log.append(log_entry)
+        # Batched and rate-limited by the broadcaster
+        config.broadcaster.publish(boat_id, update)
+        if config.fleet_relay is not None:
+            config.fleet_relay.sample(boat_id, snapshot, now)
+        config.poll_scheduler.note_telemetry(boat_id, time.monotonic(),
+                                             update.get('latitude'), update.get('longitude'))
+
+        if spec.log:
+            # Log the current snapshot of the boat's data, streamed to the rolling segment
+            log_entry = {
+                "timestamp": datetime.datetime.fromtimestamp(now, datetime.timezone.utc).replace(tzinfo=None).isoformat(),
+                "boat_id": boat_id,
+            }
+            log_entry.update(snapshot)
+            config.telemetry_log.append(log_entry)
     except Exception as e:
-        print(f"Error in handle_dt_2: {e}")
-        traceback.print_exc()
+        logger.exception("Error in %s handler: %s", spec.label, e)
+
+registry.register('dt1', fields={
+    'lt': ('latitude', 0.0),
+    'lg': ('longitude', 0.0),
+}, label="DT1")
+registry.register('dt2', fields={
+    'w': ('wind_dir', 0.0),
+    'tp': ('temperature', 0.0),
+    'h': ('heading', 0.0),
+}, log=True, label="DT2")
+
 
+def boat_lost(state):
+    """Liveness callback: the boat has been silent for BOAT_TIMEOUT seconds and was removed."""
+    logger.info("Removing inactive boat: %s", state.boat_id)
+    config.broadcaster.lost(state.boat_id, state.last_seen)
+    config.wire_codec.forget(state.boat_id)
+    instrumentation.BOAT_MESSAGES.remove(state.boat_id)
+    if config.fleet_relay is not None:
+        config.fleet_relay.lost(state.boat_id)
 
-def cleanup_inactive_boats():
-    TIMEOUT = 6
+def prune_history():
     while True:
         try:
-            current_time = time.time()
-            with config.active_boats_lock:
-                inactive_boats = [boat_id for boat_id, boat_info in config.active_boats.items()
-                                  if current_time - boat_info['last_seen'] > TIMEOUT]
-                for boat_id in inactive_boats:
-                    print(f"Removing inactive boat: {boat_id}")
-                    del config.active_boats[boat_id]
-            time.sleep(TIMEOUT)
+            # History outlives a short dropout, but not max_age of silence
+            config.telemetry_history.prune()
         except Exception as e:
-            print(f"Error in cleanup_inactive_boats: {e}")
-            traceback.print_exc()
-            time.sleep(TIMEOUT)
+            logger.exception("Error in prune_history: %s", e)
+        time.sleep(config.HISTORY_PRUNE_INTERVAL)
 
 def start_threads():
-    threading.Thread(target=xbee_dispatcher, daemon=True).start()
-    threading.Thread(target=message_processor, daemon=True).start()
+    threading.Thread(target=xbee_sender, daemon=True).start()
+    config.incoming_pipeline.start([('decode', decode_message), ('handle', dispatch_message)])
     threading.Thread(target=dt_requester, daemon=True).start()
 
 def start_periodic_tasks():
-    threading.Thread(target=cleanup_inactive_boats, daemon=True).start()
+    # One thread for boat liveness and request timeouts
+    threading.Thread(target=config.timer_wheel.run, daemon=True).start()
+    config.liveness.on_lost = boat_lost
+    threading.Thread(target=prune_history, daemon=True).start()
@@ -0,0 +1,348 @@
+import heapq
+import json
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from digi.xbee.devices import RemoteXBeeDevice
+from digi.xbee.models.address import XBee64BitAddress
+from digi.xbee.models.message import XBeeMessage
+from digi.xbee.models.protocol import XBeeProtocol
+import wire_protocol
+
+logger = logging.getLogger(__name__)
+
+
+def boat_address(index):
+    """64-bit address of the index-th simulated boat."""
+    return XBee64BitAddress.from_hex_string(f"0013A2FF{index:08X}")
+
+
+class SimulatedXBeeDevice:
+    """Stand-in for digi's XBeeDevice with no radio behind it.
+
+    It implements the parts of the XBeeDevice API the backend uses (open,
+    close, is_open, add_data_received_callback, send_data_async,
+    send_data_broadcast), so xbee_handler runs its real code paths against
+    it, including RemoteXBeeDevice and XBeeMessage objects. Incoming
+    traffic comes from sources attached with attach() (SyntheticFleet,
+    CaptureReplay); they start once the device is open and has a receive
+    callback, and outgoing frames are handed back to them.
+    """
+
+    def __init__(self, port=None, baud_rate=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        # RemoteXBeeDevice(local, address) only needs a non-None interface and a protocol
+        self.comm_iface = object()
+        self.sent_frames = 0
+        self.received_frames = 0
+        self._callbacks = []
+        self._sources = []
+        self._open = False
+        self._started = False
+        self._remotes = {}
+        self._lock = threading.Lock()
+
+    def open(self):
+        self._open = True
+        self._start_sources()
+
+    def close(self):
+        self._open = False
+        for source in self._sources:
+            source.stop()
+
+    def is_open(self):
+        return self._open
+
+    def get_protocol(self):
+        return XBeeProtocol.DIGI_MESH
+
+    def add_data_received_callback(self, callback):
+        self._callbacks.append(callback)
+        self._start_sources()
+
+    def del_data_received_callback(self, callback):
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+
+    def attach(self, source):
+        self._sources.append(source)
+        if self._started:
+            source.start(self)
+        return source
+
+    def _start_sources(self):
+        with self._lock:
+            if self._started or not (self._open and self._callbacks):
+                return
+            self._started = True
+        for source in self._sources:
+            source.start(self)
+
+    def remote(self, address):
+        """Cached RemoteXBeeDevice for a sender address."""
+        remote = self._remotes.get(address)
+        if remote is None:
+            remote = self._remotes.setdefault(address, RemoteXBeeDevice(self, address))
+        return remote
+
+    def inject(self, data, address):
+        """Deliver a frame from address as if the radio had received it."""
+        if not self._open:
+            return
+        self.received_frames += 1
+        message = XBeeMessage(bytearray(data), self.remote(address), time.time())
+        for callback in self._callbacks:
+            callback(message)
+
+    def send_data_async(self, remote_device, data):
+        self.sent_frames += 1
+        address = remote_device.get_64bit_addr()
+        for source in self._sources:
+            source.on_sent(address, data)
+
+    send_data = send_data_async
+
+    def send_data_broadcast(self, data):
+        self.sent_frames += 1
+        for source in self._sources:
+            source.on_sent(None, data)
+
+
+class SimulatedBoat:
+    """One synthetic boat: drifts along a heading and reports dt1/dt2/hb (and cal_data on request)."""
+
+    def __init__(self, index, rng, binary=False):
+        self.index = index
+        self.boat_id = f"sim{index:03d}"
+        self.address = boat_address(index)
+        self.binary = binary
+        self.wire_index = None
+        self.latitude = 32.70 + rng.uniform(-0.02, 0.02)
+        self.longitude = -117.20 + rng.uniform(-0.02, 0.02)
+        self.heading = rng.uniform(0, 360)
+        self.speed = rng.uniform(0.2, 3.0)  # m/s
+        self.wind_dir = rng.uniform(0, 360)
+        self.temperature = rng.uniform(15, 25)
+        self.moved_at = None
+
+    def move(self, now):
+        if self.moved_at is not None:
+            distance = self.speed * (now - self.moved_at)
+            self.latitude += distance * math.cos(math.radians(self.heading)) / 111320.0
+            self.longitude += distance * math.sin(math.radians(self.heading)) / (
+                111320.0 * math.cos(math.radians(self.latitude)))
+        self.moved_at = now
+
+    def messages(self, message_type, request_id=None):
+        if message_type == 'cal_data':
+            message = {"t": "cal_data", "id": self.boat_id, "rm": -30.0, "rx": 30.0,
+                       "sm": 0.0, "sx": 90.0, "em": 0.0, "ex": 100.0}
+            if request_id is not None:
+                message["rq"] = request_id
+            return [message]
+        if message_type == 'reg':
+            message = {"t": "reg", "id": self.boat_id}
+            if self.binary:
+                message["v"] = wire_protocol.VERSION
+            return [message]
+        if message_type == 'hb':
+            return [{"t": "hb", "id": self.boat_id, "s": "sailing", "n": ""}]
+        return [{"t": "dt1", "id": self.boat_id,
+                 "lt": round(self.latitude, 7), "lg": round(self.longitude, 7)},
+                {"t": "dt2", "id": self.boat_id, "w": round(self.wind_dir, 2),
+                 "tp": round(self.temperature, 2), "h": round(self.heading, 2)}]
+
+    def encode(self, message, codec):
+        if self.wire_index is not None and message['t'] != 'reg':
+            frame = codec.encode_binary(message, self.wire_index)
+            if frame is not None:
+                return frame
+        return json.dumps(message).encode()
+
+
+class SyntheticFleet:
+    """Generates traffic for a fleet of boats.
+
+    Each boat registers, sends a heartbeat every hb_interval seconds and
+    pushes a dt1/dt2 pair rate times per second (0 disables pushing). Boats
+    answer data_req polls with a dt1/dt2 pair when reply_to_polls is set and
+    req_cal_data with a cal_data frame echoing the request id, and
+    boats created with binary=True offer the binary wire protocol and switch
+    to it once acked. on_frame(boat_id, message, timestamp), if given, is
+    called for every injected message, e.g. to measure end-to-end latency.
+    """
+
+    def __init__(self, boats=5, rate=1.0, binary=False, reply_to_polls=True,
+                 hb_interval=1.0, seed=0, on_frame=None):
+        rng = random.Random(seed)
+        self.boats = [SimulatedBoat(index, rng, binary) for index in range(boats)]
+        self._by_address = {boat.address: boat for boat in self.boats}
+        self.rate = rate
+        self.reply_to_polls = reply_to_polls
+        self.hb_interval = hb_interval
+        self.on_frame = on_frame
+        self.polls_answered = 0
+        self._codec = wire_protocol.WireCodec()
+        self._device = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, device):
+        self._device = device
+        self._stop.clear()
+        threading.Thread(target=self._run, name="sim-fleet", daemon=True).start()
+        logger.info("Simulated fleet started: %d boats at %.2f Hz.", len(self.boats), self.rate)
+
+    def stop(self):
+        self._stop.set()
+
+    def _send(self, boat, message_type, **extra):
+        with self._lock:
+            now = time.time()
+            boat.move(now)
+            for message in boat.messages(message_type, **extra):
+                frame = boat.encode(message, self._codec)
+                if self.on_frame is not None:
+                    self.on_frame(boat.boat_id, message, time.perf_counter())
+                self._device.inject(frame, boat.address)
+
+    def _run(self):
+        for boat in self.boats:
+            self._send(boat, 'reg')
+        # (due time, sequence, boat index, message type, period); boats are staggered over one period
+        events = []
+        start = time.monotonic()
+        count = len(self.boats)
+        for position in range(count):
+            offset = position / count
+            events.append((start + offset * self.hb_interval, len(events), position, 'hb', self.hb_interval))
+            if self.rate > 0:
+                events.append((start + offset / self.rate, len(events), position, 'dt', 1.0 / self.rate))
+        heapq.heapify(events)
+        while not self._stop.is_set() and events:
+            due, sequence, position, message_type, period = events[0]
+            delay = due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            self._send(self.boats[position], message_type)
+            heapq.heapreplace(events, (due + period, sequence, position, message_type, period))
+
+    def on_sent(self, address, frame):
+        """A frame the backend sent; broadcasts (address None) reach every boat."""
+        boats = self.boats if address is None else [self._by_address.get(address)]
+        try:
+            if frame[:1] == b'{':
+                message = json.loads(bytes(frame))
+                message_type = message.get('t')
+            else:
+                # Decoded like the boat firmware would, so binary-only fields such as 'rq' reach the reply
+                message_type, decode = wire_protocol.TYPE_CODES[frame[1]]
+                message = decode(bytes(frame[wire_protocol.HEADER.size:]))
+        except (ValueError, KeyError, IndexError, struct.error):
+            return
+        for boat in boats:
+            if boat is None or (address is None and message.get('id') not in (None, boat.boat_id)):
+                # Every boat hears a broadcast, but only the addressed one acts on it
+                continue
+            if message_type == 'wire':
+                boat.wire_index = message.get('ix') if message.get('v') else None
+            elif message_type == 'req_cal_data':
+                self._send(boat, 'cal_data', request_id=message.get('rq'))
+            elif message_type == 'data_req' and self.reply_to_polls:
+                self.polls_answered += 1
+                self._send(boat, 'dt')
+
+
+class CaptureReplay:
+    """Replays frames recorded by CaptureRecorder, keeping their original spacing.
+
+    speed scales time (2.0 replays twice as fast, 0 as fast as possible);
+    loop restarts the capture when it ends.
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.frames_replayed = 0
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+
+    def load(self):
+        frames = []
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    frames.append((entry["t"], XBee64BitAddress.from_hex_string(entry["addr"]),
+                                   bytes.fromhex(entry["data"])))
+        return frames
+
+    def start(self, device):
+        self._stop.clear()
+        threading.Thread(target=self._run, args=(device, self.load()), name="sim-replay", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def on_sent(self, address, frame):
+        pass
+
+    def _run(self, device, frames):
+        logger.info("Replaying %d frames from %s.", len(frames), self.path)
+        while not self._stop.is_set():
+            start = time.monotonic()
+            for offset, address, data in frames:
+                if self.speed > 0:
+                    delay = start + offset / self.speed - time.monotonic()
+                    if delay > 0 and self._stop.wait(delay):
+                        return
+                device.inject(data, address)
+                self.frames_replayed += 1
+            if not self.loop:
+                break
+        self.finished.set()
+
+
+class CaptureRecorder:
+    """Data-received callback that appends every frame to a capture file for CaptureReplay.
+
+    One JSON object per line: seconds since the first frame, sender address
+    and frame bytes in hex.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+        self._start = None
+
+    def __call__(self, xbee_message):
+        now = time.monotonic()
+        remote = xbee_message.remote_device
+        address = str(remote.get_64bit_addr()) if remote is not None else "0000000000000000"
+        with self._lock:
+            if self._start is None:
+                self._start = now
+            self._file.write(json.dumps({"t": round(now - self._start, 6), "addr": address,
+                                         "data": bytes(xbee_message.data).hex()}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def create_device(source, boats=5, rate=1.0, binary=False, speed=1.0, loop=False):
+    """Simulated device fed by a synthetic fleet (source "fleet") or a capture file (source = path)."""
+    device = SimulatedXBeeDevice()
+    if source == "fleet":
+        device.attach(SyntheticFleet(boats=boats, rate=rate, binary=binary))
+    else:
+        device.attach(CaptureReplay(source, speed=speed, loop=loop))
+    return device